@@ -0,0 +1,64 @@
+"""
+pglookout - benchmark fixtures
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pathlib import Path
+from pglookout.common import get_iso_timestamp
+from pglookout.pglookout import PgLookout
+from pglookout.simulation.cluster import format_lsn
+from typing import Any, Dict, Iterator
+
+import datetime
+import json
+import pytest
+
+NodeState = Dict[str, Any]
+
+
+def make_cluster_state(node_count: int) -> Dict[str, NodeState]:
+    """node0 is the master, the standbys trail behind it by a few megabytes each"""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cluster_state = {}
+    for index in range(node_count):
+        lsn = format_lsn(0x1_0000_0000 - index * 4 * 1024 * 1024)
+        cluster_state[f"node{index}"] = {
+            "connection": True,
+            "db_time": get_iso_timestamp(now),
+            "fetch_time": get_iso_timestamp(now),
+            "pg_is_in_recovery": index > 0,
+            "pg_last_xact_replay_timestamp": get_iso_timestamp(now) if index > 0 else None,
+            "pg_last_xlog_receive_location": lsn if index > 0 else None,
+            "pg_last_xlog_replay_location": lsn,
+            "replication_time_lag": 0.1 * index if index > 0 else None,
+            "min_replication_time_lag": 0.0,
+        }
+    return cluster_state
+
+
+def make_observer_state(observer_count: int, cluster_state: Dict[str, NodeState]) -> Dict[str, Dict[str, Any]]:
+    """Every observer sees the same cluster as we do"""
+    fetch_time = get_iso_timestamp()
+    return {
+        f"observer{index}": {"connection": True, "fetch_time": fetch_time, **json.loads(json.dumps(cluster_state))}
+        for index in range(observer_count)
+    }
+
+
+@pytest.fixture(name="lookout")
+def fixture_lookout(tmp_path: Path) -> Iterator[PgLookout]:
+    config = {
+        "json_state_file_path": str(tmp_path / "state.json"),
+        "alert_file_dir": str(tmp_path),
+        "log_level": "INFO",
+        "own_db": "node1",
+        "remote_conns": {},
+    }
+    config_path = tmp_path / "pglookout.json"
+    config_path.write_text(json.dumps(config))
+    lookout = PgLookout(str(config_path))
+    try:
+        yield lookout
+    finally:
+        lookout.quit()
@@ -0,0 +1,42 @@
+"""
+pglookout - decision engine benchmarks
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from .conftest import make_cluster_state, make_observer_state
+from pglookout.pglookout import PgLookout
+from pytest_benchmark.fixture import BenchmarkFixture
+
+import pytest
+
+CLUSTER_SIZES = [3, 10, 50]
+OBSERVER_COUNTS = [0, 2, 5]
+
+
+@pytest.mark.parametrize("observer_count", OBSERVER_COUNTS)
+@pytest.mark.parametrize("node_count", CLUSTER_SIZES)
+def test_create_node_map(benchmark: BenchmarkFixture, lookout: PgLookout, node_count: int, observer_count: int) -> None:
+    cluster_state = make_cluster_state(node_count)
+    observer_state = make_observer_state(observer_count, cluster_state)
+    master_instance, _, standby_nodes = benchmark(lookout.create_node_map, cluster_state, observer_state)
+    assert master_instance == "node0"
+    assert len(standby_nodes) == node_count - 1
+
+
+@pytest.mark.parametrize("node_count", CLUSTER_SIZES)
+def test_get_replication_positions(benchmark: BenchmarkFixture, lookout: PgLookout, node_count: int) -> None:
+    cluster_state = make_cluster_state(node_count)
+    standby_nodes = {instance: state for instance, state in cluster_state.items() if state["pg_is_in_recovery"]}
+    positions = benchmark(lookout.get_replication_positions, standby_nodes)
+    assert len(positions) == node_count - 1
+
+
+@pytest.mark.parametrize("observer_count", OBSERVER_COUNTS)
+@pytest.mark.parametrize("node_count", CLUSTER_SIZES)
+def test_write_cluster_state_to_json_file(
+    benchmark: BenchmarkFixture, lookout: PgLookout, node_count: int, observer_count: int
+) -> None:
+    lookout.cluster_state.update(make_cluster_state(node_count))
+    lookout.observer_state.update(make_observer_state(observer_count, lookout.cluster_state))
+    benchmark(lookout.write_cluster_state_to_json_file)
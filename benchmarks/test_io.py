@@ -0,0 +1,71 @@
+"""
+pglookout - statsd and webserver benchmarks
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from .conftest import make_cluster_state
+from pglookout.cluster_monitor import OBSERVED_FIELDS
+from pglookout.statsd import StatsClient
+from pglookout.webserver import WebServer
+from pytest_benchmark.fixture import BenchmarkFixture
+from queue import Queue
+from typing import Any, Iterator
+
+import pytest
+import requests
+import socket
+
+
+@pytest.fixture(name="udp_port")
+def fixture_udp_port() -> Iterator[int]:
+    # nothing reads from the socket, the kernel drops what doesn't fit in its buffer
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    try:
+        yield sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+@pytest.mark.parametrize("buffered", [False, True], ids=["unbuffered", "buffered"])
+def test_statsd_send(benchmark: BenchmarkFixture, udp_port: int, buffered: bool) -> None:
+    stats = StatsClient(host="127.0.0.1", port=udp_port, tags={"site": "benchmark"}, buffered=buffered)
+    try:
+        benchmark(
+            stats._send,  # pylint: disable=protected-access
+            "pg.replication_lag",
+            b"g",
+            1.5,
+            {"instance": "node1"},
+        )
+    finally:
+        stats.close()
+
+
+@pytest.mark.parametrize("projected", [False, True], ids=["full", "projected"])
+@pytest.mark.parametrize("node_count", [3, 50])
+def test_webserver_state_json(benchmark: BenchmarkFixture, node_count: int, projected: bool) -> None:
+    web = WebServer(
+        config={"http_address": "127.0.0.1", "http_port": 0},
+        cluster_state=make_cluster_state(node_count),
+        cluster_monitor_check_queue=Queue(),
+    )
+    web.start()
+    try:
+        web.is_initialized.wait(timeout=30.0)
+        assert web.server is not None
+        url = f"http://127.0.0.1:{web.server.server_address[1]}/state.json"
+        if projected:
+            # what a standby of a three node cluster fetches from an observer shared by many clusters
+            url += "?instances=node0,node1,node2&fields=" + ",".join(OBSERVED_FIELDS)
+        with requests.Session() as session:
+
+            def get_state() -> Any:
+                response = session.get(url, timeout=5)
+                response.raise_for_status()
+                return response.json()
+
+            assert len(benchmark(get_state)) == (3 if projected else node_count)
+    finally:
+        web.close()
@@ -0,0 +1,56 @@
+"""
+pglookout - parsing and formatting benchmarks
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pglookout.cluster_monitor import ClusterMonitor
+from pglookout.common import get_iso_timestamp, parse_iso_datetime
+from pglookout.pgutil import mask_connection_info, parse_connection_string_libpq
+from pytest_benchmark.fixture import BenchmarkFixture
+from typing import Any, Dict
+
+import datetime
+import pytest
+
+CONNECTION_STRING = "host=db1.example.org port=5432 dbname=postgres user=pglookout password='fake pass' sslmode=require"
+
+
+def _status_query_result(in_recovery: bool) -> Dict[str, Any]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return {
+        "db_time": now,
+        "pg_is_in_recovery": in_recovery,
+        "pg_last_xact_replay_timestamp": now - datetime.timedelta(seconds=1.5) if in_recovery else None,
+        "pg_last_xlog_receive_location": "1/AAAAAAAA" if in_recovery else None,
+        "pg_last_xlog_replay_location": "1/AAAAAAAA",
+    }
+
+
+@pytest.mark.parametrize("in_recovery", [True, False], ids=["standby", "master"])
+def test_parse_status_query_result(benchmark: BenchmarkFixture, in_recovery: bool) -> None:
+    # the result is modified in place, so every round needs a fresh one
+    result = benchmark.pedantic(
+        ClusterMonitor._parse_status_query_result,  # pylint: disable=protected-access
+        setup=lambda: ((_status_query_result(in_recovery),), {}),
+        rounds=2000,
+    )
+    assert result["connection"] is True
+
+
+def test_parse_iso_datetime(benchmark: BenchmarkFixture) -> None:
+    timestamp = get_iso_timestamp(datetime.datetime(2026, 1, 1, 12, 30, 45, 123456))
+    assert benchmark(parse_iso_datetime, timestamp) == datetime.datetime(2026, 1, 1, 12, 30, 45, 123456)
+
+
+def test_get_iso_timestamp(benchmark: BenchmarkFixture) -> None:
+    fetch_time = datetime.datetime(2026, 1, 1, 12, 30, 45, 123456, tzinfo=datetime.timezone.utc)
+    assert benchmark(get_iso_timestamp, fetch_time) == "2026-01-01T12:30:45.123456Z"
+
+
+def test_parse_connection_string_libpq(benchmark: BenchmarkFixture) -> None:
+    assert benchmark(parse_connection_string_libpq, CONNECTION_STRING)["password"] == "fake pass"
+
+
+def test_mask_connection_info(benchmark: BenchmarkFixture) -> None:
+    assert benchmark(mask_connection_info, CONNECTION_STRING).endswith("; hidden password")
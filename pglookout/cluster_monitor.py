@@ -10,10 +10,17 @@ See the file `LICENSE` for details.
 
 from . import logutil
 from .common import get_iso_timestamp, parse_iso_datetime
-from .pgutil import mask_connection_info
+from .failover_trace import FailoverTracer
+from .history import ClusterHistory, DEFAULT_HISTORY_SIZE
+from .latency import LatencyEstimator
+from .pgutil import get_connection_info, mask_connection_info
+from .schedule import next_phase_time, OBSERVER_FETCH_MARGIN, parse_round_schedule, poll_phase
+from .throughput import DEFAULT_WAL_RATE_WINDOW, ReplicationThroughput, THROUGHPUT_FIELDS
+from .watchdog import LoopWatchdog
 from concurrent.futures import as_completed, ThreadPoolExecutor
 from dataclasses import asdict, dataclass
 from email.utils import parsedate
+from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
 from queue import Empty
 from threading import Thread
@@ -22,11 +29,44 @@ from typing import List
 import datetime
 import errno
 import logging
+import math
 import psycopg2
 import requests
 import select
 import time
 
+# fields of the nodes' state used from the state of observers, the rest isn't fetched
+OBSERVED_FIELDS = (
+    "connection",
+    "db_time",
+    "fetch_time",
+    "pg_is_in_recovery",
+    "pg_last_xlog_receive_location",
+    "pg_last_xlog_replay_location",
+)
+# how long what an observer reported is kept after it can no longer be reached
+DEFAULT_OBSERVER_STATE_MAX_AGE = 300.0
+# bounds of the probe timeouts adapted to the latency of each node and observer
+DEFAULT_DB_TIMEOUT_MIN = 0.5
+DEFAULT_DB_TIMEOUT_MAX = 5.0
+DEFAULT_OBSERVER_TIMEOUT_MIN = 1.0
+DEFAULT_OBSERVER_TIMEOUT_MAX = 5.0
+# fields of the rows of pg_stat_replication kept in the state of the standbys they describe
+REPLICATION_VIEW_FIELDS = (
+    "state",
+    "sync_state",
+    "sent_lsn",
+    "write_lsn",
+    "flush_lsn",
+    "replay_lsn",
+    "write_lag",
+    "flush_lag",
+    "replay_lag",
+)
+# how the master is made to write WAL every db_poll_interval: "txid", "message", "table" or "none"
+DEFAULT_HEARTBEAT_STRATEGY = "txid"
+DEFAULT_HEARTBEAT_TABLE = "pglookout_heartbeat"
+
 
 class PglookoutTimeout(Exception):
     pass
@@ -44,6 +84,62 @@ class ReplicationSlot:
     state_data: str
 
 
+class ProbeTimer:
+    """Measures the durations of the consecutive phases of a single probe"""
+
+    def __init__(self):
+        self.timings = {}
+        self._phase = None
+        self._phase_start = None
+
+    def start(self, phase):
+        self.stop()
+        self._phase, self._phase_start = phase, time.monotonic()
+
+    def stop(self):
+        if self._phase:
+            self.timings[self._phase] = time.monotonic() - self._phase_start
+            self._phase = None
+
+
+class MasterLossCheck:
+    """Request for a monitoring round that is reported complete as soon as the loss of `master` is settled.
+
+    Our own probe of the master and every observer count as one source each.  The loss is
+    confirmed once a majority of the sources report the master unreachable and refuted as
+    soon as any source reports it connected."""
+
+    def __init__(self, master, observers):
+        self.master = master
+        self.sources = {None} | set(observers)
+        self.reported_gone = set()
+        self.reported_connected = set()
+        self.start_time = time.monotonic()
+
+    def __repr__(self):
+        return f"MasterLossCheck(master={self.master!r}, gone={self.reported_gone!r}, connected={self.reported_connected!r})"
+
+    @property
+    def quorum(self):
+        return len(self.sources) // 2 + 1
+
+    def add_report(self, source, master_state):
+        """Add the state of the master as seen by `source`, None for our own probe of it"""
+        if source not in self.sources or not master_state:
+            return
+        if master_state.get("connection"):
+            self.reported_connected.add(source)
+        else:
+            self.reported_gone.add(source)
+
+    def result(self):
+        if self.reported_connected:
+            return "master_connected"
+        if len(self.reported_gone) >= self.quorum:
+            return "master_gone"
+        return None
+
+
 def wait_select(conn, timeout=5.0):
     end_time = time.monotonic() + timeout
     while time.monotonic() < end_time:
@@ -61,7 +157,7 @@ def wait_select(conn, timeout=5.0):
         except select.error as error:
             if error.args[0] != errno.EINTR:
                 raise
-    raise PglookoutTimeout("timed out in wait_select")
+    raise PglookoutTimeout(f"timed out in wait_select after {timeout:.3f}s")
 
 
 class ClusterMonitor(Thread):
@@ -75,26 +171,44 @@ class ClusterMonitor(Thread):
         failover_decision_queue,
         is_replication_lag_over_warning_limit,
         stats,
+        history=None,
+        failover_tracer=None,
+        session=None,
+        cluster_name=None,
+        watchdog=None,
     ):
         """Thread which collects cluster state.
 
         Basically a loop which tries to connect to each cluster member and
         to external observers for status information. The information is collected
         in the cluster_state/observer_state dictionaries, which are shared with the main thread.
+
+        `cluster_name` is set when the cluster is one of many monitored by a MultiClusterMonitor,
+        which then runs the monitoring rounds instead of this thread.
         """
         Thread.__init__(self)
-        self.log = logging.getLogger("ClusterMonitor")
+        self.log = logging.getLogger(f"ClusterMonitor.{cluster_name}" if cluster_name else "ClusterMonitor")
         self.stats = stats
+        self.stats_tags = {"cluster": cluster_name} if cluster_name else {}
         self.running = True
         self.cluster_state = cluster_state
         self.observer_state = observer_state
         self.config = config
         self.create_alert_file = create_alert_file
         self.db_conns = {}
+        self.connect_durations = {}
+        # latency estimators of the connects and queries of each node and the fetches from each observer
+        self.latencies = {}
         self.cluster_monitor_check_queue = cluster_monitor_check_queue
         self.failover_decision_queue = failover_decision_queue
         self.is_replication_lag_over_warning_limit = is_replication_lag_over_warning_limit
-        self.session = requests.Session()
+        self.session = session or requests.Session()
+        self.history = history or ClusterHistory(capacity=self.config.get("history_size", DEFAULT_HISTORY_SIZE))
+        self.failover_tracer = failover_tracer or FailoverTracer(stats=stats)
+        self.watchdog = watchdog or LoopWatchdog(stats=stats)
+        # observers whose state was last fetched through the observer_aggregator
+        self.aggregated_observers = set()
+        self.throughput = ReplicationThroughput(window=self.config.get("wal_rate_window", DEFAULT_WAL_RATE_WINDOW))
         if self.config.get("syslog"):
             self.syslog_handler = logutil.set_syslog_handler(
                 address=self.config.get("syslog_address", "/dev/log"),
@@ -102,6 +216,12 @@ class ClusterMonitor(Thread):
                 logger=self.log,
             )
         self.last_monitoring_success_time = None
+        # wall clock start time of the next scheduled round and duration of the last round, advertised to other pglookouts
+        self.next_round_time = None
+        self.last_round_duration = None
+        # the rounds observers advertise and the wall clock times their state was last fetched
+        self.observer_rounds = {}
+        self.observer_fetch_times = {}
         self.log.debug("Initialized ClusterMonitor with: %r", cluster_state)
 
     def _connect_to_db(self, instance, dsn):
@@ -113,14 +233,15 @@ class ClusterMonitor(Thread):
             return None
         masked_connection_info = mask_connection_info(dsn)
         inst_info_str = f"{instance!r} ({masked_connection_info})"
+        start_time = time.monotonic()
         try:
             self.log.info("Connecting to %s", inst_info_str)
             conn = psycopg2.connect(dsn=dsn, async_=True)
-            wait_select(conn)
+            self._wait_select(instance, conn, kind="connect")
             self.log.debug("Connected to %s", inst_info_str)
             cursor = conn.cursor()
             cursor.execute("SET synchronous_commit = off")
-            wait_select(conn)
+            self._wait_select(instance, conn)
             self.log.debug("synchronous_commit set to off in the session")
         except (PglookoutTimeout, psycopg2.OperationalError) as ex:
             self.log.warning(
@@ -137,14 +258,46 @@ class ClusterMonitor(Thread):
             self.log.exception("Failed to connect to %s (%s)", instance, inst_info_str)
             self.stats.unexpected_exception(ex, where="_connect_to_db")
             conn = None
+        self.connect_durations[instance] = time.monotonic() - start_time
         self.db_conns[instance] = conn
         return conn
 
-    def _fetch_observer_state(self, instance, uri):
+    def _wait_select(self, instance, conn, kind="query"):
+        """wait_select() with a timeout adapted to the latency `kind` operations on `instance` normally have"""
+        estimator = self.latencies.setdefault((instance, kind), LatencyEstimator())
+        timeout = estimator.timeout(
+            self.config.get("db_timeout_min", DEFAULT_DB_TIMEOUT_MIN),
+            self.config.get("db_timeout_max", DEFAULT_DB_TIMEOUT_MAX),
+        )
+        start_time = time.monotonic()
+        try:
+            wait_select(conn, timeout=timeout)
+        except PglookoutTimeout:
+            estimator.timed_out()
+            raise
+        estimator.add(time.monotonic() - start_time)
+
+    def _fetch_observer_state(self, instance, uri, resource="state.json"):
         result = {"fetch_time": get_iso_timestamp(), "connection": True}
-        fetch_uri = uri + "/state.json"
+        fetch_uri = f"{uri}/{resource}"
+        # only the state of our own nodes is of interest, an observer can monitor many clusters
+        params = {"instances": ",".join(self.config.get("remote_conns", {})), "fields": ",".join(OBSERVED_FIELDS)}
+        estimator = self.latencies.setdefault((instance, "observer"), LatencyEstimator())
+        timeout = estimator.timeout(
+            self.config.get("observer_timeout_min", DEFAULT_OBSERVER_TIMEOUT_MIN),
+            self.config.get("observer_timeout_max", DEFAULT_OBSERVER_TIMEOUT_MAX),
+        )
+        timer = ProbeTimer()
+        self.observer_fetch_times[instance] = time.time()
+        self.observer_rounds.pop(instance, None)
         try:
-            response = self.session.get(fetch_uri, timeout=5.0)
+            timer.start("http_fetch")
+            response = self.session.get(fetch_uri, params=params, timeout=timeout)
+            timer.stop()
+            estimator.add(timer.timings["http_fetch"])
+            schedule = parse_round_schedule(response.headers)
+            if schedule:
+                self.observer_rounds[instance] = schedule
 
             # check time difference for large skews
             remote_server_time = parsedate(response.headers["date"])
@@ -158,8 +311,12 @@ class ClusterMonitor(Thread):
                     response.json(),
                 )  # pylint: disable=no-member
                 return None
+            timer.start("json_decode")
             result.update(response.json())  # pylint: disable=no-member
-        except requests.ConnectionError as ex:
+            timer.stop()
+        except (requests.ConnectionError, requests.Timeout) as ex:
+            if isinstance(ex, requests.Timeout):
+                estimator.timed_out()
             self.log.warning(
                 "%s (%s) fetching state from observer: %r, %r",
                 ex.__class__.__name__,
@@ -172,33 +329,130 @@ class ClusterMonitor(Thread):
             self.log.exception("Problem in fetching state from observer: %r, %r", instance, fetch_uri)
             self.stats.unexpected_exception(ex, where="_fetch_observer_state")
             result["connection"] = False
+        timer.stop()
+        self.emit_probe_timings(instance, timer.timings)
         return result
 
+    def _retain_observer_state(self, previous, result):
+        """The state kept of an observer: `result` limited to the nodes of our own cluster and the fields we use.
+
+        Nodes an observer no longer reports are dropped.  While it can't be reached, what it reported before is
+        kept until it's older than observer_state_max_age."""
+        state = {key: value for key, value in result.items() if not isinstance(value, dict)}
+        if result.get("connection"):
+            reported = result
+        else:
+            max_age = self.config.get("observer_state_max_age", DEFAULT_OBSERVER_STATE_MAX_AGE)
+            oldest = parse_iso_datetime(result["fetch_time"]) - datetime.timedelta(seconds=max_age)
+            reported = {
+                instance: node
+                for instance, node in previous.items()
+                if isinstance(node, dict) and "fetch_time" in node and parse_iso_datetime(node["fetch_time"]) >= oldest
+            }
+        nodes = self.config.get("remote_conns", {})
+        for instance, node in reported.items():
+            if instance in nodes and isinstance(node, dict):
+                state[instance] = {field: node[field] for field in OBSERVED_FIELDS if field in node}
+        return state
+
+    def _store_observer_state(self, instance, result, took):
+        self.observer_state[instance] = self._retain_observer_state(self.observer_state.get(instance, {}), result)
+        self.history.record_observer(instance, result, timestamp=time.time(), probe_latency=took)
+        incident_master = self.failover_tracer.incident_master
+        if incident_master and result.get("connection") and result.get(incident_master, {}).get("connection") is False:
+            self.failover_tracer.record_once("observer_confirmation", observer=instance)
+
     def fetch_observer_state(self, instance, uri):
         start_time = time.monotonic()
         result = self._fetch_observer_state(instance, uri)
+        took = time.monotonic() - start_time
         if result:
-            if instance in self.observer_state:
-                self.observer_state[instance].update(result)
-            else:
-                self.observer_state[instance] = result
+            self._store_observer_state(instance, result, took)
         self.log.debug(
             "Observer: %r state was: %r, took: %.4fs to fetch",
             instance,
             result,
-            time.monotonic() - start_time,
+            took,
+        )
+
+    def fetch_aggregated_observer_state(self, aggregator, uri):
+        """Fetch the state of an aggregating observer along with the states of the other observers it polls
+
+        Each observer's state is stored under its own name with the aggregator in "via", so it still counts
+        as one source in the quorum.  Observers missing from the aggregated state or with state older than
+        two db_poll_intervals are polled directly from the next round on."""
+        start_time = time.monotonic()
+        result = self._fetch_observer_state(aggregator, uri, resource="observers.json")
+        took = time.monotonic() - start_time
+        observers = self.config.get("observers", {})
+        sources = {}
+        if result and result["connection"]:
+            fetch_time = parse_iso_datetime(result["fetch_time"])
+            max_age = datetime.timedelta(seconds=2 * self.config.get("db_poll_interval", 5.0))
+            for observer, state in result.get("observers", {}).items():
+                # only observers we'd poll ourselves, as seen by the aggregator itself
+                if observer not in observers or observer == aggregator or "via" in state or "fetch_time" not in state:
+                    continue
+                if fetch_time - parse_iso_datetime(state["fetch_time"]) > max_age:
+                    self.log.warning("Aggregated state of observer %r from %r is stale: %r", observer, aggregator, state)
+                    continue
+                sources[observer] = dict(state, via=aggregator)
+            own_state = {"fetch_time": result["fetch_time"], "connection": True, **result.get("state", {})}
+        else:
+            own_state = result and {"fetch_time": result["fetch_time"], "connection": False}
+        if own_state:
+            self._store_observer_state(aggregator, own_state, took)
+        for observer, state in sources.items():
+            self._store_observer_state(observer, state, took)
+        for observer in self.aggregated_observers - set(sources):
+            # don't count the last state we got through the aggregator as current, the observer is polled directly next
+            self.log.info("No current state of observer %r from %r, polling it directly", observer, aggregator)
+            self._store_observer_state(
+                observer, {"fetch_time": get_iso_timestamp(), "connection": False, "via": aggregator}, took
+            )
+        self.aggregated_observers = set(sources)
+        self.log.debug(
+            "Aggregated observer: %r state was: %r with %r, took: %.4fs to fetch",
+            aggregator,
+            own_state,
+            sorted(sources),
+            took,
         )
 
     def connect_to_cluster_nodes_and_cleanup_old_nodes(self):
+        self.cleanup_old_nodes()
+        #  Making sure we have a connection to all currently configured db hosts
+        for instance, connect_string in self.config.get("remote_conns", {}).items():
+            self._connect_to_db(instance, dsn=connect_string)
+
+    def cleanup_old_nodes(self):
+        """Drop the state of nodes removed from the config and add the new ones without connecting to them
+
+        The probes of nodes without a connection open one."""
         leftover_conns = set(self.db_conns) - set(self.config.get("remote_conns", {}))
         for leftover_instance in leftover_conns:
             self.log.debug("Removing leftover state for: %r", leftover_instance)
             self.db_conns.pop(leftover_instance)
+            self.connect_durations.pop(leftover_instance, None)
             self.cluster_state.pop(leftover_instance, "")
-            self.observer_state.pop(leftover_instance, "")
-        #  Making sure we have a connection to all currently configured db hosts
-        for instance, connect_string in self.config.get("remote_conns", {}).items():
-            self._connect_to_db(instance, dsn=connect_string)
+        for leftover_observer in set(self.observer_state) - set(self.config.get("observers", {})):
+            self.log.debug("Removing leftover state for observer: %r", leftover_observer)
+            self.observer_state.pop(leftover_observer)
+            self.aggregated_observers.discard(leftover_observer)
+            self.observer_rounds.pop(leftover_observer, None)
+            self.observer_fetch_times.pop(leftover_observer, None)
+        monitored = set(self.config.get("remote_conns", {})) | set(self.config.get("observers", {}))
+        for key in [key for key in self.latencies if key[0] not in monitored]:
+            del self.latencies[key]
+        self.history.prune(nodes=self.config.get("remote_conns", {}), observers=self.config.get("observers", {}))
+        for instance in self.config.get("remote_conns", {}):
+            self.db_conns.setdefault(instance, None)
+
+    def close_connections(self):
+        for conn in self.db_conns.values():
+            if conn:
+                conn.close()
+        self.db_conns.clear()
 
     def _fetch_replication_slot_info(self, instance: str, cursor: RealDictCursor) -> List[ReplicationSlot]:
         """Fetch logical replication slot definitions"""
@@ -220,11 +474,54 @@ class ClusterMonitor(Thread):
                             WHERE slot_type = 'logical' AND NOT temporary
         """
         )
-        wait_select(cursor.connection)
+        self._wait_select(instance, cursor.connection)
         replication_slots = [ReplicationSlot(**slot) for slot in cursor.fetchall()]
         self.log.debug("found %d replication slot(s)", len(replication_slots))
         return replication_slots
 
+    def _fetch_replication_view(self, instance, cursor):
+        """Fetch the standbys replicating from the master as seen in pg_stat_replication"""
+        self.log.debug("reading replication state from %r", instance)
+        cursor.execute(
+            """SELECT application_name,
+                      client_addr::text AS client_addr,
+                      state,
+                      sync_state,
+                      sent_lsn,
+                      write_lsn,
+                      flush_lsn,
+                      replay_lsn,
+                      EXTRACT(EPOCH FROM write_lag)::float8 AS write_lag,
+                      EXTRACT(EPOCH FROM flush_lag)::float8 AS flush_lag,
+                      EXTRACT(EPOCH FROM replay_lag)::float8 AS replay_lag
+                    FROM pg_catalog.pg_stat_replication
+        """
+        )
+        self._wait_select(instance, cursor.connection)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def _map_replication_view(self, rows):
+        """The rows of pg_stat_replication by the instance they describe.
+
+        A row belongs to the instance named by its application_name, or failing that, to the only instance
+        connected to at its client address."""
+        remote_conns = self.config.get("remote_conns", {})
+        hosts = {}
+        for instance, dsn in remote_conns.items():
+            try:
+                hosts.setdefault(get_connection_info(dsn).get("host"), []).append(instance)
+            except ValueError:
+                continue
+        views = {}
+        for row in rows:
+            instance = row.get("application_name")
+            if instance not in remote_conns:
+                candidates = hosts.get(row.get("client_addr"), [])
+                instance = candidates[0] if len(candidates) == 1 else None
+            if instance is not None:
+                views[instance] = {field: row.get(field) for field in REPLICATION_VIEW_FIELDS}
+        return views
+
     def _query_cluster_member_state(self, instance, db_conn):
         """Query a single cluster member for its state"""
         f_result = None
@@ -234,6 +531,7 @@ class ClusterMonitor(Thread):
             if not db_conn:
                 return result
         phase = "querying status from"
+        timer = ProbeTimer()
         try:
             self.log.debug("%s %r", phase, instance)
             c = db_conn.cursor(cursor_factory=RealDictCursor)
@@ -254,8 +552,9 @@ class ClusterMonitor(Thread):
                     "pg_last_xlog_replay_location()",
                 ]
             joined_fields = ", ".join(fields)
+            timer.start("status_query")
             c.execute(f"SELECT {joined_fields}")
-            wait_select(c.connection)
+            self._wait_select(instance, c.connection)
             maybe_standby_result = c.fetchone()
             if maybe_standby_result["pg_is_in_recovery"]:
                 f_result = maybe_standby_result
@@ -266,25 +565,29 @@ class ClusterMonitor(Thread):
                     wal_lsn_column = "pg_current_wal_lsn() AS pg_last_xlog_replay_location"
                 else:
                     wal_lsn_column = "pg_current_xlog_location() AS pg_last_xlog_replay_location"
+                timer.start("master_lsn_query")
                 c.execute(f"SELECT {wal_lsn_column}")
-                wait_select(c.connection)
+                self._wait_select(instance, c.connection)
                 master_position = c.fetchone()
                 maybe_standby_result["pg_last_xlog_replay_location"] = master_position["pg_last_xlog_replay_location"]
                 f_result = maybe_standby_result
 
                 if db_conn.server_version >= 100000:
+                    timer.start("slot_query")
                     f_result["replication_slots"] = [asdict(slot) for slot in self._fetch_replication_slot_info(instance, c)]
-
-                # This is only run on masters to create txid traffic every db_poll_interval
-                phase = "updating transaction on"
-                self.log.debug("%s %r", phase, instance)
-                # With pg_current_wal_lsn we simulate replay_location on the master
-                # With txid_current we force a new transaction to occur every poll interval to ensure there's
-                # a heartbeat for the replication lag.
-                c.execute(f"SELECT txid_current(), {wal_lsn_column}")
-                wait_select(c.connection)
-                master_result = c.fetchone()
-                f_result["pg_last_xlog_replay_location"] = master_result["pg_last_xlog_replay_location"]
+                    timer.start("replication_query")
+                    f_result["replication"] = self._fetch_replication_view(instance, c)
+
+                # This is only run on masters to create WAL traffic every db_poll_interval
+                heartbeat = self.config.get("heartbeat_strategy", DEFAULT_HEARTBEAT_STRATEGY)
+                if heartbeat != "none":
+                    phase = "writing heartbeat on"
+                    self.log.debug("%s %r", phase, instance)
+                    timer.start(f"{heartbeat}_heartbeat")
+                    # With pg_current_wal_lsn we simulate replay_location on the master
+                    heartbeat_position = self._write_heartbeat(instance, c, heartbeat, wal_lsn_column)
+                    if heartbeat_position:
+                        f_result["pg_last_xlog_replay_location"] = heartbeat_position
         except (
             PglookoutTimeout,
             psycopg2.DatabaseError,
@@ -294,11 +597,42 @@ class ClusterMonitor(Thread):
             self.log.warning("%s (%s) %s %s", ex.__class__.__name__, str(ex).strip(), phase, instance)
             db_conn.close()
             self.db_conns[instance] = None
+        timer.stop()
 
         if f_result:
             result.update(self._parse_status_query_result(f_result))
+        result["probe_timings"] = timer.timings
         return result
 
+    def _write_heartbeat(self, instance, cursor, strategy, wal_lsn_column):
+        """Write WAL on the master so there's something for the standbys to replay, returns the WAL position after it
+
+        None is returned if the heartbeat wasn't written because of missing privileges or a missing heartbeat table,
+        or if the position wasn't read along with it."""
+        try:
+            if strategy == "table":
+                # Only the first poller of an interval updates the row.  Updating no rows doesn't consume an XID.
+                table = sql.Identifier(*self.config.get("heartbeat_table", DEFAULT_HEARTBEAT_TABLE).split("."))
+                query = "UPDATE {} SET heartbeat_time = now() WHERE heartbeat_time <= now() - %s * INTERVAL '1 second'"
+                cursor.execute(sql.SQL(query).format(table), [self.config.get("db_poll_interval", 5.0)])
+                self._wait_select(instance, cursor.connection)
+                self.log.debug("Updated %d heartbeat row(s) on %r", cursor.rowcount, instance)
+                return None
+            if strategy == "message" and cursor.connection.server_version >= 90600:
+                # a non-transactional message writes WAL without consuming an XID
+                cursor.execute(f"SELECT pg_logical_emit_message(false, 'pglookout_heartbeat', ''), {wal_lsn_column}")
+            else:
+                # a new transaction every interval keeps the replay timestamps of the standbys current
+                cursor.execute(f"SELECT txid_current(), {wal_lsn_column}")
+            self._wait_select(instance, cursor.connection)
+            return cursor.fetchone()["pg_last_xlog_replay_location"]
+        except psycopg2.ProgrammingError as ex:
+            self.log.warning(
+                "%s (%s) writing %s heartbeat on %r", ex.__class__.__name__, str(ex).strip(), strategy, instance
+            )
+            self.stats.increase("heartbeat_failed", tags={**self.stats_tags, "instance": instance, "strategy": strategy})
+            return None
+
     @staticmethod
     def _parse_status_query_result(result):
         if not result:
@@ -328,13 +662,21 @@ class ClusterMonitor(Thread):
         """Update the cluster state entry for a single cluster member"""
         start_time = time.monotonic()
         result = self._query_cluster_member_state(instance, db_conn)
+        took = time.monotonic() - start_time
+        connect_duration = self.connect_durations.pop(instance, None)
+        if connect_duration is not None:
+            result.setdefault("probe_timings", {})["connect"] = connect_duration
+        self.emit_probe_timings(instance, result.get("probe_timings", {}))
         self.log.debug(
             "DB state gotten from: %r was: %r, took: %.4fs to fetch",
             instance,
             result,
-            time.monotonic() - start_time,
+            took,
         )
+        self.history.record_node(instance, result, timestamp=time.time(), probe_latency=took)
+        self.trace_member_state(instance, result)
         if instance in self.cluster_state:
+            self.cluster_state[instance].pop("restored_age", None)
             self.cluster_state[instance].update(result)
         else:
             self.cluster_state[instance] = result
@@ -352,31 +694,251 @@ class ClusterMonitor(Thread):
             else:
                 self.cluster_state[instance]["min_replication_time_lag"] = min(min_lag, now_lag)
 
+    def trace_member_state(self, instance, result):
+        """Start or end failover traces based on the master going away or a master answering"""
+        if result.get("connection") and result.get("pg_is_in_recovery") is False:
+            self.failover_tracer.master_seen(instance)
+            return
+        previous = self.cluster_state.get(instance, {})
+        if not result.get("connection") and previous.get("connection") and previous.get("pg_is_in_recovery") is False:
+            self.failover_tracer.start(instance, fetch_time=result.get("fetch_time"))
+
+    def emit_probe_timings(self, instance, timings):
+        for phase, duration in timings.items():
+            self.stats.timing(
+                "probe_phase", round(duration * 1000.0, 3), tags={**self.stats_tags, "instance": instance, "phase": phase}
+            )
+
+    def update_replication_view(self):
+        """Add what the master reports of each standby in pg_stat_replication to the state of the standby.
+
+        The view is stored under "master_view", None if the master doesn't see the standby replicating from it.
+        The positions of standbys we couldn't reach ourselves are taken from the view and "positions_from" names
+        the master they came from.  They don't make the standbys promotion candidates as they aren't connected."""
+        masters = [
+            instance
+            for instance, state in self.cluster_state.items()
+            if state.get("connection") and state.get("pg_is_in_recovery") is False and state.get("replication") is not None
+        ]
+        for instance, state in self.cluster_state.items():
+            state.pop("master_view", None)
+            if state.get("pg_is_in_recovery"):
+                # the view a standby reported back when it was the master
+                state.pop("replication", None)
+        if len(masters) != 1:
+            return
+        master = masters[0]
+        views = self._map_replication_view(self.cluster_state[master]["replication"])
+        for instance, state in self.cluster_state.items():
+            if instance == master:
+                continue
+            view = views.get(instance)
+            state["master_view"] = view
+            tags = {**self.stats_tags, "instance": instance}
+            if state.get("connection"):
+                state["positions_from"] = None
+                if state.get("pg_is_in_recovery"):
+                    # standbys replicating from another standby aren't in the master's view
+                    self.stats.gauge("pg.replicating_from_master", int(view is not None), tags=tags)
+            elif view is not None:
+                state["pg_last_xlog_receive_location"] = view["flush_lsn"]
+                state["pg_last_xlog_replay_location"] = view["replay_lsn"]
+                state["positions_from"] = master
+            for field in ("write_lag", "flush_lag", "replay_lag"):
+                if view is not None and view[field] is not None:
+                    self.stats.gauge(f"pg.{field}", view[field], tags=tags)
+
+    def update_replication_throughput(self):
+        """Derive WAL rates, byte lag and catch-up estimates from the positions gathered in this round"""
+        self.throughput.update(self.cluster_state, time.monotonic())
+        for instance, state in self.cluster_state.items():
+            # without a transaction committed on the primary in every interval the replay timestamp of an idle
+            # standby falls behind, the time the primary was at the replayed position bounds the lag as well
+            position_lag = state.get("replication_position_lag")
+            time_lag = state.get("replication_time_lag")
+            if position_lag is not None and (time_lag is None or position_lag < time_lag):
+                state["replication_time_lag"] = position_lag
+                state["min_replication_time_lag"] = min(state.get("min_replication_time_lag", position_lag), position_lag)
+            for field in THROUGHPUT_FIELDS:
+                value = state.get(field)
+                # a standby that isn't gaining on the primary has an infinite catch-up estimate
+                if value is not None and math.isfinite(value):
+                    self.stats.gauge(f"pg.{field}", value, tags={**self.stats_tags, "instance": instance})
+
+    def _add_master_loss_report(self, check, instance, is_observer):
+        if is_observer:
+            observers = [instance]
+            if instance == self.config.get("observer_aggregator"):
+                observers.extend(self.aggregated_observers)
+            for observer in observers:
+                observer_state = self.observer_state.get(observer, {})
+                if observer_state.get("connection"):
+                    check.add_report(observer, observer_state.get(check.master))
+        elif instance == check.master:
+            check.add_report(None, self.cluster_state.get(instance))
+        return check.result()
+
+    def _should_poll_observers(self):
+        return not self.config.get("poll_observers_on_warning_only") or self.is_replication_lag_over_warning_limit()
+
+    def submit_probes(self, executor, skip_observers=()):
+        """Submit the probes of a monitoring round, returns their futures mapped to (instance, is_observer)"""
+        futures = {}
+        for instance, db_conn in self.db_conns.items():
+            futures[executor.submit(self.update_cluster_member_state, instance, db_conn)] = (instance, False)
+        if self._should_poll_observers():
+            observers = self.config.get("observers", {})
+            aggregator = self.config.get("observer_aggregator")
+            if aggregator not in observers:
+                self.aggregated_observers = set()
+            for instance, uri in observers.items():
+                if instance in skip_observers:
+                    continue
+                if instance == aggregator:
+                    futures[executor.submit(self.fetch_aggregated_observer_state, instance, uri)] = (instance, True)
+                elif instance not in self.aggregated_observers:
+                    futures[executor.submit(self.fetch_observer_state, instance, uri)] = (instance, True)
+        return futures
+
+    def scheduled_observer_fetches(self):
+        """Wall clock times to fetch the state of the observers that advertise their rounds, right after the next one
+
+        Observers whose advertised round should already have been followed by a newer one, or which advertise a round
+        more than two db_poll_intervals away, are left to the regular rounds until they advertise a current schedule."""
+        if not self.config.get("coordinate_observer_polls") or not self._should_poll_observers():
+            return {}
+        observers = self.config.get("observers", {})
+        latest = time.time() + 2 * self.config.get("db_poll_interval", 5.0)
+        scheduled = {}
+        for instance, schedule in list(self.observer_rounds.items()):
+            if instance not in observers or instance in self.aggregated_observers:
+                continue
+            fetch_time = schedule["next_round"] + schedule["duration"] + OBSERVER_FETCH_MARGIN
+            if self.observer_fetch_times.get(instance, 0.0) < fetch_time <= latest:
+                scheduled[instance] = fetch_time
+        return scheduled
+
+    def fetch_scheduled_observers(self, instances):
+        observers = self.config.get("observers", {})
+        aggregator = self.config.get("observer_aggregator")
+        with ThreadPoolExecutor(max_workers=len(instances)) as tex:
+            futures = {
+                tex.submit(
+                    self.fetch_aggregated_observer_state if instance == aggregator else self.fetch_observer_state,
+                    instance,
+                    observers[instance],
+                ): instance
+                for instance in instances
+            }
+            for future in as_completed(futures):
+                if future.exception():
+                    self.log.error("Got error: %r when fetching the state of %r", future.exception(), futures[future])
+
     def main_monitoring_loop(self, requested_check=False):
         self.connect_to_cluster_nodes_and_cleanup_old_nodes()
         thread_count = len(self.db_conns) + len(self.config.get("observers", {}))
-        futures = []
-        always_observers = not self.config.get("poll_observers_on_warning_only")
+        master_loss_check = requested_check if isinstance(requested_check, MasterLossCheck) else None
+        check_result = None
+        # observers polled right after their own rounds are left out of the regular ones, but not of master loss checks
+        scheduled_observers = () if master_loss_check else self.scheduled_observer_fetches()
         with ThreadPoolExecutor(max_workers=thread_count) as tex:
-            for instance, db_conn in self.db_conns.items():
-                futures.append(tex.submit(self.update_cluster_member_state, instance, db_conn))
-            if always_observers or self.is_replication_lag_over_warning_limit():
-                for instance, uri in self.config.get("observers", {}).items():
-                    futures.append(tex.submit(self.fetch_observer_state, instance, uri))
+            futures = self.submit_probes(tex, skip_observers=scheduled_observers)
             for future in as_completed(futures):
+                if future.cancelled():
+                    continue
                 if future.exception():
                     self.log.error("Got error: %r when checking cluster state", future.exception())
-        if requested_check:
+                elif master_loss_check and not check_result:
+                    check_result = self._add_master_loss_report(master_loss_check, *futures[future])
+                    if check_result:
+                        # don't make the failover decision wait for the probes that are still running, their
+                        # connections can't be safely abandoned so they are left to finish in the background
+                        pending = [instance for other, (instance, _) in futures.items() if not other.done()]
+                        self.report_master_loss_check(master_loss_check, check_result, pending)
+                        for other in futures:
+                            other.cancel()
+        self.update_replication_view()
+        self.update_replication_throughput()
+        if master_loss_check and not check_result:
+            self.report_master_loss_check(master_loss_check, "completed", [])
+        elif requested_check and not master_loss_check:
             self.failover_decision_queue.put("Completed requested monitoring loop")
 
         self.last_monitoring_success_time = time.monotonic()
 
+    def report_master_loss_check(self, check, check_result, pending):
+        duration = time.monotonic() - check.start_time
+        self.log.info(
+            "Master loss check %r result: %r, took: %.2fs, still pending: %r", check, check_result, duration, pending
+        )
+        self.stats.timing("master_loss_check", round(duration * 1000.0, 3), tags={"result": check_result})
+        self.failover_tracer.record("master_loss_check", result=check_result, pending=pending)
+        self.failover_decision_queue.put(f"Completed master loss check: {check_result}")
+
+    def get_round_schedule(self):
+        """Start time of the next scheduled round and the duration of the last one, None before they're known"""
+        if self.next_round_time is None or self.last_round_duration is None:
+            return None
+        return {"next_round": self.next_round_time, "duration": self.last_round_duration}
+
+    def _wait(self, timeout):
+        """Wait at most `timeout` seconds for a requested check, returns it or False"""
+        wait_start = time.monotonic()
+        try:
+            return self.cluster_monitor_check_queue.get(timeout=timeout)
+        except Empty:
+            return False
+        finally:
+            self.watchdog.waited("cluster_monitor", time.monotonic() - wait_start, timeout)
+
+    def wait_for_round(self):
+        """Wait until the next round at our phase of db_poll_interval or a requested check, returns the check or False
+
+        The states of observers that advertise their rounds are fetched while waiting, right after their rounds."""
+        interval = self.config.get("db_poll_interval", 5.0)
+        self.next_round_time = next_phase_time(time.time(), interval, poll_phase(self.config))
+        while self.running:
+            now = time.time()
+            fetches = self.scheduled_observer_fetches()
+            due = [instance for instance, fetch_time in fetches.items() if fetch_time <= now]
+            if due:
+                self.fetch_scheduled_observers(due)
+                continue
+            requested_check = self._wait(max(min([self.next_round_time, *fetches.values()]) - now, 0.0))
+            if requested_check:
+                return self.delay_requested_check(requested_check)
+            if time.time() >= self.next_round_time:
+                break
+        return False
+
+    def delay_requested_check(self, requested_check):
+        """Delay `requested_check` by our phase of check_jitter, unless it's a master loss check
+
+        All pglookouts of a cluster get checks requested at once, for example after a config change or a promotion.
+        Checks requested during the delay are covered by the delayed round, but a master loss check supersedes it."""
+        jitter = self.config.get("check_jitter", 0.0)
+        if isinstance(requested_check, MasterLossCheck) or not jitter:
+            return requested_check
+        deadline = time.monotonic() + poll_phase(self.config) * jitter
+        while self.running:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            newer_check = self._wait(timeout)
+            if isinstance(newer_check, MasterLossCheck):
+                return newer_check
+        return requested_check
+
     def run(self):
-        self.main_monitoring_loop()
+        self._timed_monitoring_loop()
+        self.failover_decision_queue.put("Completed first monitoring round")
         while self.running:
-            requested_check = False
-            try:
-                requested_check = self.cluster_monitor_check_queue.get(timeout=self.config.get("db_poll_interval", 5.0))
-            except Empty:
-                pass
-            self.main_monitoring_loop(requested_check)
+            requested_check = self.wait_for_round()
+            if self.running:
+                self._timed_monitoring_loop(requested_check)
+
+    def _timed_monitoring_loop(self, requested_check=False):
+        start_time = time.monotonic()
+        self.main_monitoring_loop(requested_check)
+        self.last_round_duration = time.monotonic() - start_time
+        self.watchdog.iteration("cluster_monitor", self.last_round_duration)
@@ -0,0 +1,174 @@
+"""
+pglookout - external command execution
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Runs the user provided hook commands (failover_command, over_warning_limit_command,
+pg_stop_command and pg_start_command) with timeouts and output capture, either
+blocking the caller or in background threads that report their completion
+through a queue.  A failover command never runs concurrently with any other
+command: it waits for running commands to finish and holds back new ones
+until it has completed.
+"""
+from .statsd import StatsClient
+from dataclasses import dataclass
+from queue import Queue
+from typing import List, Optional, Sequence, Tuple, Union
+
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+
+FAILOVER = "failover"
+# keep the tail of the command output, that's where the errors usually are
+MAX_OUTPUT_LENGTH = 4096
+# how long to wait for the output pipe to close once a timed out command has been killed
+OUTPUT_DRAIN_TIMEOUT = 1.0
+
+Command = Union[str, List[str]]
+# kind of the command, the command itself and its timeout
+CommandStep = Tuple[str, Command, Optional[float]]
+
+
+@dataclass(frozen=True)
+class CommandResult:
+    kind: str
+    command: Command
+    return_code: Optional[int]
+    output: str
+    duration: float
+    timed_out: bool = False
+
+
+class ExternalCommandRunner:
+    def __init__(self, completion_queue: "Queue[CommandResult]", stats: StatsClient) -> None:
+        self.log = logging.getLogger("ExternalCommandRunner")
+        self.completion_queue = completion_queue
+        self.stats = stats
+        self._condition = threading.Condition()
+        # kinds of submitted jobs that have not yet completed, and the subset of them currently running
+        self._active_kinds: List[str] = []
+        self._running_kinds: List[str] = []
+        self._failovers_waiting = 0
+
+    def is_busy(self, kind: Optional[str] = None) -> bool:
+        """Is a command of the given kind, or any command, queued or running"""
+        with self._condition:
+            if kind is None:
+                return bool(self._active_kinds)
+            return kind in self._active_kinds
+
+    def run(self, kind: str, command: Command, timeout: Optional[float] = None) -> CommandResult:
+        """Run a single command to completion and return its result"""
+        self.log.warning("Executing external %s command: %r, timeout: %r", kind, command, timeout)
+        start_time = time.monotonic()
+        return_code: Optional[int] = None
+        output, timed_out = "", False
+        try:
+            if not command:
+                raise ValueError("command is empty")
+            # hooks are often shell scripts, run them in their own process group so that everything they
+            # started can be killed on timeout and nothing is left holding on to the output pipe
+            with subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            ) as process:
+                try:
+                    stdout, _ = process.communicate(timeout=timeout)
+                    return_code = process.returncode
+                except subprocess.TimeoutExpired:
+                    timed_out = True
+                    self._kill_process_group(process)
+                    stdout = self._collect_output(process)
+                    self.log.error("External %s command %r timed out after %.1fs", kind, command, timeout)
+                    self.stats.increase("external_command_timeout", tags={"kind": kind})
+            output = stdout.decode("utf-8", "replace")[-MAX_OUTPUT_LENGTH:]
+        except (OSError, ValueError) as ex:
+            self.log.exception("Problem with executing external %s command: %r", kind, command)
+            self.stats.unexpected_exception(ex, where="execute_external_command")
+        duration = time.monotonic() - start_time
+        if return_code:
+            self.log.error("External %s command %r failed, return_code: %r, output: %r", kind, command, return_code, output)
+        self.log.warning(
+            "Executed external %s command: %r, return_code: %r, took: %.2fs, output: %r",
+            kind,
+            command,
+            return_code,
+            duration,
+            output,
+        )
+        self.stats.timing("external_command", round(duration * 1000.0, 3), tags={"kind": kind})
+        return CommandResult(
+            kind=kind, command=command, return_code=return_code, output=output, duration=duration, timed_out=timed_out
+        )
+
+    def _kill_process_group(self, process: "subprocess.Popen[bytes]") -> None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+
+    def _collect_output(self, process: "subprocess.Popen[bytes]") -> bytes:
+        try:
+            stdout, _ = process.communicate(timeout=OUTPUT_DRAIN_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            # a descendant moved itself out of the process group and still holds the pipe open
+            self.log.warning("Gave up on reading the output of a killed command after %.1fs", OUTPUT_DRAIN_TIMEOUT)
+            return b""
+        return stdout
+
+    def submit(self, kind: str, steps: Sequence[CommandStep], post_delay: float = 0.0) -> bool:
+        """Run the commands in `steps` one after the other in a background thread.
+
+        The result of each command is put into the completion queue.  `post_delay` keeps
+        the job active after the last command, e.g. to give PostgreSQL time to restart.
+        Returns False if a job of the same kind is already queued or running."""
+        with self._condition:
+            if kind in self._active_kinds:
+                self.log.warning("External %s command is already running, not starting another one", kind)
+                return False
+            self._active_kinds.append(kind)
+            if kind == FAILOVER:
+                self._failovers_waiting += 1
+        thread = threading.Thread(
+            target=self._run_job,
+            args=(kind, list(steps), post_delay),
+            name=f"ExternalCommand-{kind}",
+            daemon=True,
+        )
+        thread.start()
+        return True
+
+    def _run_job(self, kind: str, steps: List[CommandStep], post_delay: float) -> None:
+        self._acquire(kind)
+        try:
+            for step_kind, command, timeout in steps:
+                self.completion_queue.put(self.run(step_kind, command, timeout))
+            if post_delay:
+                time.sleep(post_delay)
+        finally:
+            self._release(kind)
+
+    def _acquire(self, kind: str) -> None:
+        with self._condition:
+            if kind == FAILOVER:
+                # wait for everything that started before us to complete
+                self._condition.wait_for(lambda: not self._running_kinds)
+                self._failovers_waiting -= 1
+            else:
+                self._condition.wait_for(lambda: not self._failovers_waiting and FAILOVER not in self._running_kinds)
+            self._running_kinds.append(kind)
+
+    def _release(self, kind: str) -> None:
+        with self._condition:
+            self._running_kinds.remove(kind)
+            self._active_kinds.remove(kind)
+            self._condition.notify_all()
@@ -4,11 +4,13 @@ pglookout - common utility functions
 Copyright (c) 2015 Ohmu Ltd
 See LICENSE for details
 """
+from typing import Optional
+
 import datetime
 import re
 
 
-def convert_xlog_location_to_offset(wal_location):
+def convert_xlog_location_to_offset(wal_location: str) -> int:
     log_id, offset = wal_location.split("/")
     return int(log_id, 16) << 32 | int(offset, 16)
 
@@ -23,7 +25,7 @@ ISO_BASIC_RE = re.compile(
 )
 
 
-def parse_iso_datetime(value):
+def parse_iso_datetime(value: str) -> datetime.datetime:
     match = ISO_EXT_RE.match(value)
     if not match:
         match = ISO_BASIC_RE.match(value)
@@ -35,9 +37,11 @@ def parse_iso_datetime(value):
     return datetime.datetime(tzinfo=None, **parts)
 
 
-def get_iso_timestamp(fetch_time=None):
+def get_iso_timestamp(fetch_time: Optional[datetime.datetime] = None) -> str:
     if not fetch_time:
         fetch_time = datetime.datetime.utcnow()
     elif fetch_time.tzinfo:
-        fetch_time = fetch_time.replace(tzinfo=None) - datetime.timedelta(seconds=fetch_time.utcoffset().seconds)
+        utc_offset = fetch_time.utcoffset()
+        assert utc_offset is not None
+        fetch_time = fetch_time.replace(tzinfo=None) - datetime.timedelta(seconds=utc_offset.seconds)
     return fetch_time.isoformat() + "Z"
@@ -0,0 +1,151 @@
+"""
+pglookout - failover latency tracing
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Records a trace of every master loss incident: when the master stopped
+answering, what the observers reported, every evaluation of the cluster state,
+the failover decision, the promotion and when a master was seen again.  Event
+times are monotonic offsets from the start of the incident.  Finished traces
+are kept in memory and optionally in a bounded JSON lines file.
+"""
+from .common import get_iso_timestamp
+from .statsd import StatsClient
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+DEFAULT_FAILOVER_TRACE_MAX_ENTRIES = 20
+# an incident that drags on without a resolution shouldn't grow without bounds
+MAX_TRACE_EVENTS = 200
+
+Trace = Dict[str, Any]
+
+
+class FailoverTracer:
+    def __init__(
+        self,
+        stats: StatsClient,
+        path: Optional[str] = None,
+        max_entries: int = DEFAULT_FAILOVER_TRACE_MAX_ENTRIES,
+    ) -> None:
+        self.log = logging.getLogger("FailoverTracer")
+        self.stats = stats
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._current: Optional[Trace] = None
+        self._start_time = 0.0
+        self._last_event_time = 0.0
+        self._finished: Deque[Trace] = deque(maxlen=max_entries)
+        if path:
+            self._load()
+
+    @property
+    def incident_master(self) -> Optional[str]:
+        """The master whose loss is being traced, None if there is no ongoing incident"""
+        trace = self._current
+        return trace["master"] if trace is not None else None
+
+    def start(self, master: str, **details: Any) -> None:
+        """Start tracing an incident in which `master` stopped answering, a no-op if one is already ongoing"""
+        with self._lock:
+            if self._current is not None:
+                return
+            self._start_time = self._last_event_time = time.monotonic()
+            self._current = {
+                "id": str(uuid.uuid4()),
+                "master": master,
+                "started_at": get_iso_timestamp(),
+                "outcome": None,
+                "new_master": None,
+                "duration": None,
+                "events": [],
+                "dropped_events": 0,
+            }
+            self._add_event("master_probe_failed", details)
+        self.log.warning("Started tracing loss of master %r", master)
+
+    def record(self, event: str, **details: Any) -> None:
+        """Add an event to the ongoing incident, a no-op if there is none"""
+        with self._lock:
+            if self._current is not None:
+                self._add_event(event, details)
+
+    def record_once(self, event: str, **details: Any) -> None:
+        """Add an event unless one with the same name and details has already been recorded"""
+        with self._lock:
+            if self._current is None:
+                return
+            for existing in self._current["events"]:
+                if existing["event"] == event and all(existing.get(key) == value for key, value in details.items()):
+                    return
+            self._add_event(event, details)
+
+    def master_seen(self, instance: str) -> None:
+        """A master answered a probe, this ends the ongoing incident"""
+        with self._lock:
+            trace = self._current
+            if trace is None:
+                return
+            outcome = "master_recovered" if instance == trace["master"] else "promoted"
+            self._add_event(outcome, {"instance": instance})
+            duration = self._last_event_time - self._start_time
+            trace.update({"outcome": outcome, "new_master": instance, "duration": duration})
+            self._current = None
+            self._finished.append(trace)
+            finished = list(self._finished)
+        self.stats.timing("failover_trace_total", round(duration * 1000.0, 3), tags={"outcome": outcome})
+        self.log.warning(
+            "Incident for master %r ended with %s of %r after %.2fs", trace["master"], outcome, instance, duration
+        )
+        self._save(finished)
+
+    def traces(self) -> List[Trace]:
+        """Finished traces from the oldest to the newest followed by the ongoing one, if any"""
+        with self._lock:
+            traces = list(self._finished)
+            if self._current is not None:
+                traces.append(dict(self._current, events=list(self._current["events"])))
+        return traces
+
+    def _add_event(self, event: str, details: Dict[str, Any]) -> None:
+        assert self._current is not None
+        now = time.monotonic()
+        self.stats.timing("failover_trace", round((now - self._last_event_time) * 1000.0, 3), tags={"segment": event})
+        self._last_event_time = now
+        if len(self._current["events"]) >= MAX_TRACE_EVENTS:
+            self._current["dropped_events"] += 1
+            return
+        self._current["events"].append({"event": event, "offset": now - self._start_time, **details})
+
+    def _load(self) -> None:
+        assert self.path
+        try:
+            with open(self.path, "r") as fp:
+                for line in fp:
+                    if line.strip():
+                        self._finished.append(json.loads(line))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as ex:
+            self.log.warning("Failed to load failover traces from %r: %s", self.path, ex)
+
+    def _save(self, traces: List[Trace]) -> None:
+        if not self.path:
+            return
+        try:
+            with open(self.path + "_temp", "w") as fp:
+                for trace in traces:
+                    fp.write(json.dumps(trace) + "\n")
+            os.rename(self.path + "_temp", self.path)
+        except OSError as ex:
+            self.log.exception("Failed to write failover traces to %r", self.path)
+            self.stats.unexpected_exception(ex, where="failover_trace_save")
@@ -0,0 +1,205 @@
+"""
+pglookout - bounded per-node state history
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Keeps a fixed number of recent samples for every monitored node and observer in
+preallocated, column oriented `array.array` ring buffers so the memory used does
+not grow with uptime.
+"""
+from .common import convert_xlog_location_to_offset
+from array import array
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import math
+import threading
+
+HISTORY_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("timestamp", "d"),
+    ("receive_lsn", "Q"),
+    ("replay_lsn", "Q"),
+    ("replication_time_lag", "d"),
+    ("probe_latency", "d"),
+    ("connection", "B"),
+)
+DEFAULT_HISTORY_SIZE = 720
+DEFAULT_HISTORY_MAX_POINTS = 200
+
+Sample = Dict[str, Any]
+
+
+def _lsn_to_offset(lsn: Optional[str]) -> int:
+    if not lsn:
+        return 0
+    try:
+        return convert_xlog_location_to_offset(lsn)
+    except ValueError:
+        return 0
+
+
+class HistoryBuffer:
+    """Fixed-capacity ring buffer of samples for a single node or observer"""
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError(f"history capacity must be positive, not {capacity!r}")
+        self.capacity = capacity
+        self._columns: Dict[str, "array[Any]"] = {
+            name: array(typecode, [0]) * capacity for name, typecode in HISTORY_COLUMNS
+        }
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column) for column in self._columns.values())
+
+    def append(
+        self,
+        *,
+        timestamp: float,
+        receive_lsn: int = 0,
+        replay_lsn: int = 0,
+        replication_time_lag: Optional[float] = None,
+        probe_latency: Optional[float] = None,
+        connection: bool = False,
+    ) -> None:
+        values: Dict[str, float] = {
+            "timestamp": timestamp,
+            "receive_lsn": receive_lsn,
+            "replay_lsn": replay_lsn,
+            "replication_time_lag": math.nan if replication_time_lag is None else replication_time_lag,
+            "probe_latency": math.nan if probe_latency is None else probe_latency,
+            "connection": 1 if connection else 0,
+        }
+        with self._lock:
+            for name, value in values.items():
+                self._columns[name][self._next] = value
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def samples(self, since: Optional[float] = None) -> List[Sample]:
+        """Return the retained samples newer than `since` in chronological order"""
+        with self._lock:
+            start = (self._next - self._count) % self.capacity
+            indexes = [(start + i) % self.capacity for i in range(self._count)]
+            rows = [{name: column[index] for name, column in self._columns.items()} for index in indexes]
+        if since is not None:
+            rows = [row for row in rows if row["timestamp"] > since]
+        return rows
+
+
+def downsample(samples: List[Sample], max_points: int) -> List[Sample]:
+    """Reduce `samples` to at most `max_points` buckets of consecutive samples.
+
+    Each bucket keeps the latest timestamp and LSN positions, the worst lag and
+    probe latency and reports the node as disconnected if any sample in it was."""
+    if max_points < 1 or len(samples) <= max_points:
+        return samples
+    result = []
+    bucket_size = len(samples) / max_points
+    for bucket in range(max_points):
+        rows = samples[int(bucket * bucket_size) : int((bucket + 1) * bucket_size)]
+        if not rows:
+            continue
+        lags = [row["replication_time_lag"] for row in rows if not math.isnan(row["replication_time_lag"])]
+        latencies = [row["probe_latency"] for row in rows if not math.isnan(row["probe_latency"])]
+        result.append(
+            {
+                "timestamp": rows[-1]["timestamp"],
+                "receive_lsn": rows[-1]["receive_lsn"],
+                "replay_lsn": rows[-1]["replay_lsn"],
+                "replication_time_lag": max(lags) if lags else math.nan,
+                "probe_latency": max(latencies) if latencies else math.nan,
+                "connection": min(row["connection"] for row in rows),
+            }
+        )
+    return result
+
+
+def _to_columns(samples: List[Sample]) -> Dict[str, List[Any]]:
+    """Turn samples into JSON friendly columns, unknown values are reported as nulls"""
+    columns: Dict[str, List[Any]] = {name: [] for name, _ in HISTORY_COLUMNS}
+    for row in samples:
+        for name, _ in HISTORY_COLUMNS:
+            value = row[name]
+            if name in {"receive_lsn", "replay_lsn"}:
+                value = value or None
+            elif name == "connection":
+                value = bool(value)
+            elif isinstance(value, float) and math.isnan(value):
+                value = None
+            columns[name].append(value)
+    return columns
+
+
+class ClusterHistory:
+    """History buffers for all cluster members and observers"""
+
+    def __init__(self, capacity: int = DEFAULT_HISTORY_SIZE) -> None:
+        self.capacity = capacity
+        self.nodes: Dict[str, HistoryBuffer] = {}
+        self.observers: Dict[str, HistoryBuffer] = {}
+        self._lock = threading.Lock()
+
+    def _get_buffer(self, buffers: Dict[str, HistoryBuffer], name: str) -> HistoryBuffer:
+        with self._lock:
+            buffer = buffers.get(name)
+            if buffer is None:
+                buffer = buffers[name] = HistoryBuffer(self.capacity)
+            return buffer
+
+    def record_node(self, instance: str, state: Mapping[str, Any], *, timestamp: float, probe_latency: float) -> None:
+        self._get_buffer(self.nodes, instance).append(
+            timestamp=timestamp,
+            receive_lsn=_lsn_to_offset(state.get("pg_last_xlog_receive_location")),
+            replay_lsn=_lsn_to_offset(state.get("pg_last_xlog_replay_location")),
+            replication_time_lag=state.get("replication_time_lag"),
+            probe_latency=probe_latency,
+            connection=bool(state.get("connection")),
+        )
+
+    def record_observer(self, observer: str, state: Mapping[str, Any], *, timestamp: float, probe_latency: float) -> None:
+        self._get_buffer(self.observers, observer).append(
+            timestamp=timestamp,
+            probe_latency=probe_latency,
+            connection=bool(state.get("connection")),
+        )
+
+    def size(self) -> Dict[str, int]:
+        with self._lock:
+            buffers = list(self.nodes.values()) + list(self.observers.values())
+        return {"buffers": len(buffers), "bytes": sum(buffer.nbytes for buffer in buffers)}
+
+    def prune(self, *, nodes: Iterable[str], observers: Iterable[str]) -> None:
+        """Drop the history of nodes and observers that are no longer configured"""
+        with self._lock:
+            for buffers, keep in ((self.nodes, set(nodes)), (self.observers, set(observers))):
+                for name in set(buffers) - keep:
+                    del buffers[name]
+
+    def query(
+        self,
+        *,
+        instance: Optional[str] = None,
+        observer: Optional[str] = None,
+        since: Optional[float] = None,
+        max_points: int = DEFAULT_HISTORY_MAX_POINTS,
+    ) -> Dict[str, Dict[str, Dict[str, List[Any]]]]:
+        with self._lock:
+            nodes = dict(self.nodes)
+            observers = dict(self.observers)
+        if instance is not None or observer is not None:
+            nodes = {instance: nodes[instance]} if instance in nodes else {}
+            observers = {observer: observers[observer]} if observer in observers else {}
+        return {
+            "nodes": {name: _to_columns(downsample(buffer.samples(since), max_points)) for name, buffer in nodes.items()},
+            "observers": {
+                name: _to_columns(downsample(buffer.samples(since), max_points)) for name, buffer in observers.items()
+            },
+        }
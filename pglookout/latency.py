@@ -0,0 +1,48 @@
+"""
+pglookout - adaptive probe timeouts
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Probe timeouts follow the round trip time estimation of TCP (RFC 6298): a
+smoothed latency and its mean deviation are updated from every successful
+probe and the timeout is the smoothed latency plus four deviations, bounded by
+a configured minimum and maximum.  A node that answers in milliseconds is
+declared unreachable long before the maximum, while a slow one gets as long
+as it normally needs.  Every timeout doubles the next one until a probe
+succeeds again, so a node that merely slowed down isn't timed out for good.
+"""
+from typing import Optional
+
+# gains of the smoothed latency and its deviation, the values recommended by RFC 6298
+SMOOTHING_GAIN = 1 / 8
+DEVIATION_GAIN = 1 / 4
+DEVIATION_FACTOR = 4
+MAX_BACKOFF = 64
+
+
+class LatencyEstimator:
+    def __init__(self) -> None:
+        self.smoothed: Optional[float] = None
+        self.deviation = 0.0
+        self.backoff = 1
+
+    def add(self, seconds: float) -> None:
+        """Update the estimate with the latency of a successful probe"""
+        if self.smoothed is None:
+            self.smoothed = seconds
+            self.deviation = seconds / 2
+        else:
+            self.deviation += DEVIATION_GAIN * (abs(self.smoothed - seconds) - self.deviation)
+            self.smoothed += SMOOTHING_GAIN * (seconds - self.smoothed)
+        self.backoff = 1
+
+    def timed_out(self) -> None:
+        self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+
+    def timeout(self, min_timeout: float, max_timeout: float) -> float:
+        """Seconds to wait for the next probe, `max_timeout` until a probe has succeeded"""
+        if self.smoothed is None:
+            return max_timeout
+        timeout = (self.smoothed + DEVIATION_FACTOR * self.deviation) * self.backoff
+        return min(max(timeout, min_timeout), max_timeout)
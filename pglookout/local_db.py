@@ -0,0 +1,94 @@
+"""
+pglookout - connection to the local database
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+A synchronous, autocommit connection to the PostgreSQL node pglookout runs on,
+used for actions taken on it such as re-pointing replication or promotion.
+"""
+from psycopg2.extensions import connection
+from psycopg2.extras import RealDictCursor
+from typing import Any, Dict, List, Optional, Sequence
+
+import logging
+import psycopg2
+
+DEFAULT_LOCAL_DB_CONNECT_TIMEOUT = 5
+# don't hold up every round of the main loop with connection attempts while the local node is down
+DEFAULT_LOCAL_DB_RECONNECT_INTERVAL = 30.0
+
+
+class LocalDatabase:
+    def __init__(
+        self,
+        connect_timeout: int = DEFAULT_LOCAL_DB_CONNECT_TIMEOUT,
+        reconnect_interval: float = DEFAULT_LOCAL_DB_RECONNECT_INTERVAL,
+    ) -> None:
+        self.log = logging.getLogger("LocalDatabase")
+        self.connect_timeout = connect_timeout
+        self.reconnect_interval = reconnect_interval
+        self.dsn: Optional[str] = None
+        self.healthy: Optional[bool] = None
+        self._conn: Optional[connection] = None
+        self._next_check_time = 0.0
+
+    def set_dsn(self, dsn: Optional[str]) -> None:
+        if dsn != self.dsn:
+            self.close()
+            self.dsn = dsn
+            self.healthy = None
+            self._next_check_time = 0.0
+
+    def check(self, now: float) -> Optional[bool]:
+        """Make sure there's a working connection so that it doesn't have to be opened when it's needed.
+
+        A broken connection is replaced right away, after a failed attempt the next one is
+        made `reconnect_interval` seconds later.  Returns the health of the connection."""
+        if not self.dsn or (self._conn is None and now < self._next_check_time):
+            return self.healthy
+        try:
+            self.execute("SELECT 1")
+        except psycopg2.Error as ex:
+            if self.healthy is not False:
+                self.log.warning("Local database is not available: %s", str(ex).strip())
+            self.healthy = False
+            self._next_check_time = now + self.reconnect_interval
+        else:
+            if self.healthy is False:
+                self.log.info("Local database is available again")
+            self.healthy = True
+        return self.healthy
+
+    def connect(self) -> connection:
+        """Return the current connection, opening a new one if needed"""
+        if self._conn is not None and not self._conn.closed:
+            return self._conn
+        if not self.dsn:
+            raise psycopg2.OperationalError("no connection info for the local database")
+        self._conn = psycopg2.connect(dsn=self.dsn, connect_timeout=self.connect_timeout)
+        self._conn.autocommit = True
+        self.log.info("Connected to local database, server_version: %r", self._conn.server_version)
+        return self._conn
+
+    @property
+    def server_version(self) -> int:
+        return self.connect().server_version
+
+    def execute(self, query: str, args: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """Run `query` and return its result rows, the connection is dropped on errors"""
+        try:
+            with self.connect().cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(query, args)
+                return [dict(row) for row in cursor.fetchall()] if cursor.description else []
+        except psycopg2.Error:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error as ex:
+                self.log.warning("Failed to close local database connection: %s", ex)
+            self._conn = None
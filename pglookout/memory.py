@@ -0,0 +1,43 @@
+"""
+pglookout - memory usage reporting
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Sizes of the long-lived state structures and, when tracemalloc is tracing,
+the source lines with the largest allocations, served from /debug/memory.
+"""
+from typing import Any, Dict, List, Mapping, Optional
+
+import json
+import tracemalloc
+
+DEFAULT_TOP_ALLOCATIONS = 20
+
+
+def state_size(state: Mapping[str, Any]) -> Dict[str, int]:
+    """Number of entries in `state` and the size of its JSON encoding"""
+    return {"entries": len(state), "json_bytes": len(json.dumps(state, default=str))}
+
+
+def top_allocations(limit: int = DEFAULT_TOP_ALLOCATIONS) -> Optional[Dict[str, Any]]:
+    """The source lines that allocated the most memory still in use, None if tracemalloc isn't tracing"""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    current, peak = tracemalloc.get_traced_memory()
+    top: List[Dict[str, Any]] = []
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        top.append({"file": frame.filename, "line": frame.lineno, "size": stat.size, "count": stat.count})
+    return {"traced_bytes": current, "peak_traced_bytes": peak, "top": top}
+
+
+def update_tracing(frames: Optional[int]) -> None:
+    """Trace allocations with `frames` frames of traceback, stop with 0 and leave tracing as it is with None"""
+    if frames is None:
+        return
+    if tracemalloc.is_tracing() and (not frames or tracemalloc.get_traceback_limit() != frames):
+        tracemalloc.stop()
+    if frames and not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
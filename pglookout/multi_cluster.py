@@ -0,0 +1,153 @@
+"""
+pglookout - monitoring of many replication clusters
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+An observer can monitor any number of replication clusters from a single
+process.  Every cluster has a ClusterMonitor holding its own state, but the
+probes of all of them run on one pool of worker threads and observers are
+polled over one HTTP session.
+"""
+from .cluster_monitor import ClusterMonitor
+from .schedule import next_phase_time, poll_phase
+from .statsd import StatsClient
+from .watchdog import LoopWatchdog
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from queue import Empty, Queue
+from threading import Thread
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import copy
+import logging
+import requests
+import time
+
+DEFAULT_PROBE_WORKERS = 32
+# settings describing a single cluster, they aren't shared by the clusters like the other top level settings
+CLUSTER_SETTINGS = ("clusters", "observers", "remote_conns")
+
+
+def cluster_config(config: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """Config of cluster `name`: its own settings on top of the shared top level ones"""
+    result = {key: value for key, value in config.items() if key not in CLUSTER_SETTINGS}
+    result.update(copy.deepcopy(config["clusters"][name]))
+    return result
+
+
+class MultiClusterMonitor(Thread):
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        cluster_states: Dict[str, Dict[str, Any]],
+        create_alert_file: Callable[[str], None],
+        cluster_monitor_check_queue: "Queue[Any]",
+        failover_decision_queue: "Queue[str]",
+        stats: StatsClient,
+        watchdog: Optional[LoopWatchdog] = None,
+    ) -> None:
+        """Thread which collects the state of every cluster in config["clusters"].
+
+        The state of each cluster is kept in `cluster_states` under its name, the dictionary
+        is shared with the web server."""
+        Thread.__init__(self)
+        self.log = logging.getLogger("MultiClusterMonitor")
+        self.config = config
+        self.cluster_states = cluster_states
+        self.observer_states: Dict[str, Dict[str, Any]] = {}
+        self.create_alert_file = create_alert_file
+        self.cluster_monitor_check_queue = cluster_monitor_check_queue
+        self.failover_decision_queue = failover_decision_queue
+        self.stats = stats
+        self.watchdog = watchdog or LoopWatchdog(stats=stats)
+        self.running = True
+        self.monitors: Dict[str, ClusterMonitor] = {}
+        self.session = requests.Session()
+        self.probe_workers = self.config.get("probe_workers", DEFAULT_PROBE_WORKERS)
+        self.executor = ThreadPoolExecutor(max_workers=self.probe_workers, thread_name_prefix="probe")
+        # the history and failover traces are kept per cluster and only served for a single cluster
+        self.history = None
+        self.last_monitoring_success_time: Optional[float] = None
+
+    def update_clusters(self) -> None:
+        """Start monitoring added clusters, stop monitoring removed ones and apply config changes"""
+        clusters = self.config.get("clusters", {})
+        for name in set(self.monitors) - set(clusters):
+            self.log.info("Removing cluster %r", name)
+            self.monitors.pop(name).close_connections()
+            self.cluster_states.pop(name, None)
+            self.observer_states.pop(name, None)
+        for name in clusters:
+            config = cluster_config(self.config, name)
+            monitor = self.monitors.get(name)
+            if monitor is None:
+                self.log.info("Adding cluster %r", name)
+                monitor = ClusterMonitor(
+                    config=config,
+                    cluster_state=self.cluster_states.setdefault(name, {}),
+                    observer_state=self.observer_states.setdefault(name, {}),
+                    create_alert_file=self.create_alert_file,
+                    cluster_monitor_check_queue=self.cluster_monitor_check_queue,
+                    failover_decision_queue=self.failover_decision_queue,
+                    is_replication_lag_over_warning_limit=lambda: False,
+                    stats=self.stats,
+                    session=self.session,
+                    cluster_name=name,
+                )
+                self.monitors[name] = monitor
+            monitor.config = config
+            monitor.stats = self.stats
+            monitor.log.setLevel(self.log.getEffectiveLevel())
+        probe_workers = self.config.get("probe_workers", DEFAULT_PROBE_WORKERS)
+        if probe_workers != self.probe_workers:
+            self.log.info("Changing the number of probe workers from %r to %r", self.probe_workers, probe_workers)
+            self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(max_workers=probe_workers, thread_name_prefix="probe")
+            self.probe_workers = probe_workers
+
+    def main_monitoring_loop(self, requested_check: Any = False) -> None:
+        start_time = time.monotonic()
+        self.update_clusters()
+        futures: Dict["Future[None]", Tuple[str, str]] = {}
+        for name, monitor in self.monitors.items():
+            monitor.cleanup_old_nodes()
+            for future, (instance, _) in monitor.submit_probes(self.executor).items():
+                futures[future] = (name, instance)
+        wait(futures)
+        for future, (name, instance) in futures.items():
+            if future.exception():
+                self.log.error("Got error: %r when checking %r of cluster %r", future.exception(), instance, name)
+        now = time.monotonic()
+        for monitor in self.monitors.values():
+            monitor.update_replication_view()
+            monitor.update_replication_throughput()
+            monitor.last_monitoring_success_time = now
+        self.stats.timing("multi_cluster_round", round((now - start_time) * 1000.0, 3))
+        self.log.debug(
+            "Monitored %d clusters with %d probes, took: %.4fs", len(self.monitors), len(futures), now - start_time
+        )
+        if requested_check:
+            self.failover_decision_queue.put("Completed requested monitoring loop")
+        self.last_monitoring_success_time = now
+
+    def _timed_monitoring_loop(self, requested_check: Any = False) -> None:
+        start_time = time.monotonic()
+        self.main_monitoring_loop(requested_check)
+        self.watchdog.iteration("cluster_monitor", time.monotonic() - start_time)
+
+    def run(self) -> None:
+        self._timed_monitoring_loop()
+        self.failover_decision_queue.put("Completed first monitoring round")
+        while self.running:
+            requested_check = False
+            # rounds start at this host's phase of the interval, spread from those of other pglookouts
+            interval = self.config.get("db_poll_interval", 5.0)
+            timeout = max(next_phase_time(time.time(), interval, poll_phase(self.config)) - time.time(), 0.0)
+            wait_start = time.monotonic()
+            try:
+                requested_check = self.cluster_monitor_check_queue.get(timeout=timeout)
+            except Empty:
+                pass
+            self.watchdog.waited("cluster_monitor", time.monotonic() - wait_start, timeout)
+            self._timed_monitoring_loop(requested_check)
+        self.executor.shutdown(wait=False)
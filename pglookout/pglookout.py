@@ -8,13 +8,22 @@ This file is under the Apache License, Version 2.0.
 See the file `LICENSE` for details.
 """
 from . import logutil, statsd, version
-from .cluster_monitor import ClusterMonitor
+from .cluster_monitor import ClusterMonitor, MasterLossCheck
+from .command_runner import ExternalCommandRunner, FAILOVER
 from .common import convert_xlog_location_to_offset, get_iso_timestamp, parse_iso_datetime
+from .failover_trace import DEFAULT_FAILOVER_TRACE_MAX_ENTRIES, FailoverTracer
+from .local_db import LocalDatabase
+from .memory import DEFAULT_TOP_ALLOCATIONS, state_size, top_allocations, update_tracing
+from .multi_cluster import MultiClusterMonitor
 from .pgutil import create_connection_string, get_connection_info, get_connection_info_from_config_line
+from .profiler import dump_stacks, MAX_PROFILE_SECONDS, sample_stacks, write_debug_dump
+from .recorder import DEFAULT_RECORDING_MAX_BYTES, StateRecorder
+from .watchdog import DEFAULT_LOOP_STALL_SECONDS, LoopWatchdog
 from .webserver import WebServer
 from packaging.version import parse
 from psycopg2.extensions import adapt
 from queue import Empty, Queue
+from threading import Thread
 from typing import Optional
 
 import argparse
@@ -23,19 +32,24 @@ import datetime
 import json
 import logging
 import logging.handlers
+import math
 import os
+import psycopg2
 import signal
 import socket
-import subprocess
 import sys
 import time
 
+# seconds since the states persisted in the JSON state file were fetched within which they're restored at startup
+DEFAULT_STATE_RESTORE_MAX_AGE = 60.0
+
 
 class PgLookout:
     def __init__(self, config_path):
         self.log = logging.getLogger("pglookout")
         # dummy to make sure we never get an AttributeError -> gets overwritten after the first config loading
         self.stats = statsd.StatsClient(host=None)
+        self._statsd_config = None
         self.running = True
         self.replication_lag_over_warning_limit = False
 
@@ -47,6 +61,7 @@ class PgLookout:
         self.disconnected_master_nodes = {}
         self.connected_observer_nodes = {}
         self.disconnected_observer_nodes = {}
+        self.observer_sources = {}
         self.replication_catchup_timeout = None
         self.replication_lag_warning_boundary = None
         self.replication_lag_failover_timeout = None
@@ -63,36 +78,83 @@ class PgLookout:
         self.cluster_nodes_change_time = time.monotonic()
         self.cluster_monitor_check_queue = Queue()
         self.failover_decision_queue = Queue()
+        self.command_completion_queue = Queue()
+        self.command_runner = ExternalCommandRunner(completion_queue=self.command_completion_queue, stats=self.stats)
+        self.local_db = LocalDatabase()
+        self.watchdog = LoopWatchdog(stats=self.stats)
+        self.failover_tracer = None
+        self.recorder = None
         self.observer_state_newer_than = datetime.datetime.min
+        self.maintenance_mode = False
+        self.failover_plan = None
+        self.profiler_thread = None
+        self._failover_plan_standby_nodes = None
         self._start_time = None
         self._config_version = 0
         self._config_version_applied = 0
         self._failover_on_disconnect = True
+        self.state_restored = False
+        self.ready_notified = False
         self.load_config()
         self.config_reload_pending = False
+        self.failover_tracer = FailoverTracer(
+            stats=self.stats,
+            path=self.config.get("failover_trace_file"),
+            max_entries=self.config.get("failover_trace_max_entries", DEFAULT_FAILOVER_TRACE_MAX_ENTRIES),
+        )
 
         signal.signal(signal.SIGHUP, self.sighup)
         signal.signal(signal.SIGINT, self.quit)
         signal.signal(signal.SIGTERM, self.quit)
+        signal.signal(signal.SIGUSR1, self.dump_debug_info)
 
         self.cluster_state = {}
         self.observer_state = {}
-
-        self.cluster_monitor = ClusterMonitor(
-            config=self.config,
-            cluster_state=self.cluster_state,
-            observer_state=self.observer_state,
-            create_alert_file=self.create_alert_file,
-            cluster_monitor_check_queue=self.cluster_monitor_check_queue,
-            failover_decision_queue=self.failover_decision_queue,
-            is_replication_lag_over_warning_limit=self.is_replication_lag_over_warning_limit,
-            stats=self.stats,
-        )
+        self.cluster_states = {}
+        self.restore_persisted_state()
+
+        # pglookouts coordinating their observer polls follow the rounds of a single cluster's monitor
+        get_round_schedule = None
+        if self.config.get("clusters"):
+            self.cluster_monitor = MultiClusterMonitor(
+                config=self.config,
+                cluster_states=self.cluster_states,
+                create_alert_file=self.create_alert_file,
+                cluster_monitor_check_queue=self.cluster_monitor_check_queue,
+                failover_decision_queue=self.failover_decision_queue,
+                stats=self.stats,
+                watchdog=self.watchdog,
+            )
+        else:
+            self.cluster_monitor = ClusterMonitor(
+                config=self.config,
+                cluster_state=self.cluster_state,
+                observer_state=self.observer_state,
+                create_alert_file=self.create_alert_file,
+                cluster_monitor_check_queue=self.cluster_monitor_check_queue,
+                failover_decision_queue=self.failover_decision_queue,
+                is_replication_lag_over_warning_limit=self.is_replication_lag_over_warning_limit,
+                stats=self.stats,
+                failover_tracer=self.failover_tracer,
+                watchdog=self.watchdog,
+            )
+            get_round_schedule = self.cluster_monitor.get_round_schedule
         # cluster_monitor doesn't exist at the time of reading the config initially
         self.cluster_monitor.log.setLevel(self.log_level)
-        self.webserver = WebServer(self.config, self.cluster_state, self.cluster_monitor_check_queue)
+        self.webserver = WebServer(
+            self.config,
+            self.cluster_state,
+            self.cluster_monitor_check_queue,
+            history=self.cluster_monitor.history,
+            get_failover_plan=self.get_failover_plan,
+            failover_tracer=self.failover_tracer,
+            cluster_states=self.cluster_states,
+            observer_state=self.observer_state,
+            get_memory_usage=self.get_memory_usage,
+            watchdog=self.watchdog,
+            get_round_schedule=get_round_schedule,
+        )
 
-        logutil.notify_systemd("READY=1")
         self.log.info(
             "PGLookout initialized, local hostname: %r, own_db: %r, cwd: %r",
             socket.gethostname(),
@@ -105,7 +167,12 @@ class PgLookout:
         if self.cluster_monitor:
             self.cluster_monitor.running = False
         self.running = False
+        self.watchdog.stop()
         self.webserver.close()
+        self.local_db.close()
+        if self.recorder:
+            self.recorder.close()
+        self.stats.close()
 
     def sighup(self, _signal=None, _frame=None):
         self.log.debug(
@@ -115,6 +182,29 @@ class PgLookout:
         )
         self.config_reload_pending = True
 
+    def dump_debug_info(self, _signal=None, _frame=None):
+        """Write the stacks of all threads to a file and profile the process in the background if configured to"""
+        directory = self.config.get("debug_dump_dir", "/tmp")
+        try:
+            self.log.warning("Wrote thread stacks to %r", write_debug_dump(directory, "stacks", dump_stacks()))
+        except OSError as ex:
+            self.log.exception("Failed to write thread stacks to %r", directory)
+            self.stats.unexpected_exception(ex, where="dump_debug_info")
+        profile_seconds = min(self.config.get("debug_profile_seconds", 0), MAX_PROFILE_SECONDS)
+        if profile_seconds and not (self.profiler_thread and self.profiler_thread.is_alive()):
+            self.log.warning("Profiling for %.1fs", profile_seconds)
+            self.profiler_thread = Thread(
+                target=self._write_profile, args=(directory, profile_seconds), name="Profiler", daemon=True
+            )
+            self.profiler_thread.start()
+
+    def _write_profile(self, directory, seconds):
+        try:
+            self.log.warning("Wrote profile to %r", write_debug_dump(directory, "profile", sample_stacks(seconds)))
+        except OSError as ex:
+            self.log.exception("Failed to write profile to %r", directory)
+            self.stats.unexpected_exception(ex, where="dump_debug_info")
+
     def load_config(self):
         self.log.debug("Loading JSON config from: %r", self.config_path)
         previous_remote_conns = self.config.get("remote_conns")
@@ -128,7 +218,25 @@ class PgLookout:
 
         # statsd settings may have changed
         stats = self.config.get("statsd", {})
-        self.stats = statsd.StatsClient(host=stats.get("host"), port=stats.get("port"), tags=stats.get("tags"))
+        if stats != self._statsd_config:
+            self._statsd_config = stats
+            previous_stats = self.stats
+            self.stats = statsd.StatsClient(
+                host=stats.get("host"),
+                port=stats.get("port"),
+                tags=stats.get("tags"),
+                buffered=stats.get("buffered", False),
+                max_packet_size=stats.get("max_packet_size", statsd.DEFAULT_MAX_PACKET_SIZE),
+                flush_interval=stats.get("flush_interval", statsd.DEFAULT_FLUSH_INTERVAL),
+                socket_path=stats.get("socket_path"),
+            )
+            if self.cluster_monitor:
+                self.cluster_monitor.stats = self.stats
+            self.command_runner.stats = self.stats
+            self.watchdog.stats = self.stats
+            if self.failover_tracer:
+                self.failover_tracer.stats = self.stats
+            previous_stats.close()
 
         if previous_remote_conns != self.config.get("remote_conns"):
             self.cluster_nodes_change_time = time.monotonic()
@@ -150,6 +258,10 @@ class PgLookout:
                 logger=logging.getLogger(),
             )
         self.own_db = self.config.get("own_db")
+        if self.own_db and self.config.get("clusters"):
+            self.log.warning("Ignoring own_db %r, pglookout is an observer when monitoring multiple clusters", self.own_db)
+            self.own_db = None
+        self.local_db.set_dsn(self.config.get("local_conninfo") or self.config.get("remote_conns", {}).get(self.own_db))
 
         log_level_name = self.config.get("log_level", "DEBUG")
         self.log_level = getattr(logging, log_level_name)
@@ -170,6 +282,7 @@ class PgLookout:
         self.replication_catchup_timeout = self.config.get("replication_catchup_timeout", 300.0)
         self.missing_master_from_config_timeout = self.config.get("missing_master_from_config_timeout", 15.0)
         self._failover_on_disconnect = self.config.get("failover_on_disconnect", True)
+        self.watchdog.stall_seconds = float(self.config.get("loop_stall_seconds", DEFAULT_LOOP_STALL_SECONDS))
 
         if self.replication_lag_warning_boundary >= self.replication_lag_failover_timeout:
             msg = "Replication lag warning boundary (%s) is not lower than its failover timeout (%s)"
@@ -183,10 +296,29 @@ class PgLookout:
                 msg = "Replication lag warning boundary set to %s"
                 self.log.warning(msg, self.replication_lag_warning_boundary)
 
+        self._update_recorder()
+        update_tracing(self.config.get("tracemalloc_frames"))
         self.log.debug("Loaded config: %r from: %r", self.config, self.config_path)
         self._config_version += 1
         self.cluster_monitor_check_queue.put("new config came, recheck")
 
+    def _update_recorder(self):
+        recording_file = self.config.get("recording_file")
+        if recording_file != (self.recorder.path if self.recorder else None):
+            if self.recorder:
+                self.recorder.close()
+                self.recorder = None
+            if recording_file:
+                try:
+                    self.recorder = StateRecorder(
+                        recording_file, max_bytes=self.config.get("recording_max_bytes", DEFAULT_RECORDING_MAX_BYTES)
+                    )
+                except OSError as ex:
+                    self.log.exception("Failed to open recording file %r, not recording", recording_file)
+                    self.stats.unexpected_exception(ex, where="open_recording_file")
+        if self.recorder:
+            self.recorder.record_config(self.config)
+
     def _apply_latest_config_version(self):
         """Applies potentially un-applied configuration"""
         # copy the version and other decision variables to a local variables so we're not missing any updates if the config
@@ -214,7 +346,15 @@ class PgLookout:
             "db_nodes": self.cluster_state,
             "observer_nodes": self.observer_state,
             "current_master": self.current_master,
+            # replication_start_time is on the monotonic clock of this process, so it's also stored as wall clock time
+            "replication_start_times": {
+                instance: time.time() - (time.monotonic() - state["replication_start_time"])
+                for instance, state in list(self.cluster_state.items())
+                if state.get("replication_start_time") is not None
+            },
         }
+        if self.cluster_states:
+            overall_state["clusters"] = self.cluster_states
         try:
             json_to_dump = json.dumps(overall_state, indent=4)
             self.log.debug(
@@ -237,6 +377,67 @@ class PgLookout:
             )
             self.stats.unexpected_exception(ex, where="write_cluster_state_to_json_file")
 
+    def restore_persisted_state(self):
+        """Restore the cluster and observer states a previous run wrote to the JSON state file
+
+        Only the states of nodes and observers that are still configured and that were fetched at most
+        state_restore_max_age seconds ago are restored, marked with that age in "restored_age".  A master that went
+        away before the restart is still known as one, and the catch-up tracking of standbys carries on.  The
+        cluster state isn't acted on before the first monitoring round has refreshed it."""
+        max_age = self.config.get("state_restore_max_age", DEFAULT_STATE_RESTORE_MAX_AGE)
+        if not max_age or self.config.get("clusters"):
+            return
+        state_file_path = self.config.get("json_state_file_path", "/tmp/pglookout_state.json")
+        try:
+            with open(state_file_path, "r") as fp:
+                persisted = json.load(fp)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as ex:
+            self.log.warning("Not restoring state from %r: %s", state_file_path, ex)
+            return
+
+        now = datetime.datetime.utcnow()
+        start_times = persisted.get("replication_start_times", {})
+        for instance, state in persisted.get("db_nodes", {}).items():
+            state = self._restorable_state(instance, state, self.config.get("remote_conns", {}), now, max_age)
+            if state is None:
+                continue
+            state.pop("replication_start_time", None)
+            if instance in start_times:
+                state["replication_start_time"] = time.monotonic() - (time.time() - start_times[instance])
+            self.cluster_state[instance] = state
+        for observer, state in persisted.get("observer_nodes", {}).items():
+            state = self._restorable_state(observer, state, self.config.get("observers", {}), now, max_age)
+            if state is not None:
+                self.observer_state[observer] = state
+        self.state_restored = bool(self.cluster_state or self.observer_state)
+        if self.state_restored:
+            self.log.info(
+                "Restored the state of nodes %r and observers %r from %r",
+                {instance: state["restored_age"] for instance, state in self.cluster_state.items()},
+                {observer: state["restored_age"] for observer, state in self.observer_state.items()},
+                state_file_path,
+            )
+
+    @staticmethod
+    def _restorable_state(name, state, configured, now, max_age):
+        """Copy of the persisted `state` of `name` marked with its age, None if it's no longer to be used"""
+        if name not in configured or not isinstance(state, dict) or "fetch_time" not in state:
+            return None
+        age = (now - parse_iso_datetime(state["fetch_time"])).total_seconds()
+        if not 0 <= age <= max_age:
+            return None
+        return dict(state, restored_age=round(age, 3))
+
+    def notify_ready(self):
+        """Tell systemd we're ready once the first monitoring round has probed all nodes"""
+        if self.ready_notified or self.cluster_monitor.last_monitoring_success_time is None:
+            return
+        logutil.notify_systemd("READY=1")
+        self.ready_notified = True
+        self.log.info("First monitoring round completed, ready")
+
     def create_node_map(self, cluster_state, observer_state):
         """Computes roles for each known member of cluster.
 
@@ -244,6 +445,7 @@ class PgLookout:
         standby_nodes, master_node, master_instance = {}, None, None
         connected_master_nodes, disconnected_master_nodes = {}, {}
         connected_observer_nodes, disconnected_observer_nodes = {}, {}
+        observer_sources = {}
         self.log.debug(
             "Creating node map out of cluster_state: %r and observer_state: %r",
             cluster_state,
@@ -270,6 +472,8 @@ class PgLookout:
                 connected_observer_nodes[observer_name] = state.get("fetch_time")
             else:
                 disconnected_observer_nodes[observer_name] = state.get("fetch_time")
+            # the observer_aggregator the state came through, if any
+            observer_sources[observer_name] = state.get("via")
             for instance, db_state in state.items():
                 if instance not in cluster_state:
                     # A single observer can observe multiple different replication clusters.
@@ -324,6 +528,7 @@ class PgLookout:
         self.disconnected_master_nodes = disconnected_master_nodes
         self.connected_observer_nodes = connected_observer_nodes
         self.disconnected_observer_nodes = disconnected_observer_nodes
+        self.observer_sources = observer_sources
 
         if not self.connected_master_nodes:
             self.log.warning(
@@ -364,7 +569,21 @@ class PgLookout:
             # node has not received anything from the master yet
             return True
         if min_lag >= self.replication_lag_warning_boundary:
-            # node is catching up the master and has not gotten close enough yet
+            # node is catching up the master and has not gotten close enough yet, unless the measured
+            # WAL throughput tells us that it's not going to make it within the catchup timeout
+            estimated_catchup_seconds = state.get("estimated_catchup_seconds")
+            if estimated_catchup_seconds == math.inf:
+                self.log.warning("Node is not gaining on the master, replay is not faster than WAL generation")
+                return False
+            if replication_start_time and estimated_catchup_seconds is not None:
+                catchup_time_left = replication_start_time + self.replication_catchup_timeout - time.monotonic()
+                if estimated_catchup_seconds > catchup_time_left:
+                    self.log.warning(
+                        "Estimated catchup time %.1fs exceeds remaining replication_catchup_timeout %.1fs",
+                        estimated_catchup_seconds,
+                        catchup_time_left,
+                    )
+                    return False
             return True
 
         # node has caught up with the master so we should be in sync
@@ -413,9 +632,15 @@ class PgLookout:
         return True
 
     def check_cluster_state(self):
+        if self.config.get("clusters"):
+            # observers of multiple clusters only collect their state for others
+            return
         master_node = None
         cluster_state = copy.deepcopy(self.cluster_state)
         observer_state = copy.deepcopy(self.observer_state)
+        self.maintenance_mode = self.is_in_maintenance_mode()
+        if self.recorder:
+            self.recorder.record_state(cluster_state, observer_state, maintenance_mode=self.maintenance_mode)
         configured_node_count = len(self.config.get("remote_conns", {}))
         if not cluster_state or len(cluster_state) != configured_node_count:
             self.log.warning(
@@ -425,6 +650,9 @@ class PgLookout:
                 configured_node_count,
             )
             return
+        if self.state_restored and self.cluster_monitor.last_monitoring_success_time is None:
+            self.log.info("Waiting for the first monitoring round to refresh the restored state")
+            return
 
         if self.config.get("poll_observers_on_warning_only") and not self.is_master_observer_new_enough(observer_state):
             self.log.warning("observer data is not good enough, skipping check")
@@ -441,8 +669,17 @@ class PgLookout:
             )
             self.current_master = master_instance
             if self.own_db and self.own_db != master_instance and self.config.get("autofollow"):
+                self._record_decision("follow_master", master=master_instance)
                 self.start_following_new_master(master_instance)
 
+        plan = self.update_failover_plan(standby_nodes)
+        self.failover_tracer.record(
+            "cluster_state_check",
+            master_connected=bool(master_node and master_node.get("connection")),
+            promotion_candidate=plan["promotion_candidate"],
+            has_majority=plan["has_majority"],
+        )
+
         own_state = self.cluster_state.get(self.own_db)
 
         observer_info = ",".join(observer_state) or "no"
@@ -493,11 +730,21 @@ class PgLookout:
                 self.stats.increase("failover_decision_on_disconnect_not_taken")
                 self.log.warning("Not considering failover, because it's not enabled by configuration")
             elif self.current_master:
-                self.cluster_monitor_check_queue.put("Master is missing, ask for immediate state check")
+                # Ask for an immediate state check which completes as soon as enough sources agree on the master's state
+                self.cluster_monitor_check_queue.put(
+                    MasterLossCheck(master=self.current_master, observers=self.config.get("observers", {}))
+                )
                 # Refresh the standby nodes list, and check that we still don't have a master node
                 self.failover_decision_queue.get(timeout=self.missing_master_from_config_timeout)
                 cluster_state = copy.deepcopy(self.cluster_state)
                 observer_state = copy.deepcopy(self.observer_state)
+                # the maintenance mode file may have been created while we waited, the failover plan is
+                # recomputed from the refreshed state before the decision is made
+                self.maintenance_mode = self.is_in_maintenance_mode()
+                if self.recorder:
+                    self.recorder.record_state(
+                        cluster_state, observer_state, maintenance_mode=self.maintenance_mode, refresh=True
+                    )
                 _, master_node, standby_nodes = self.create_node_map(cluster_state, observer_state)
                 # We seem to have a master node after all
                 if master_node and master_node.get("connection"):
@@ -549,13 +796,19 @@ class PgLookout:
                 self.replication_lag_over_warning_limit = True
                 if self.config.get("poll_observers_on_warning_only"):
                     self.observer_state_newer_than = datetime.datetime.utcnow()
+                self._record_decision("replication_lag_warning", replication_time_lag=replication_lag)
                 self.create_alert_file("replication_delay_warning")
-                if self.over_warning_limit_command:
+                if self.over_warning_limit_command and self._run_external_commands_in_background():
+                    self.command_runner.submit(
+                        "over_warning_limit",
+                        [self._command_step("over_warning_limit", self.over_warning_limit_command)],
+                    )
+                elif self.over_warning_limit_command:
                     self.log.warning(
                         "Executing over_warning_limit_command: %r",
                         self.over_warning_limit_command,
                     )
-                    return_code = self.execute_external_command(self.over_warning_limit_command)
+                    return_code = self.execute_external_command(self.over_warning_limit_command, kind="over_warning_limit")
                     self.log.warning(
                         "Executed over_warning_limit_command: %r, return_code: %r",
                         self.over_warning_limit_command,
@@ -609,6 +862,91 @@ class PgLookout:
                 known_replication_positions.setdefault(wal_pos, set()).add(instance)
         return known_replication_positions
 
+    def compute_failover_plan(self, standby_nodes):
+        """Work out who would be promoted if the master was lost now and whether we know enough to do it"""
+        known_replication_positions = self.get_replication_positions(standby_nodes)
+        # If there are multiple nodes with the same replication positions pick the one with the "highest" name
+        # to make sure pglookouts running on all standbys make the same decision.  The rationale for picking
+        # the "highest" node is that there's no obvious way for pglookout to decide which of the nodes is
+        # "best" beyond looking at replication positions, but picking the highest id supports environments
+        # where nodes are assigned identifiers from an incrementing sequence identifiers and where we want to
+        # promote the latest and greatest node.  In static environments node identifiers can be priority
+        # numbers, with the highest number being the one that should be preferred.
+        ranked = sorted(
+            ((wal_pos, instance) for wal_pos, instances in known_replication_positions.items() for instance in instances),
+            reverse=True,
+        )
+        excluded = {}
+        for instance, node_state in standby_nodes.items():
+            if instance in self.never_promote_these_nodes:
+                excluded[instance] = "never_promote"
+            elif not node_state["connection"]:
+                excluded[instance] = "disconnected"
+            elif instance not in {candidate for _, candidate in ranked}:
+                excluded[instance] = "stale_state"
+        total_observers = len(self.connected_observer_nodes) + len(self.disconnected_observer_nodes)
+        # +1 in the calculation comes from the master node
+        total_amount_of_nodes = len(standby_nodes) + 1 - len(self.never_promote_these_nodes) + total_observers
+        size_of_needed_majority = total_amount_of_nodes * 0.5
+        size_of_known_state = len(ranked) + len(self.connected_observer_nodes)
+        return {
+            "computed_at": get_iso_timestamp(),
+            "master": self.current_master,
+            "own_db": self.own_db,
+            "candidates": [{"instance": instance, "replication_position": wal_pos} for wal_pos, instance in ranked],
+            "excluded": excluded,
+            "promotion_candidate": ranked[0][1] if ranked else None,
+            "maintenance_mode": self.maintenance_mode,
+            "total_nodes": int(total_amount_of_nodes),
+            "needed_majority": size_of_needed_majority,
+            "known_state_size": size_of_known_state,
+            "has_majority": size_of_known_state >= size_of_needed_majority,
+            "observer_sources": dict(self.observer_sources),
+        }
+
+    def _record_decision(self, action, **details):
+        self.failover_tracer.record("decision", action=action, **details)
+        if self.recorder:
+            self.recorder.record_decision(action, **details)
+
+    def _failover_action(self, plan):
+        if plan["promotion_candidate"] != self.own_db:
+            return "other_node_furthest_along"
+        if plan["maintenance_mode"]:
+            return "maintenance_mode"
+        if self.own_db in self.never_promote_these_nodes:
+            return "never_promote"
+        if not plan["has_majority"]:
+            return "no_majority"
+        if self.command_runner.is_busy(FAILOVER):
+            return "failover_running"
+        # pg_promote() doesn't go through the command runner and has to wait for other commands on its own
+        return "command_running" if self._promotes_with_pg_promote() and self.command_runner.is_busy() else "promote"
+
+    def _promotes_with_pg_promote(self):
+        return self.config.get("promotion_mode", "command") == "pg_promote"
+
+    def update_failover_plan(self, standby_nodes):
+        self.failover_plan = self.compute_failover_plan(standby_nodes)
+        self._failover_plan_standby_nodes = standby_nodes
+        return self.failover_plan
+
+    def get_failover_plan(self):
+        return self.failover_plan
+
+    def get_memory_usage(self, limit=DEFAULT_TOP_ALLOCATIONS):
+        structures = {
+            "cluster_state": state_size(self.cluster_state),
+            "observer_state": state_size(self.observer_state),
+            "failover_traces": {"entries": len(self.failover_tracer.traces())},
+        }
+        if isinstance(self.cluster_monitor, MultiClusterMonitor):
+            structures["cluster_states"] = state_size(self.cluster_states)
+            structures["observer_states"] = state_size(self.cluster_monitor.observer_states)
+        else:
+            structures["history"] = self.cluster_monitor.history.size()
+        return {"structures": structures, "tracemalloc": top_allocations(limit)}
+
     def _been_in_contact_with_master_within_failover_timeout(self):
         # no need to do anything here if there are no disconnected masters
         if self.disconnected_master_nodes:
@@ -631,49 +969,44 @@ class PgLookout:
                 "We still have some connected masters: %r, not failing over",
                 self.connected_master_nodes,
             )
+            self._record_decision("master_connected")
             return
         if self._been_in_contact_with_master_within_failover_timeout():
             self.log.warning(
                 "No connected master nodes, but last contact was still within failover timeout (%ss), not failing over",
                 self.replication_lag_failover_timeout,
             )
+            self._record_decision("master_contact_within_timeout")
             return
 
-        known_replication_positions = self.get_replication_positions(standby_nodes)
-        if not known_replication_positions:
+        plan = self.failover_plan
+        if plan is None or standby_nodes is not self._failover_plan_standby_nodes:
+            plan = self.update_failover_plan(standby_nodes)
+        if not plan["candidates"]:
             self.log.warning("No known replication positions, canceling failover consideration")
+            self._record_decision("no_replication_positions")
             return
-        # If there are multiple nodes with the same replication positions pick the one with the "highest" name
-        # to make sure pglookouts running on all standbys make the same decision.  The rationale for picking
-        # the "highest" node is that there's no obvious way for pglookout to decide which of the nodes is
-        # "best" beyond looking at replication positions, but picking the highest id supports environments
-        # where nodes are assigned identifiers from an incrementing sequence identifiers and where we want to
-        # promote the latest and greatest node.  In static environments node identifiers can be priority
-        # numbers, with the highest number being the one that should be preferred.
-        furthest_along_instance = max(known_replication_positions[max(known_replication_positions)])
+        furthest_along_instance = plan["promotion_candidate"]
         self.log.warning(
             "Node that is furthest along is: %r, all replication positions were: %r",
             furthest_along_instance,
-            sorted(known_replication_positions),
+            sorted({candidate["replication_position"] for candidate in plan["candidates"]}),
         )
-        total_observers = len(self.connected_observer_nodes) + len(self.disconnected_observer_nodes)
-        # +1 in the calculation comes from the master node
-        total_amount_of_nodes = len(standby_nodes) + 1 - len(self.never_promote_these_nodes) + total_observers
-        size_of_needed_majority = total_amount_of_nodes * 0.5
-        amount_of_known_replication_positions = 0
-        for known_replication_position in known_replication_positions.values():
-            amount_of_known_replication_positions += len(known_replication_position)
-        size_of_known_state = amount_of_known_replication_positions + len(self.connected_observer_nodes)
         self.log.debug(
             "Size of known state: %.2f, needed majority: %r, %r/%r",
-            size_of_known_state,
-            size_of_needed_majority,
-            amount_of_known_replication_positions,
-            int(total_amount_of_nodes),
+            plan["known_state_size"],
+            plan["needed_majority"],
+            len(plan["candidates"]),
+            plan["total_nodes"],
         )
 
+        self._record_decision(
+            self._failover_action(plan),
+            promotion_candidate=furthest_along_instance,
+            has_majority=plan["has_majority"],
+        )
         if furthest_along_instance == self.own_db:
-            if self.check_for_maintenance_mode_file():
+            if plan["maintenance_mode"]:
                 self.log.warning(
                     "Canceling failover even though we were the node the furthest along, since "
                     "this node has an existing maintenance_mode_file: %r",
@@ -685,15 +1018,35 @@ class PgLookout:
                     " should never be promoted to master",
                     self.own_db,
                 )
-            elif size_of_known_state < size_of_needed_majority:
+            elif not plan["has_majority"]:
                 self.log.warning(
                     "Not doing a failover even though we were the node the furthest along, since we aren't "
                     "aware of the states of enough of the other nodes"
                 )
+            elif self.command_runner.is_busy(FAILOVER):
+                self.log.warning("Failover command is still running, not starting another failover")
+            elif self._promotes_with_pg_promote() and self.command_runner.is_busy():
+                self.log.warning("An external command is still running, postponing promotion with pg_promote()")
+            elif self._promotes_with_pg_promote() and self.promote_with_pg_promote():
+                self.create_alert_file("failover_has_happened")
+                self.replication_lag_over_warning_limit = False
+                self.delete_alert_file("replication_delay_warning")
+            elif self._run_external_commands_in_background():
+                self.log.warning("We will now do a failover to ourselves since we were the instance furthest along")
+                # the job holds off other commands for failover_sleep_time to give the DB time to restart
+                self.failover_tracer.record("command_start", kind=FAILOVER, background=True)
+                self.command_runner.submit(
+                    FAILOVER,
+                    [self._command_step(FAILOVER, self.failover_command)],
+                    post_delay=self.config.get("failover_sleep_time", 0.0),
+                )
+                self.create_alert_file("failover_has_happened")
             else:
                 start_time = time.monotonic()
                 self.log.warning("We will now do a failover to ourselves since we were the instance furthest along")
-                return_code = self.execute_external_command(self.failover_command)
+                self.failover_tracer.record("command_start", kind=FAILOVER, background=False)
+                return_code = self.execute_external_command(self.failover_command, kind=FAILOVER)
+                self.failover_tracer.record("command_end", kind=FAILOVER, return_code=return_code)
                 self.log.warning(
                     "Executed failover command: %r, return_code: %r, took: %.2fs",
                     self.failover_command,
@@ -714,6 +1067,73 @@ class PgLookout:
                 furthest_along_instance,
             )
 
+    def _uses_local_db(self):
+        return self._promotes_with_pg_promote() or self.config.get("autofollow_mode", "restart") == "reload"
+
+    def check_local_db(self):
+        """Keep the connection used for promotion and autofollow open, so it's ready when it's needed"""
+        if not self._uses_local_db():
+            self.local_db.close()
+            return
+        self.local_db.check(time.monotonic())
+
+    def promote_with_pg_promote(self):
+        """Promote the local standby with pg_promote() and wait until it has left recovery.
+
+        Returns False if the promotion could not be done or confirmed this way, in which case
+        the caller falls back to failover_command."""
+        wait_seconds = int(self.config.get("promotion_wait_seconds", 60))
+        start_time = time.monotonic()
+        try:
+            server_version = self.local_db.server_version
+            if server_version < 120000:
+                self.log.warning("PostgreSQL %r does not support pg_promote(), using failover_command", server_version)
+                return False
+            self.log.warning("We will now promote ourselves with pg_promote() since we were the instance furthest along")
+            self.failover_tracer.record("command_start", kind="pg_promote", background=False)
+            rows = self.local_db.execute(
+                "SELECT pg_catalog.pg_promote(wait => true, wait_seconds => %s) AS promoted", (wait_seconds,)
+            )
+            self.log.info("pg_promote() returned %r after %.2fs", rows[0]["promoted"], time.monotonic() - start_time)
+            deadline = start_time + wait_seconds
+            while True:
+                status = self.local_db.execute(
+                    "SELECT now() AS db_time, pg_is_in_recovery(), pg_last_xact_replay_timestamp(), "
+                    "NULL AS pg_last_xlog_receive_location, pg_current_wal_lsn() AS pg_last_xlog_replay_location "
+                    "WHERE NOT pg_is_in_recovery()"
+                )
+                if status or time.monotonic() >= deadline:
+                    break
+                time.sleep(self.config.get("promotion_poll_interval", 0.1))
+        except psycopg2.Error as ex:
+            self.log.exception("Failed to promote with pg_promote(), using failover_command")
+            self.stats.unexpected_exception(ex, where="promote_with_pg_promote")
+            return False
+        duration = time.monotonic() - start_time
+        self.failover_tracer.record("command_end", kind="pg_promote", promoted=bool(status))
+        if not status:
+            self.log.error("Node was still in recovery %.2fs after pg_promote(), using failover_command", duration)
+            self.stats.increase("promotion_timeout")
+            return False
+        self.stats.timing("promotion", round(duration * 1000.0, 3), tags={"method": "pg_promote"})
+        self.log.warning("Promoted ourselves with pg_promote(), took: %.2fs", duration)
+        # don't wait for the next poll of the cluster monitor to see our new role
+        new_state = ClusterMonitor._parse_status_query_result(status[0])  # pylint: disable=protected-access
+        self.cluster_state.setdefault(self.own_db, {}).update(new_state)
+        self.failover_tracer.master_seen(self.own_db)
+        self.cluster_monitor_check_queue.put("promoted ourselves, recheck")
+        return True
+
+    def get_primary_conninfo_for(self, new_master_instance):
+        """primary_conninfo to use for following the given instance, based on primary_conninfo_template"""
+        new_conn_info = get_connection_info(self.primary_conninfo_template)
+        master_instance_conn_info = get_connection_info(self.config["remote_conns"][new_master_instance])
+        assert "host" in master_instance_conn_info
+        new_conn_info["host"] = master_instance_conn_info["host"]
+        if "port" in master_instance_conn_info:
+            new_conn_info["port"] = master_instance_conn_info["port"]
+        return new_conn_info
+
     def modify_recovery_conf_to_point_at_new_master(self, new_master_instance):
         with open(os.path.join(self.config.get("pg_data_directory"), "PG_VERSION"), "r") as fp:
             pg_version = fp.read().strip()
@@ -743,12 +1163,7 @@ class PgLookout:
 
         # If has_recovery_target_timeline is set and old_conn_info matches
         # new info we don't have to do anything
-        new_conn_info = get_connection_info(self.primary_conninfo_template)
-        master_instance_conn_info = get_connection_info(self.config["remote_conns"][new_master_instance])
-        assert "host" in master_instance_conn_info
-        new_conn_info["host"] = master_instance_conn_info["host"]
-        if "port" in master_instance_conn_info:
-            new_conn_info["port"] = master_instance_conn_info["port"]
+        new_conn_info = self.get_primary_conninfo_for(new_master_instance)
         if new_conn_info == old_conn_info:
             self.log.debug(
                 "recovery.conf already contains conninfo matching %r, not updating",
@@ -774,8 +1189,44 @@ class PgLookout:
         os.rename(path_to_recovery_conf + "_temp", path_to_recovery_conf)
         return True
 
+    def follow_new_master_with_reload(self, new_master_instance):
+        """Point the local standby at a new master with ALTER SYSTEM and a configuration reload.
+
+        Returns False if the local PostgreSQL is too old to reload primary_conninfo, raises on errors."""
+        server_version = self.local_db.server_version
+        if server_version < 130000:
+            self.log.info("PostgreSQL %r can't reload primary_conninfo, restart is required", server_version)
+            return False
+        new_conn_info = self.get_primary_conninfo_for(new_master_instance)
+        rows = self.local_db.execute("SELECT pg_catalog.current_setting('primary_conninfo') AS primary_conninfo")
+        try:
+            old_conn_info = get_connection_info(rows[0]["primary_conninfo"])
+        except ValueError:
+            self.log.exception("failed to parse previous primary_conninfo, ignoring")
+            old_conn_info = None
+        if new_conn_info == old_conn_info:
+            self.log.info("Already following master %r, no need to start following it again", new_master_instance)
+            return True
+        self.local_db.execute("ALTER SYSTEM SET primary_conninfo = %s", (create_connection_string(new_conn_info),))
+        self.local_db.execute("SELECT pg_catalog.pg_reload_conf()")
+        return True
+
     def start_following_new_master(self, new_master_instance):
         start_time = time.monotonic()
+        if self.config.get("autofollow_mode", "restart") == "reload":
+            try:
+                if self.follow_new_master_with_reload(new_master_instance):
+                    duration = time.monotonic() - start_time
+                    self.stats.timing("autofollow", round(duration * 1000.0, 3), tags={"method": "reload"})
+                    self.log.info(
+                        "Started following new master %r by reloading configuration, took: %.2fs",
+                        new_master_instance,
+                        duration,
+                    )
+                    return
+            except psycopg2.Error as ex:
+                self.log.exception("Failed to follow new master %r by reloading, restarting instead", new_master_instance)
+                self.stats.unexpected_exception(ex, where="follow_new_master_with_reload")
         updated_config = self.modify_recovery_conf_to_point_at_new_master(new_master_instance)
         if not updated_config:
             self.log.info(
@@ -792,30 +1243,50 @@ class PgLookout:
             start_command,
             stop_command,
         )
-        self.execute_external_command(stop_command)
-        self.execute_external_command(start_command)
+        if self._run_external_commands_in_background():
+            self.command_runner.submit(
+                "autofollow",
+                [self._command_step("pg_stop", stop_command), self._command_step("pg_start", start_command)],
+            )
+            return
+        self.execute_external_command(stop_command, kind="pg_stop")
+        self.execute_external_command(start_command, kind="pg_start")
+        duration = time.monotonic() - start_time
+        self.stats.timing("autofollow", round(duration * 1000.0, 3), tags={"method": "restart"})
         self.log.info(
             "Started following new master %r, took: %.2fs",
             new_master_instance,
-            time.monotonic() - start_time,
+            duration,
         )
 
-    def execute_external_command(self, command):
-        self.log.warning("Executing external command: %r", command)
-        return_code, output = 0, ""
-        try:
-            output = subprocess.check_call(command)
-        except subprocess.CalledProcessError as err:
-            self.log.exception(
-                "Problem with executing: %r, return_code: %r, output: %r",
-                command,
-                err.returncode,
-                err.output,
-            )
-            self.stats.unexpected_exception(err, where="execute_external_command")
-            return_code = err.returncode  # pylint: disable=no-member
-        self.log.warning("Executed external command: %r, output: %r", return_code, output)
-        return return_code
+    def _run_external_commands_in_background(self):
+        return self.config.get("external_command_mode", "blocking") == "background"
+
+    def _command_step(self, kind, command):
+        return kind, command, self.config.get("external_command_timeouts", {}).get(kind)
+
+    def execute_external_command(self, command, kind="external"):
+        """Run an external command to completion, returns its exit code or None if it could not be run"""
+        _, command, timeout = self._command_step(kind, command)
+        return self.command_runner.run(kind, command, timeout=timeout).return_code
+
+    def handle_external_command_results(self):
+        """Process the results of commands that were run in the background"""
+        while True:
+            try:
+                result = self.command_completion_queue.get_nowait()
+            except Empty:
+                return
+            if result.kind == FAILOVER:
+                self.failover_tracer.record(
+                    "command_end", kind=FAILOVER, return_code=result.return_code, duration=result.duration
+                )
+            if result.kind == FAILOVER and result.return_code == 0:
+                self.replication_lag_over_warning_limit = False
+                self.delete_alert_file("replication_delay_warning")
+
+    def is_in_maintenance_mode(self):
+        return bool(self.own_db) and self.check_for_maintenance_mode_file()
 
     def check_for_maintenance_mode_file(self):
         return os.path.exists(self.config.get("maintenance_mode_file", "/tmp/pglookout_maintenance_mode_file"))
@@ -866,6 +1337,7 @@ class PgLookout:
 
     def main_loop(self):
         while self.running:
+            start_time = time.monotonic()
             new_config = False
             if self.config_reload_pending:
                 self.config_reload_pending = False
@@ -877,11 +1349,13 @@ class PgLookout:
                     raise
             # If we have a new config, wait for the requested check to be completed before we try anything else.
             if not new_config:
+                self.handle_external_command_results()
                 try:
                     self._apply_latest_config_version()
                 except Exception as ex:  # pylint: disable=broad-except
                     self.log.exception("Failed to update configuration")
                     self.stats.unexpected_exception(ex, where="main_loop_writer_cluster_state")
+                self.check_local_db()
                 try:
                     self.check_cluster_state()
                     self._check_cluster_monitor_thread_health(now=time.monotonic())
@@ -893,8 +1367,12 @@ class PgLookout:
                 except Exception as ex:  # pylint: disable=broad-except
                     self.log.exception("Failed to write cluster state")
                     self.stats.unexpected_exception(ex, where="main_loop_writer_cluster_state")
+                self.notify_ready()
+            wait_start = time.monotonic()
+            self.watchdog.iteration("main", wait_start - start_time)
+            timeout = self._get_check_interval()
             try:
-                self.failover_decision_queue.get(timeout=self._get_check_interval())
+                self.failover_decision_queue.get(timeout=timeout)
                 q = self.failover_decision_queue
                 while not q.empty():
                     try:
@@ -904,9 +1382,11 @@ class PgLookout:
                 self.log.info("Immediate failover check completed")
             except Empty:
                 pass
+            self.watchdog.waited("main", time.monotonic() - wait_start, timeout)
 
     def run(self):
         self._start_time = time.monotonic()
+        self.watchdog.start()
         self.cluster_monitor.start()
         self.webserver.start()
         self.main_loop()
@@ -0,0 +1,66 @@
+"""
+pglookout - thread stack dumps and sampling profiles of the running process
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Stacks are sampled from all threads with sys._current_frames(), so nothing needs
+to be set up in advance and the process is only slowed down while sampling.
+Profiles are reported in the collapsed stack format of flame graph tools: one
+line per distinct stack, frames from the thread name down separated by
+semicolons, followed by the number of samples.
+"""
+from collections import Counter
+from typing import Dict
+
+import datetime
+import os
+import sys
+import threading
+import time
+import traceback
+
+DEFAULT_SAMPLE_INTERVAL = 0.01
+MAX_PROFILE_SECONDS = 60.0
+
+
+def _thread_names() -> Dict[int, str]:
+    return {thread.ident: thread.name for thread in threading.enumerate() if thread.ident is not None}
+
+
+def dump_stacks() -> str:
+    """Current stacks of all threads"""
+    names = _thread_names()
+    lines = []
+    for ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+        lines.append(f"Thread {names.get(ident, 'unknown')!r} ({ident}), most recent call last:\n")
+        lines.extend(traceback.format_stack(frame))
+        lines.append("\n")
+    return "".join(lines)
+
+
+def sample_stacks(duration: float, interval: float = DEFAULT_SAMPLE_INTERVAL) -> str:
+    """Collapsed stacks of all the other threads sampled every `interval` seconds for `duration` seconds"""
+    own_ident = threading.get_ident()
+    counts: "Counter[str]" = Counter()
+    end_time = time.monotonic() + duration
+    while time.monotonic() < end_time:
+        names = _thread_names()
+        for ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+            if ident == own_ident:
+                continue
+            codes = [stack_frame.f_code for stack_frame, _ in traceback.walk_stack(frame)]
+            stack = [f"{code.co_name} ({code.co_filename})" for code in codes]
+            stack.append(names.get(ident, str(ident)))
+            counts[";".join(name.replace(";", ":") for name in reversed(stack))] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def write_debug_dump(directory: str, kind: str, text: str) -> str:
+    """Write `text` to a new file named after `kind` and the current time in `directory`, returns its path"""
+    timestamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+    path = os.path.join(directory, f"pglookout_{kind}_{timestamp}_{os.getpid()}.txt")
+    with open(path, "w") as fp:
+        fp.write(text)
+    return path
@@ -0,0 +1,184 @@
+"""
+pglookout - recording of the decision engine's input and decisions
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Appends every configuration load, every cluster_state and observer_state
+snapshot evaluated by the decision engine and every decision it takes to a
+JSON lines file so that incidents can be replayed with
+`python -m pglookout.simulation.replay`.  Passwords are left out of the
+recorded connection strings and the file is only readable by its owner.
+State snapshots only contain the nodes and observers whose state changed since
+the previous snapshot.  When the file grows over its size limit it's rotated
+and the new file starts with the configuration and a full snapshot.
+"""
+from .common import get_iso_timestamp
+from .pgutil import create_connection_string, get_connection_info
+from typing import Any, Dict, Iterator, Mapping, Optional, TextIO, Union
+
+import datetime
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+RECORDING_VERSION = 1
+DEFAULT_RECORDING_MAX_BYTES = 64 * 1024 * 1024
+
+Record = Dict[str, Any]
+
+# settings holding a connection string or connection info object, besides the ones in remote_conns
+CONNINFO_SETTINGS = ("local_conninfo", "primary_conninfo_template")
+
+
+def _encode(data: Any) -> str:
+    return json.dumps(data, separators=(",", ":"), sort_keys=True, default=str)
+
+
+def read_recording(path: str) -> Iterator[Record]:
+    """Yield the records of a recording, a truncated last line is ignored"""
+    with open(path, "r") as fp:
+        for line in fp:
+            if not line.endswith("\n"):
+                break
+            if line.strip():
+                yield json.loads(line)
+
+
+def _without_password(info: Union[str, Dict[str, Any]]) -> Union[str, Dict[str, Any]]:
+    try:
+        conn_info: Dict[str, Any] = get_connection_info(info)
+    except ValueError:
+        # can't tell what's in it, so it can't be written out
+        return "<invalid connection info>"
+    conn_info.pop("password", None)
+    if isinstance(info, dict):
+        return conn_info
+    connection_string: str = create_connection_string(conn_info)
+    return connection_string
+
+
+def without_passwords(config: Mapping[str, Any]) -> Dict[str, Any]:
+    """Copy of `config` with the passwords removed from its connection strings"""
+    config = dict(config)
+    if config.get("remote_conns"):
+        config["remote_conns"] = {name: _without_password(info) for name, info in config["remote_conns"].items()}
+    for key in CONNINFO_SETTINGS:
+        if config.get(key):
+            config[key] = _without_password(config[key])
+    return config
+
+
+def _open(path: str) -> TextIO:
+    # the state includes connection details of the cluster, keep it private
+    return open(os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600), "a")
+
+
+class StateRecorder:
+    def __init__(self, path: str, max_bytes: int = DEFAULT_RECORDING_MAX_BYTES) -> None:
+        self.log = logging.getLogger("StateRecorder")
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._start_time = time.monotonic()
+        self._start_datetime = datetime.datetime.utcnow()
+        self._config: Optional[Mapping[str, Any]] = None
+        # encoded state of each node and observer as of the latest snapshot
+        self._cluster: Dict[str, str] = {}
+        self._observers: Dict[str, str] = {}
+        self._maintenance_mode = False
+        self._fp = _open(path)
+        self._write_header()
+
+    def _write(self, record: Record) -> None:
+        try:
+            self._fp.write(_encode(record) + "\n")
+            self._fp.flush()
+        except (OSError, ValueError) as ex:
+            # a full disk or a closed file must not stop pglookout from doing its job
+            self.log.error("Failed to write to recording %r: %s", self.path, ex)
+
+    def _write_header(self) -> None:
+        self._write(
+            {
+                "type": "header",
+                "version": RECORDING_VERSION,
+                "start": get_iso_timestamp(self._start_datetime),
+                # the monotonic clock of the process, which values such as replication_start_time refer to
+                "monotonic": self._start_time,
+                "hostname": socket.gethostname(),
+            }
+        )
+
+    def _elapsed(self) -> float:
+        return round(time.monotonic() - self._start_time, 6)
+
+    def _rotate_if_needed(self) -> None:
+        if self._fp.closed or self._fp.tell() < self.max_bytes:
+            return
+        self._fp.close()
+        try:
+            os.replace(self.path, self.path + ".1")
+            # the new file must be replayable on its own
+            self._fp = _open(self.path)
+        except OSError as ex:
+            self.log.error("Failed to rotate recording %r: %s", self.path, ex)
+            return
+        self._write_header()
+        if self._config is not None:
+            self._write({"type": "config", "t": self._elapsed(), "config": self._config})
+        self._cluster, self._observers = {}, {}
+        self._maintenance_mode = False
+
+    def record_config(self, config: Mapping[str, Any]) -> None:
+        with self._lock:
+            self._config = without_passwords(config)
+            self._write({"type": "config", "t": self._elapsed(), "config": self._config})
+
+    def record_state(
+        self,
+        cluster_state: Mapping[str, Any],
+        observer_state: Mapping[str, Any],
+        *,
+        maintenance_mode: bool = False,
+        refresh: bool = False,
+    ) -> None:
+        """Record the state the decision engine evaluates.
+
+        `refresh` marks state that is read again in the middle of an evaluation."""
+        with self._lock:
+            self._rotate_if_needed()
+            record: Record = {"type": "state", "t": self._elapsed()}
+            if refresh:
+                record["refresh"] = True
+            if maintenance_mode != self._maintenance_mode:
+                self._maintenance_mode = record["maintenance_mode"] = maintenance_mode
+            for key, state, previous in (
+                ("cluster", cluster_state, self._cluster),
+                ("observers", observer_state, self._observers),
+            ):
+                changed = {}
+                for name, value in state.items():
+                    encoded = _encode(value)
+                    if previous.get(name) != encoded:
+                        previous[name] = encoded
+                        changed[name] = value
+                removed = sorted(set(previous) - set(state))
+                for name in removed:
+                    del previous[name]
+                if changed:
+                    record[key] = changed
+                if removed:
+                    record[f"removed_{key}"] = removed
+            self._write(record)
+
+    def record_decision(self, action: str, **details: Any) -> None:
+        with self._lock:
+            self._write({"type": "decision", "t": self._elapsed(), "action": action, **details})
+
+    def close(self) -> None:
+        with self._lock:
+            self._fp.close()
@@ -0,0 +1,59 @@
+"""
+pglookout - phase scheduling of monitoring rounds
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Every pglookout of a cluster polls the nodes at the same interval.  Instead
+of starting the next round an interval after the previous one, rounds start
+at a fixed phase of the interval on the wall clock, derived from a stable hash
+of the instance's name.  The rounds of cooperating pglookouts are spread over
+the interval and stay spread after restarts and config rollouts, as long as
+the clocks of the hosts are roughly in sync.
+
+The web server advertises when the next round starts and how long the last
+one took, so pglookouts polling an observer can fetch its state right after
+the observer's own round.
+"""
+from typing import Any, Dict, Optional
+
+import socket
+import zlib
+
+NEXT_ROUND_HEADER = "X-Pglookout-Next-Round"
+ROUND_DURATION_HEADER = "X-Pglookout-Round-Duration"
+# seconds after an observer's round is expected to be done its state is fetched
+OBSERVER_FETCH_MARGIN = 0.05
+
+
+def phase_fraction(name: str) -> float:
+    """Stable fraction of the poll interval in [0, 1) for the pglookout named `name`"""
+    return zlib.crc32(name.encode("utf-8")) / 2**32
+
+
+def poll_phase(config: Dict[str, Any]) -> float:
+    """The configured poll_phase, or the phase derived from own_db or the host name"""
+    phase = config.get("poll_phase")
+    if phase is not None:
+        return float(phase) % 1.0
+    return phase_fraction(config.get("own_db") or socket.gethostname())
+
+
+def next_phase_time(now: float, interval: float, phase: float) -> float:
+    """The first time after `now` that is `phase` of `interval` past a multiple of `interval`"""
+    delay = (phase * interval - now) % interval
+    return now + (delay or interval)
+
+
+def parse_round_schedule(headers: Any) -> Optional[Dict[str, float]]:
+    """The next round start time and the last round duration advertised in `headers`, None if not advertised"""
+    try:
+        return {"next_round": float(headers[NEXT_ROUND_HEADER]), "duration": float(headers[ROUND_DURATION_HEADER])}
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def round_schedule_headers(schedule: Optional[Dict[str, float]]) -> Dict[str, str]:
+    if schedule is None:
+        return {}
+    return {NEXT_ROUND_HEADER: f"{schedule['next_round']:.3f}", ROUND_DURATION_HEADER: f"{schedule['duration']:.3f}"}
@@ -0,0 +1,9 @@
+"""
+pglookout - deterministic cluster simulation
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Runs the failover decision engine against synthesized clusters of any size
+with scripted failures under a virtual clock, see `python -m pglookout.simulation --help`.
+"""
@@ -0,0 +1,48 @@
+"""
+pglookout - simulation command line
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from .runner import Simulation
+from .scenarios import SCENARIOS
+from typing import Optional, Sequence
+
+import argparse
+import json
+import sys
+
+
+def main(args: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m pglookout.simulation",
+        description="Run the pglookout failover decision engine against simulated clusters",
+    )
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all), one of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--json", action="store_true", help="print the reports as JSON lines")
+    arg = parser.parse_args(args)
+
+    unknown = set(arg.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    all_ok = True
+    for name in arg.scenarios or SCENARIOS:
+        report = Simulation(SCENARIOS[name]()).run()
+        all_ok = all_ok and report.ok
+        if arg.json:
+            print(json.dumps(report.to_dict()))
+            continue
+        latency = "-" if report.decision_latency is None else f"{report.decision_latency:.1f}s"
+        decision_cpu = "-" if report.cpu_per_decision_ms is None else f"{report.cpu_per_decision_ms:.2f}ms"
+        print(
+            f"{report.scenario:<24} {'ok' if report.ok else 'FAILED':<6} nodes={report.node_count} "
+            f"observers={report.observer_count} evaluations={report.evaluations} "
+            f"decisions={report.failover_decisions} promotions={len(report.promotions)} latency={latency} "
+            f"cpu/evaluation={report.cpu_per_evaluation_ms:.2f}ms (max {report.max_cpu_per_evaluation_ms:.2f}ms) "
+            f"cpu/decision={decision_cpu} wall={report.wall_time:.2f}s"
+        )
+    return 0 if all_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
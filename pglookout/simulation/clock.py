@@ -0,0 +1,85 @@
+"""
+pglookout - virtual clock for simulations
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from ..common import get_iso_timestamp
+from types import ModuleType
+from typing import Iterator, Optional
+from unittest.mock import patch
+
+import contextlib
+import datetime
+import time
+
+DEFAULT_START_TIME = datetime.datetime(2026, 1, 1)
+
+
+class VirtualClock:
+    """Time that only moves when the simulation advances it"""
+
+    def __init__(self, start: datetime.datetime = DEFAULT_START_TIME) -> None:
+        self.start = start
+        self.elapsed = 0.0
+
+    def monotonic(self) -> float:
+        return self.elapsed
+
+    def time(self) -> float:
+        return self.start.replace(tzinfo=datetime.timezone.utc).timestamp() + self.elapsed
+
+    def utcnow(self) -> datetime.datetime:
+        return self.start + datetime.timedelta(seconds=self.elapsed)
+
+    def iso_timestamp(self, offset: float = 0.0) -> str:
+        return get_iso_timestamp(self.utcnow() + datetime.timedelta(seconds=offset))
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+
+    def advance(self, seconds: float) -> None:
+        if seconds > 0:
+            self.elapsed += seconds
+
+    def _time_module(self) -> ModuleType:
+        module = ModuleType("time")
+        module.__dict__.update(time.__dict__)
+        module.__dict__.update({"monotonic": self.monotonic, "time": self.time, "sleep": self.sleep})
+        return module
+
+    def _datetime_module(self) -> ModuleType:
+        clock = self
+
+        class VirtualDatetime(datetime.datetime):
+            @classmethod
+            def utcnow(cls) -> "VirtualDatetime":
+                now = clock.utcnow()
+                return cls.combine(now.date(), now.time())
+
+            @classmethod
+            def now(cls, tz: Optional[datetime.tzinfo] = None) -> "VirtualDatetime":
+                now = clock.utcnow().replace(tzinfo=datetime.timezone.utc)
+                if tz is None:
+                    now = now.astimezone().replace(tzinfo=None)
+                else:
+                    now = now.astimezone(tz)
+                return cls.combine(now.date(), now.timetz())
+
+        module = ModuleType("datetime")
+        module.__dict__.update(datetime.__dict__)
+        module.__dict__["datetime"] = VirtualDatetime
+        return module
+
+    @contextlib.contextmanager
+    def patch(self, *modules: ModuleType) -> Iterator[None]:
+        """Make the `time` and `datetime` modules used by `modules` follow this clock.
+
+        This replaces module globals so nothing else may use the given modules concurrently."""
+        replacements = {time: self._time_module(), datetime: self._datetime_module()}
+        with contextlib.ExitStack() as stack:
+            for module in modules:
+                for name, value in list(vars(module).items()):
+                    if isinstance(value, ModuleType) and value in replacements:
+                        stack.enter_context(patch.object(module, name, replacements[value]))
+            yield
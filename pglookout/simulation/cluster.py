@@ -0,0 +1,179 @@
+"""
+pglookout - simulated replication cluster
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Synthesizes the cluster_state and observer_state that the cluster monitor of a
+pglookout instance would collect from a cluster of nodes and observers, with
+node failures, network partitions and replication lag under script control.
+"""
+from .clock import VirtualClock
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# 16 MiB/s of WAL
+DEFAULT_WAL_RATE = 16 * 1024 * 1024
+
+NodeState = Dict[str, Any]
+
+
+def format_lsn(offset: int) -> str:
+    return f"{offset >> 32:X}/{offset & 0xFFFFFFFF:X}"
+
+
+@dataclass
+class SimulatedNode:
+    name: str
+    is_master: bool = False
+    alive: bool = True
+    # how many seconds behind the master the node replays WAL
+    replay_delay: float = 0.0
+    lsn: int = 0
+    last_replay_time: float = 0.0
+    min_replication_time_lag: Optional[float] = None
+
+
+@dataclass
+class ScriptedEvent:
+    """Change to the cluster at a given point of simulated time.
+
+    `action` is one of "kill", "revive", "promote", "partition", "heal" and
+    "replay_delay".  Partitions make `nodes`, which may also name observers,
+    unreachable from `viewers`, where the viewer None is the simulated pglookout
+    itself."""
+
+    at: float
+    action: str
+    nodes: Tuple[str, ...] = ()
+    viewers: Tuple[Optional[str], ...] = (None,)
+    value: float = 0.0
+
+
+@dataclass
+class SimulatedCluster:
+    clock: VirtualClock
+    nodes: Dict[str, SimulatedNode]
+    observers: List[str]
+    wal_rate: float = DEFAULT_WAL_RATE
+    unreachable: Set[Tuple[Optional[str], str]] = field(default_factory=set)
+    # the cluster_state of each observer, which it serves to us
+    observer_views: Dict[str, Dict[str, NodeState]] = field(default_factory=dict)
+    _last_update: float = 0.0
+
+    @classmethod
+    def create(
+        cls,
+        clock: VirtualClock,
+        *,
+        node_count: int,
+        observer_count: int,
+        replay_delays: Iterable[float] = (),
+        wal_rate: float = DEFAULT_WAL_RATE,
+    ) -> "SimulatedCluster":
+        """Create node0 .. nodeN-1 with node0 as the master, and observer0 .. observerM-1"""
+        delays = list(replay_delays)
+        nodes = {}
+        for index in range(node_count):
+            name = f"node{index}"
+            delay = delays[index] if index < len(delays) else 0.1 * index
+            nodes[name] = SimulatedNode(name=name, is_master=index == 0, replay_delay=delay)
+        observers = [f"observer{index}" for index in range(observer_count)]
+        return cls(clock=clock, nodes=nodes, observers=observers, wal_rate=wal_rate, _last_update=clock.monotonic())
+
+    @property
+    def master(self) -> Optional[SimulatedNode]:
+        masters = [node for node in self.nodes.values() if node.is_master and node.alive]
+        return masters[0] if len(masters) == 1 else None
+
+    def apply(self, event: ScriptedEvent) -> None:
+        if event.action in {"partition", "heal"}:
+            links = {(viewer, node) for viewer in event.viewers for node in event.nodes}
+            if event.action == "partition":
+                self.unreachable |= links
+            else:
+                self.unreachable -= links
+            return
+        for name in event.nodes:
+            node = self.nodes[name]
+            if event.action == "kill":
+                node.alive = False
+            elif event.action == "revive":
+                node.alive = True
+            elif event.action == "promote":
+                self.promote(name)
+            elif event.action == "replay_delay":
+                node.replay_delay = event.value
+            else:
+                raise ValueError(f"unknown simulated event {event.action!r}")
+
+    def promote(self, name: str) -> None:
+        for node in self.nodes.values():
+            node.is_master = node.name == name
+        self.nodes[name].replay_delay = 0.0
+
+    def advance(self) -> None:
+        """Move WAL positions forward to the current time of the clock"""
+        now = self.clock.monotonic()
+        elapsed, self._last_update = now - self._last_update, now
+        master = self.master
+        if master is None:
+            return
+        master.lsn += int(self.wal_rate * elapsed)
+        master.last_replay_time = now
+        for node in self.nodes.values():
+            if node is master or not node.alive:
+                continue
+            node.lsn = max(node.lsn, master.lsn - int(self.wal_rate * node.replay_delay))
+            node.last_replay_time = max(node.last_replay_time, now - node.replay_delay)
+
+    def node_state(self, name: str, viewer: Optional[str]) -> NodeState:
+        """What a probe of the node `name` by `viewer` returns, merged into the previous state like the monitor does"""
+        node = self.nodes[name]
+        fetch_time = self.clock.iso_timestamp()
+        if not node.alive or (viewer, name) in self.unreachable:
+            return {"connection": False, "fetch_time": fetch_time}
+        state: NodeState = {
+            "connection": True,
+            "fetch_time": fetch_time,
+            "db_time": fetch_time,
+            "pg_is_in_recovery": not node.is_master,
+        }
+        if node.is_master:
+            state.update(
+                {
+                    "pg_last_xact_replay_timestamp": None,
+                    "pg_last_xlog_receive_location": None,
+                    "pg_last_xlog_replay_location": format_lsn(node.lsn),
+                    "replication_time_lag": None,
+                }
+            )
+            return state
+        lag = self.clock.monotonic() - node.last_replay_time
+        if node.min_replication_time_lag is None or lag < node.min_replication_time_lag:
+            node.min_replication_time_lag = lag
+        state.update(
+            {
+                "pg_last_xact_replay_timestamp": self.clock.iso_timestamp(offset=-lag),
+                "pg_last_xlog_receive_location": format_lsn(node.lsn),
+                "pg_last_xlog_replay_location": format_lsn(node.lsn),
+                "replication_time_lag": lag,
+                "min_replication_time_lag": node.min_replication_time_lag,
+            }
+        )
+        return state
+
+    def monitoring_round(self, cluster_state: Dict[str, NodeState], observer_state: Dict[str, Dict[str, Any]]) -> None:
+        """Update `cluster_state` and `observer_state` in place like a round of the cluster monitor"""
+        self.advance()
+        for name in self.nodes:
+            cluster_state.setdefault(name, {}).update(self.node_state(name, None))
+        for observer in self.observers:
+            view = self.observer_views.setdefault(observer, {})
+            for name in self.nodes:
+                view.setdefault(name, {}).update(self.node_state(name, observer))
+            result: Dict[str, Any] = {"fetch_time": self.clock.iso_timestamp(), "connection": False}
+            if (None, observer) not in self.unreachable:
+                result["connection"] = True
+                result.update({name: dict(state) for name, state in view.items()})
+            observer_state.setdefault(observer, {}).update(result)
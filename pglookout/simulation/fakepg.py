@@ -0,0 +1,524 @@
+"""
+pglookout - fake PostgreSQL server
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Speaks enough of the PostgreSQL frontend/backend protocol (version 3, simple
+query flow, trust authentication) to answer the queries pglookout sends to
+the nodes it monitors.  A single listening socket serves any number of fake
+nodes, the node is picked by the database name of the connection, so
+hundreds of nodes can be monitored on one machine without running PostgreSQL.
+WAL positions advance in real time from the moment the cluster is created.
+"""
+from ..common import get_iso_timestamp
+from .cluster import DEFAULT_WAL_RATE, format_lsn
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import argparse
+import asyncio
+import datetime
+import logging
+import random
+import re
+import struct
+import sys
+import threading
+import time
+
+PROTOCOL_VERSION_3 = 196608
+SSL_REQUEST_CODE = 80877103
+GSSENC_REQUEST_CODE = 80877104
+CANCEL_REQUEST_CODE = 80877102
+
+# type oids of the result columns
+BOOL_OID = 16
+INT8_OID = 20
+TEXT_OID = 25
+FLOAT8_OID = 701
+TIMESTAMPTZ_OID = 1184
+PG_LSN_OID = 3220
+
+Row = Dict[str, Any]
+
+
+class FakeQueryError(Exception):
+    def __init__(self, code: str, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+@dataclass
+class FakeNode:
+    """A fake PostgreSQL node.
+
+    `latency` (plus up to `jitter`) is added to each query and `connect_latency`
+    to each connection.  `error_rate` is the share of queries that fail.  A node
+    that is `down` refuses new connections and drops the open ones on their
+    next query; a node that is `hanging` never answers."""
+
+    name: str
+    is_master: bool = False
+    # how many seconds behind the master the node replays WAL
+    replay_delay: float = 0.0
+    latency: float = 0.0
+    jitter: float = 0.0
+    connect_latency: float = 0.0
+    error_rate: float = 0.0
+    down: bool = False
+    hanging: bool = False
+    server_version: int = 150000
+    # the time replication stopped, WAL positions stay where they were at that time
+    replication_stopped_at: Optional[float] = None
+    replication_slots: List[Row] = field(default_factory=list)
+    primary_conninfo: str = ""
+    queries: int = 0
+
+
+@dataclass
+class FakeCluster:
+    nodes: Dict[str, FakeNode]
+    wal_rate: float = DEFAULT_WAL_RATE
+    start_time: float = field(default_factory=time.time)
+    txid: int = 1000
+    logical_messages: int = 0
+    # the time in the heartbeat row, None if there's no heartbeat table
+    heartbeat_time: Optional[float] = None
+    rng: random.Random = field(default_factory=lambda: random.Random(0))
+
+    @classmethod
+    def create(cls, node_count: int, wal_rate: float = DEFAULT_WAL_RATE, **node_settings: Any) -> "FakeCluster":
+        """Create node0 .. nodeN-1 with node0 as the master and standbys trailing 0.1s further behind each"""
+        nodes = {}
+        for index in range(node_count):
+            name = f"node{index}"
+            nodes[name] = FakeNode(name=name, is_master=index == 0, replay_delay=0.1 * index, **node_settings)
+        return cls(nodes=nodes, wal_rate=wal_rate)
+
+    def promote(self, name: str) -> None:
+        node = self.nodes[name]
+        node.is_master = True
+        node.replay_delay = 0.0
+        node.replication_stopped_at = None
+
+    def stop_replication(self, name: str) -> None:
+        self.nodes[name].replication_stopped_at = time.time()
+
+    def replay_time(self, node: FakeNode, now: float) -> float:
+        """The master's time of the newest WAL the node has replayed"""
+        if node.is_master:
+            return now
+        replay_time = now - node.replay_delay
+        if node.replication_stopped_at is not None:
+            replay_time = min(replay_time, node.replication_stopped_at)
+        return max(replay_time, self.start_time)
+
+    def lsn(self, node: FakeNode, now: float) -> str:
+        return format_lsn(int(self.wal_rate * (self.replay_time(node, now) - self.start_time)))
+
+
+def node_dsn(host: str, port: int, name: str) -> str:
+    return f"host={host} port={port} dbname={name} user=pglookout sslmode=disable"
+
+
+def _timestamptz(value: float) -> str:
+    return datetime.datetime.fromtimestamp(value, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f+00")
+
+
+def _split_select_list(select_list: str) -> List[str]:
+    items, depth, current = [], 0, ""
+    for char in select_list:
+        if char == "," and depth == 0:
+            items.append(current.strip())
+            current = ""
+            continue
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        current += char
+    items.append(current.strip())
+    return items
+
+
+SELECT_RE = re.compile(r"^SELECT\s+(?P<columns>.*?)(?:\s+WHERE\s+(?P<where>.*))?$", re.DOTALL | re.IGNORECASE)
+COLUMN_RE = re.compile(r"^(?P<expr>.*?)(?:\s+AS\s+(?P<alias>\w+))?$", re.DOTALL | re.IGNORECASE)
+FUNCTION_RE = re.compile(r"^(?:pg_catalog\.)?(?P<name>\w+)\s*\((?P<args>.*)\)$", re.DOTALL)
+HEARTBEAT_UPDATE_RE = re.compile(
+    r"^UPDATE (?P<table>\S+) SET heartbeat_time = now\(\) WHERE heartbeat_time <= now\(\) - (?P<seconds>[0-9.]+) "
+    r"\* INTERVAL '1 second'$",
+    re.IGNORECASE,
+)
+ALTER_CONNINFO_RE = re.compile(r"^ALTER SYSTEM SET primary_conninfo\s*=\s*'(?P<value>(?:[^']|'')*)'$", re.IGNORECASE)
+
+
+class FakeSession:
+    """Evaluates the queries of a single connection to a fake node"""
+
+    def __init__(self, cluster: FakeCluster, node: FakeNode) -> None:
+        self.cluster = cluster
+        self.node = node
+        self.functions: Dict[str, Callable[[float, str], Tuple[int, Any]]] = {
+            "now": lambda now, _args: (TIMESTAMPTZ_OID, _timestamptz(now)),
+            "pg_is_in_recovery": lambda _now, _args: (BOOL_OID, not self.node.is_master),
+            "pg_last_xact_replay_timestamp": self._last_xact_replay_timestamp,
+            "pg_last_wal_receive_lsn": self._standby_lsn,
+            "pg_last_wal_replay_lsn": self._standby_lsn,
+            "pg_last_xlog_receive_location": self._standby_lsn,
+            "pg_last_xlog_replay_location": self._standby_lsn,
+            "pg_current_wal_lsn": self._current_lsn,
+            "pg_current_xlog_location": self._current_lsn,
+            "txid_current": self._txid_current,
+            "pg_logical_emit_message": self._logical_emit_message,
+            "pg_promote": self._promote,
+            "current_setting": self._current_setting,
+            "pg_reload_conf": lambda _now, _args: (BOOL_OID, True),
+        }
+
+    def _last_xact_replay_timestamp(self, now: float, _args: str) -> Tuple[int, Any]:
+        if self.node.is_master:
+            return TIMESTAMPTZ_OID, None
+        return TIMESTAMPTZ_OID, _timestamptz(self.cluster.replay_time(self.node, now))
+
+    def _standby_lsn(self, now: float, _args: str) -> Tuple[int, Any]:
+        if self.node.is_master:
+            return PG_LSN_OID, None
+        return PG_LSN_OID, self.cluster.lsn(self.node, now)
+
+    def _current_lsn(self, now: float, _args: str) -> Tuple[int, Any]:
+        if not self.node.is_master:
+            raise FakeQueryError("55000", "recovery is in progress")
+        return PG_LSN_OID, self.cluster.lsn(self.node, now)
+
+    def _txid_current(self, _now: float, _args: str) -> Tuple[int, Any]:
+        if not self.node.is_master:
+            raise FakeQueryError("25006", "cannot assign TransactionIds during recovery")
+        self.cluster.txid += 1
+        return INT8_OID, self.cluster.txid
+
+    def _logical_emit_message(self, now: float, _args: str) -> Tuple[int, Any]:
+        if not self.node.is_master:
+            raise FakeQueryError("25006", "cannot execute pg_logical_emit_message() during recovery")
+        self.cluster.logical_messages += 1
+        return PG_LSN_OID, self.cluster.lsn(self.node, now)
+
+    def _update_heartbeat(self, table: str, seconds: float) -> Tuple[str, List[Tuple[str, int]], List[List[Any]]]:
+        if self.cluster.heartbeat_time is None:
+            raise FakeQueryError("42P01", f"relation {table} does not exist")
+        if not self.node.is_master:
+            raise FakeQueryError("25006", "cannot execute UPDATE in a read-only transaction")
+        now = time.time()
+        if self.cluster.heartbeat_time > now - seconds:
+            return "UPDATE 0", [], []
+        self.cluster.heartbeat_time = now
+        self.cluster.txid += 1
+        return "UPDATE 1", [], []
+
+    def _promote(self, _now: float, _args: str) -> Tuple[int, Any]:
+        if self.node.is_master:
+            raise FakeQueryError("55000", "recovery is not in progress")
+        self.cluster.promote(self.node.name)
+        return BOOL_OID, True
+
+    def _current_setting(self, _now: float, args: str) -> Tuple[int, Any]:
+        if args.strip() != "'primary_conninfo'":
+            raise FakeQueryError("42704", f"unrecognized configuration parameter {args.strip()}")
+        return TEXT_OID, self.node.primary_conninfo
+
+    def evaluate(self, query: str) -> Tuple[str, List[Tuple[str, int]], List[List[Any]]]:
+        """Return the command tag, the result columns with their type oids and the result rows"""
+        query = " ".join(query.split()).rstrip(";")
+        upper = query.upper()
+        if upper.startswith("SET ") or upper in {"BEGIN", "COMMIT", "ROLLBACK"}:
+            return upper.split()[0], [], []
+        match = HEARTBEAT_UPDATE_RE.match(query)
+        if match:
+            return self._update_heartbeat(match.group("table"), float(match.group("seconds")))
+        match = ALTER_CONNINFO_RE.match(query)
+        if match:
+            self.node.primary_conninfo = match.group("value").replace("''", "'")
+            return "ALTER SYSTEM", [], []
+        if "FROM pg_catalog.pg_replication_slots" in query:
+            return self._replication_slots()
+        if "FROM pg_catalog.pg_stat_replication" in query:
+            return self._stat_replication()
+        match = SELECT_RE.match(query)
+        if not match:
+            raise FakeQueryError("0A000", f"fake server does not support: {query}")
+        now = time.time()
+        columns: List[Tuple[str, int]] = []
+        values: List[Any] = []
+        for item in _split_select_list(match.group("columns")):
+            column = COLUMN_RE.match(item)
+            assert column is not None
+            expr = column.group("expr").strip()
+            if expr.upper() == "NULL":
+                columns.append((column.group("alias") or "?column?", TEXT_OID))
+                values.append(None)
+                continue
+            function = FUNCTION_RE.match(expr)
+            if not function or function.group("name") not in self.functions:
+                raise FakeQueryError("42883", f"fake server does not support: {expr}")
+            type_oid, value = self.functions[function.group("name")](now, function.group("args"))
+            columns.append((column.group("alias") or function.group("name"), type_oid))
+            values.append(value)
+        where = match.group("where")
+        if where and where.upper() == "NOT PG_IS_IN_RECOVERY()":
+            rows = [values] if self.node.is_master else []
+        elif where:
+            raise FakeQueryError("0A000", f"fake server does not support: WHERE {where}")
+        else:
+            rows = [values]
+        return f"SELECT {len(rows)}", columns, rows
+
+    def _stat_replication(self) -> Tuple[str, List[Tuple[str, int]], List[List[Any]]]:
+        """Every standby that is up streams from the master under its own name as application_name"""
+        now = time.time()
+        rows = []
+        if self.node.is_master:
+            for node in self.cluster.nodes.values():
+                if node.is_master or node.down or node.replication_stopped_at is not None:
+                    continue
+                lsn = self.cluster.lsn(node, now)
+                lag = node.replay_delay
+                rows.append([node.name, "127.0.0.1", "streaming", "async", lsn, lsn, lsn, lsn, lag, lag, lag])
+        names = [
+            "application_name",
+            "client_addr",
+            "state",
+            "sync_state",
+            "sent_lsn",
+            "write_lsn",
+            "flush_lsn",
+            "replay_lsn",
+        ]
+        columns = [(name, TEXT_OID) for name in names]
+        columns += [(name, FLOAT8_OID) for name in ["write_lag", "flush_lag", "replay_lag"]]
+        return f"SELECT {len(rows)}", columns, rows
+
+    def _replication_slots(self) -> Tuple[str, List[Tuple[str, int]], List[List[Any]]]:
+        names = [
+            "slot_name",
+            "plugin",
+            "slot_type",
+            "database",
+            "catalog_xmin",
+            "restart_lsn",
+            "confirmed_flush_lsn",
+            "state_data",
+        ]
+        rows = [
+            [slot.get(name) for name in names] for slot in self.node.replication_slots if slot.get("slot_type") == "logical"
+        ]
+        return f"SELECT {len(rows)}", [(name, TEXT_OID) for name in names], rows
+
+
+def _message(kind: bytes, payload: bytes = b"") -> bytes:
+    return kind + struct.pack("!I", len(payload) + 4) + payload
+
+
+def _error(code: str, message: str, severity: str = "ERROR") -> bytes:
+    fields = b""
+    for key, value in (("S", severity), ("V", severity), ("C", code), ("M", message)):
+        fields += key.encode() + value.encode() + b"\0"
+    return _message(b"E", fields + b"\0")
+
+
+def _encode_value(value: Any) -> bytes:
+    if isinstance(value, bool):
+        return b"t" if value else b"f"
+    return str(value).encode()
+
+
+def _result(tag: str, columns: Sequence[Tuple[str, int]], rows: Sequence[Sequence[Any]]) -> bytes:
+    data = b""
+    if columns:
+        description = struct.pack("!H", len(columns))
+        for name, type_oid in columns:
+            description += name.encode() + b"\0" + struct.pack("!IHIhih", 0, 0, type_oid, -1, -1, 0)
+        data += _message(b"T", description)
+        for row in rows:
+            payload = struct.pack("!H", len(row))
+            for value in row:
+                if value is None:
+                    payload += struct.pack("!i", -1)
+                else:
+                    encoded = _encode_value(value)
+                    payload += struct.pack("!I", len(encoded)) + encoded
+            data += _message(b"D", payload)
+    return data + _message(b"C", tag.encode() + b"\0")
+
+
+class FakePostgresServer:
+    """Serves the nodes of a FakeCluster on a single port, either in a thread or with `serve_forever`"""
+
+    def __init__(self, cluster: FakeCluster, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.log = logging.getLogger("FakePostgresServer")
+        self.cluster = cluster
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+
+    def dsn(self, name: str) -> str:
+        return node_dsn(self.host, self.port, name)
+
+    async def _listen(self) -> asyncio.AbstractServer:
+        # keep up with hundreds of clients connecting at once
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._loop = asyncio.get_running_loop()
+        self._started.set()
+        return self._server
+
+    async def serve_forever(self) -> None:
+        server = await self._listen()
+        async with server:
+            try:
+                await server.serve_forever()
+            except asyncio.CancelledError:
+                # stop() closed the server
+                pass
+
+    def start(self) -> "FakePostgresServer":
+        """Serve from a background thread, returns once the server is listening"""
+        self._thread = threading.Thread(target=asyncio.run, args=(self.serve_forever(),), daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop and self._server:
+            self._loop.call_soon_threadsafe(self._server.close)
+        if self._thread:
+            self._thread.join(timeout=5.0)
+
+    def __enter__(self) -> "FakePostgresServer":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            node = await self._startup(reader, writer)
+            if node:
+                await self._serve(node, reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _startup(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[FakeNode]:
+        while True:
+            length, code = struct.unpack("!II", await reader.readexactly(8))
+            payload = await reader.readexactly(length - 8)
+            if code in {SSL_REQUEST_CODE, GSSENC_REQUEST_CODE}:
+                writer.write(b"N")
+                continue
+            if code != PROTOCOL_VERSION_3:
+                return None
+            break
+        parts = payload.split(b"\0")
+        params = {parts[index].decode(): parts[index + 1].decode() for index in range(0, len(parts) - 1, 2) if parts[index]}
+        name = params.get("database") or params.get("user") or ""
+        node = self.cluster.nodes.get(name)
+        if not node:
+            writer.write(_error("3D000", f'database "{name}" does not exist', severity="FATAL"))
+            return None
+        await self._delay(node, node.connect_latency)
+        if node.down:
+            writer.write(_error("57P03", "the database system is shutting down", severity="FATAL"))
+            return None
+        writer.write(_message(b"R", struct.pack("!I", 0)))
+        major, minor = divmod(node.server_version, 10000)
+        for key, value in (
+            ("server_version", f"{major}.{minor}"),
+            ("server_encoding", "UTF8"),
+            ("client_encoding", "UTF8"),
+            ("DateStyle", "ISO, MDY"),
+            ("TimeZone", "UTC"),
+            ("integer_datetimes", "on"),
+            ("standard_conforming_strings", "on"),
+        ):
+            writer.write(_message(b"S", key.encode() + b"\0" + value.encode() + b"\0"))
+        writer.write(_message(b"K", struct.pack("!II", id(writer) & 0x7FFFFFFF, 0)))
+        writer.write(_message(b"Z", b"I"))
+        await writer.drain()
+        return node
+
+    async def _delay(self, node: FakeNode, seconds: float) -> None:
+        while node.hanging:
+            await asyncio.sleep(1.0)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    async def _serve(self, node: FakeNode, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session = FakeSession(self.cluster, node)
+        status = b"I"
+        while True:
+            kind = await reader.readexactly(1)
+            (length,) = struct.unpack("!I", await reader.readexactly(4))
+            payload = await reader.readexactly(length - 4)
+            if kind == b"X":
+                return
+            if kind != b"Q":
+                writer.write(_error("0A000", "fake server only supports the simple query protocol"))
+                writer.write(_message(b"Z", status))
+                await writer.drain()
+                continue
+            await self._delay(node, node.latency + node.jitter * self.cluster.rng.random())
+            if node.down:
+                # the node crashed, the client sees the connection go away
+                return
+            node.queries += 1
+            query = payload.rstrip(b"\0").decode()
+            try:
+                if self.cluster.rng.random() < node.error_rate:
+                    raise FakeQueryError("XX000", "simulated query failure")
+                tag, columns, rows = session.evaluate(query)
+                writer.write(_result(tag, columns, rows))
+                if tag == "BEGIN":
+                    status = b"T"
+                elif tag in {"COMMIT", "ROLLBACK"}:
+                    status = b"I"
+            except FakeQueryError as ex:
+                writer.write(_error(ex.code, str(ex)))
+                status = b"E" if status != b"I" else status
+            writer.write(_message(b"Z", status))
+            await writer.drain()
+
+
+def main(args: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m pglookout.simulation.fakepg",
+        description="Serve a cluster of fake PostgreSQL nodes for pglookout to monitor",
+    )
+    parser.add_argument("--nodes", type=int, default=3, help="number of nodes, node0 is the master")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=15432, help="port to listen on")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each query")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many seconds more are added to each query")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of queries that fail")
+    parser.add_argument("--wal-rate", type=float, default=DEFAULT_WAL_RATE, help="bytes of WAL generated per second")
+    arg = parser.parse_args(args)
+
+    cluster = FakeCluster.create(
+        arg.nodes, wal_rate=arg.wal_rate, latency=arg.latency, jitter=arg.jitter, error_rate=arg.error_rate
+    )
+    server = FakePostgresServer(cluster, host=arg.host, port=arg.port)
+    print(f"{get_iso_timestamp()} serving {arg.nodes} fake nodes, connect with: {server.dsn('node0')!r}", flush=True)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+pglookout - cluster monitor benchmark
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Runs monitoring rounds of a real ClusterMonitor against a cluster of fake
+PostgreSQL nodes served from a separate process, so that the server does not
+compete with the monitor for the interpreter, and reports probe throughput
+and round latency.
+"""
+from .. import logutil, statsd
+from ..cluster_monitor import ClusterMonitor
+from .fakepg import FakeCluster, FakePostgresServer, node_dsn
+from dataclasses import asdict, dataclass, field
+from queue import Queue
+from typing import Any, Dict, List, Optional, Sequence
+from unittest.mock import Mock
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import signal
+import statistics
+import sys
+import time
+
+
+@dataclass
+class MonitorBenchReport:
+    node_count: int
+    rounds: int
+    latency: float
+    # the first round also opens the connections to every node
+    connect_round_time: float = 0.0
+    round_times: List[float] = field(default_factory=list)
+    failed_probes: int = 0
+    probes_per_second: float = 0.0
+
+    @property
+    def median_round_time(self) -> Optional[float]:
+        return statistics.median(self.round_times) if self.round_times else None
+
+    @property
+    def max_round_time(self) -> Optional[float]:
+        return max(self.round_times) if self.round_times else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), median_round_time=self.median_round_time, max_round_time=self.max_round_time)
+
+
+def _serve(port_queue: "multiprocessing.Queue[int]", node_count: int, node_settings: Dict[str, Any]) -> None:
+    # a forked child inherits the handlers PgLookout installed in the parent, terminate() must stop it
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    server = FakePostgresServer(FakeCluster.create(node_count, **node_settings))
+
+    async def serve() -> None:
+        serving = asyncio.ensure_future(server.serve_forever())
+        while not server.port:
+            await asyncio.sleep(0.01)
+        port_queue.put(server.port)
+        await serving
+
+    asyncio.run(serve())
+
+
+def run_monitor_bench(
+    node_count: int,
+    rounds: int = 5,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    down_nodes: int = 0,
+) -> MonitorBenchReport:
+    """Monitor `node_count` fake nodes for `rounds` rounds after the connecting one and return a MonitorBenchReport"""
+    node_settings = {"latency": latency, "jitter": jitter, "error_rate": error_rate}
+    port_queue: "multiprocessing.Queue[int]" = multiprocessing.Queue()
+    server_process = multiprocessing.Process(target=_serve, args=(port_queue, node_count, node_settings), daemon=True)
+    server_process.start()
+    try:
+        port = port_queue.get(timeout=30.0)
+        dsns: Dict[str, str] = {}
+        for index in range(node_count):
+            # nothing listens on port 1, so the connections to the last `down_nodes` nodes are refused
+            node_port = 1 if index >= node_count - down_nodes else port
+            dsns[f"node{index}"] = node_dsn("127.0.0.1", node_port, f"node{index}")
+        cluster_state: Dict[str, Dict[str, Any]] = {}
+        monitor = ClusterMonitor(
+            config={"remote_conns": dsns, "observers": {}},
+            cluster_state=cluster_state,
+            observer_state={},
+            create_alert_file=Mock(),
+            cluster_monitor_check_queue=Queue(),
+            failover_decision_queue=Queue(),
+            is_replication_lag_over_warning_limit=lambda: False,
+            stats=statsd.StatsClient(host=None),
+        )
+        report = MonitorBenchReport(node_count=node_count, rounds=rounds, latency=latency)
+        start_time = time.monotonic()
+        monitor.main_monitoring_loop()
+        report.connect_round_time = time.monotonic() - start_time
+        for _ in range(rounds):
+            start_time = time.monotonic()
+            monitor.main_monitoring_loop()
+            report.round_times.append(time.monotonic() - start_time)
+            report.failed_probes += sum(1 for state in cluster_state.values() if not state.get("connection"))
+        if report.round_times:
+            report.probes_per_second = node_count * rounds / sum(report.round_times)
+        for conn in monitor.db_conns.values():
+            if conn:
+                conn.close()
+        return report
+    finally:
+        server_process.terminate()
+        server_process.join(timeout=5.0)
+        if server_process.is_alive():
+            server_process.kill()
+            server_process.join()
+
+
+def main(args: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m pglookout.simulation.monitor_bench",
+        description="Measure ClusterMonitor probe throughput and round latency against fake PostgreSQL nodes",
+    )
+    parser.add_argument("--nodes", type=int, nargs="+", default=[500], help="numbers of nodes to benchmark with")
+    parser.add_argument("--rounds", type=int, default=5, help="monitoring rounds after the connecting one")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each query")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many seconds more are added to each query")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of queries that fail")
+    parser.add_argument("--down", type=int, default=0, help="number of nodes that can't be connected to")
+    parser.add_argument("--json", action="store_true", help="print the reports as JSON lines")
+    parser.add_argument("--log-level", default="ERROR", help="log level of the cluster monitor")
+    arg = parser.parse_args(args)
+
+    logutil.configure_logging(level=arg.log_level)
+    for node_count in arg.nodes:
+        report = run_monitor_bench(
+            node_count,
+            rounds=arg.rounds,
+            latency=arg.latency,
+            jitter=arg.jitter,
+            error_rate=arg.error_rate,
+            down_nodes=arg.down,
+        )
+        if arg.json:
+            print(json.dumps(report.to_dict()))
+            continue
+        print(
+            f"nodes={report.node_count} rounds={report.rounds} latency={report.latency * 1000.0:.1f}ms "
+            f"connect_round={report.connect_round_time:.2f}s median_round={_format_time(report.median_round_time)} "
+            f"max_round={_format_time(report.max_round_time)} probes/s={report.probes_per_second:.0f} "
+            f"failed_probes={report.failed_probes}"
+        )
+    return 0
+
+
+def _format_time(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.3f}s"
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+pglookout - replay of recorded decision engine input
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Feeds a recording made with the `recording_file` setting through the decision
+engine of a PgLookout instance under a virtual clock, as fast as the decision
+engine runs, and compares the decisions it takes with the recorded ones.
+Nothing is executed: failover and follow commands, pg_promote() and alerts
+only go as far as the decision to use them.  Run it with
+`python -m pglookout.simulation.replay <recording> [config]`.
+"""
+from .. import common, pglookout as pglookout_module
+from ..common import parse_iso_datetime
+from ..recorder import read_recording, Record
+from .clock import VirtualClock
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import argparse
+import datetime
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+
+# settings whose effects must stay inside the replay
+NEUTRALIZED_SETTINGS = ("recording_file", "statsd", "syslog", "failover_trace_file")
+
+# number of the evaluation a decision was taken in, its action and details
+Decision = Tuple[int, str, Dict[str, Any]]
+
+
+class _RecordingExhausted(Exception):
+    pass
+
+
+@dataclass
+class ReplayReport:
+    recording: str
+    sessions: int = 0
+    evaluations: int = 0
+    recorded_decisions: int = 0
+    replayed_decisions: int = 0
+    divergences: List[Dict[str, Any]] = field(default_factory=list)
+    virtual_duration: float = 0.0
+    wall_time: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.divergences
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), ok=self.ok)
+
+
+class _DecisionCapture:
+    """Takes the place of the StateRecorder of the replayed PgLookout"""
+
+    path = None
+
+    def __init__(self, session: "_ReplaySession") -> None:
+        self.session = session
+
+    def record_config(self, config: Mapping[str, Any]) -> None:
+        pass
+
+    def record_state(self, cluster_state: Mapping[str, Any], observer_state: Mapping[str, Any], **kwargs: Any) -> None:
+        pass
+
+    def record_decision(self, action: str, **details: Any) -> None:
+        self.session.replayed.append((self.session.evaluation, action, details))
+
+    def close(self) -> None:
+        pass
+
+
+class _RecordedStateQueue:
+    """Stands in for the failover decision queue, waiting on it moves on to the next recorded state"""
+
+    def __init__(self, session: "_ReplaySession") -> None:
+        self.session = session
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> str:  # pylint: disable=unused-argument
+        self.session.next_state(evaluate=False)
+        return "Completed requested monitoring loop"
+
+    def put(self, item: object, block: bool = True, timeout: Optional[float] = None) -> None:
+        pass
+
+    def empty(self) -> bool:
+        return True
+
+
+class _ReplaySession:
+    """Replays the records following one header, that is a single run of pglookout"""
+
+    def __init__(
+        self, header: Record, records: Iterator[Record], work_dir: str, config_overrides: Mapping[str, Any]
+    ) -> None:
+        self.records = records
+        self.work_dir = work_dir
+        self.config_overrides = config_overrides
+        self.pgl: Optional[pglookout_module.PgLookout] = None
+        self.maintenance_mode = False
+        self.evaluation = 0
+        self.recorded: List[Decision] = []
+        self.replayed: List[Decision] = []
+        # make time.monotonic() agree with the monotonic timestamps in the recorded state
+        self.monotonic_base = header.get("monotonic", 0.0)
+        start = parse_iso_datetime(header["start"]).replace(tzinfo=None)
+        self.clock = VirtualClock(start=start - datetime.timedelta(seconds=self.monotonic_base))
+        self.clock.elapsed = self.monotonic_base
+
+    def run(self) -> None:
+        with self.clock.patch(pglookout_module, common):
+            try:
+                while True:
+                    self.next_state(evaluate=True)
+            except _RecordingExhausted:
+                pass
+            finally:
+                if self.pgl:
+                    self.pgl.quit()
+
+    def next_state(self, *, evaluate: bool) -> None:
+        """Process records up to and including the next state record"""
+        for record in self.records:
+            self.clock.elapsed = max(self.clock.elapsed, self.monotonic_base + record["t"])
+            if record["type"] == "config":
+                self.load_config(record["config"])
+            elif record["type"] == "decision":
+                details = {key: value for key, value in record.items() if key not in {"type", "t", "action"}}
+                self.recorded.append((self.evaluation, record["action"], details))
+            elif record["type"] == "state" and self.pgl:
+                self.apply_state(self.pgl, record)
+                if evaluate and not record.get("refresh"):
+                    self.evaluation += 1
+                    self.pgl.check_cluster_state()
+                return
+        raise _RecordingExhausted()
+
+    def apply_state(self, pgl: pglookout_module.PgLookout, record: Record) -> None:
+        self.maintenance_mode = record.get("maintenance_mode", self.maintenance_mode)
+        for key, state in (("cluster", pgl.cluster_state), ("observers", pgl.observer_state)):
+            state.update(record.get(key, {}))
+            for name in record.get(f"removed_{key}", []):
+                state.pop(name, None)
+
+    def load_config(self, recorded_config: Mapping[str, Any]) -> None:
+        config = dict(recorded_config, **self.config_overrides)
+        for key in NEUTRALIZED_SETTINGS:
+            config.pop(key, None)
+        config.update(
+            {
+                "alert_file_dir": self.work_dir,
+                "json_state_file_path": os.path.join(self.work_dir, "state.json"),
+                "external_command_mode": "blocking",
+                "log_level": self.config_overrides.get("log_level", "CRITICAL"),
+            }
+        )
+        config_path = os.path.join(self.work_dir, "pglookout.json")
+        with open(config_path, "w") as fp:
+            json.dump(config, fp)
+        if self.pgl:
+            self.pgl.load_config()
+            return
+        self.pgl = pgl = pglookout_module.PgLookout(config_path)
+        pgl.recorder = _DecisionCapture(self)
+        pgl.failover_decision_queue = _RecordedStateQueue(self)  # type: ignore[assignment]
+        pgl.check_for_maintenance_mode_file = lambda: self.maintenance_mode  # type: ignore[method-assign]
+        pgl.execute_external_command = lambda command, kind="external": 0  # type: ignore[method-assign]
+        pgl.start_following_new_master = lambda new_master_instance: None  # type: ignore[method-assign]
+        pgl.promote_with_pg_promote = lambda: True  # type: ignore[method-assign]
+
+
+def _group(decisions: List[Decision]) -> Dict[int, List[Dict[str, Any]]]:
+    grouped: Dict[int, List[Dict[str, Any]]] = {}
+    for evaluation, action, details in decisions:
+        grouped.setdefault(evaluation, []).append({"action": action, **details})
+    return grouped
+
+
+class Replay:
+    def __init__(self, path: str, config_overrides: Optional[Mapping[str, Any]] = None) -> None:
+        self.path = path
+        self.config_overrides = config_overrides or {}
+
+    def _sessions(self) -> Iterator[Tuple[Record, List[Record]]]:
+        header: Optional[Record] = None
+        records: List[Record] = []
+        for record in read_recording(self.path):
+            if record["type"] == "header":
+                if header is not None:
+                    yield header, records
+                header, records = record, []
+            elif header is not None:
+                records.append(record)
+        if header is not None:
+            yield header, records
+
+    def run(self) -> ReplayReport:
+        """Replay the whole recording and return a ReplayReport"""
+        start_time = time.monotonic()
+        report = ReplayReport(recording=self.path)
+        # PgLookout installs its own handlers, don't leave them behind
+        previous_handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGHUP, signal.SIGINT, signal.SIGTERM)}
+        try:
+            for header, records in self._sessions():
+                with tempfile.TemporaryDirectory() as work_dir:
+                    session = _ReplaySession(header, iter(records), work_dir, self.config_overrides)
+                    session.run()
+                report.sessions += 1
+                report.evaluations += session.evaluation
+                report.recorded_decisions += len(session.recorded)
+                report.replayed_decisions += len(session.replayed)
+                report.virtual_duration += session.clock.elapsed - session.monotonic_base
+                recorded, replayed = _group(session.recorded), _group(session.replayed)
+                for evaluation in sorted(set(recorded) | set(replayed)):
+                    if recorded.get(evaluation) != replayed.get(evaluation):
+                        report.divergences.append(
+                            {
+                                "session": report.sessions,
+                                "evaluation": evaluation,
+                                "recorded": recorded.get(evaluation, []),
+                                "replayed": replayed.get(evaluation, []),
+                            }
+                        )
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+        report.wall_time = time.monotonic() - start_time
+        return report
+
+
+def main(args: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m pglookout.simulation.replay",
+        description="Replay a recording made with recording_file through the decision engine and report divergent decisions",
+    )
+    parser.add_argument("recording", help="recording file")
+    parser.add_argument("config", nargs="?", help="configuration file whose settings override the recorded ones")
+    arg = parser.parse_args(args)
+
+    config_overrides: Dict[str, Any] = {}
+    if arg.config:
+        with open(arg.config) as fp:
+            config_overrides = json.load(fp)
+    report = Replay(arg.recording, config_overrides).run()
+    print(
+        f"Replayed {report.evaluations} evaluations over {report.virtual_duration:.1f}s of recorded time "
+        f"in {report.wall_time:.2f}s: {report.recorded_decisions} recorded and {report.replayed_decisions} "
+        f"replayed decisions, {len(report.divergences)} divergences"
+    )
+    for divergence in report.divergences:
+        print(json.dumps(divergence, sort_keys=True, default=str))
+    return 0 if report.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
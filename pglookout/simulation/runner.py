@@ -0,0 +1,179 @@
+"""
+pglookout - simulation runner
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Drives the decision engine of a real PgLookout instance through a scenario
+under a virtual clock.  The simulated cluster takes the place of the cluster
+monitor thread and the failover command, so no PostgreSQL, observers or
+network access is needed and every run of a scenario makes the same decisions.
+"""
+from .. import common, pglookout as pglookout_module, recorder
+from ..command_runner import Command, FAILOVER
+from .clock import VirtualClock
+from .cluster import NodeState, SimulatedCluster
+from .scenarios import Scenario
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+import json
+import os
+import signal
+import statistics
+import tempfile
+import time
+
+
+@dataclass
+class SimulationReport:
+    scenario: str
+    node_count: int
+    observer_count: int
+    virtual_duration: float
+    evaluations: int = 0
+    failover_decisions: int = 0
+    promotions: List[Dict[str, Any]] = field(default_factory=list)
+    # virtual seconds from the first scripted event to the first promotion
+    decision_latency: Optional[float] = None
+    cpu_per_evaluation_ms: float = 0.0
+    max_cpu_per_evaluation_ms: float = 0.0
+    cpu_per_decision_ms: Optional[float] = None
+    wall_time: float = 0.0
+    expect_promotion: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.promotions) == self.expect_promotion
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), ok=self.ok)
+
+
+class _MonitoringRoundQueue:
+    """Stands in for the failover decision queue, waiting on it lets the simulated cluster monitor do a round"""
+
+    def __init__(self, simulation: "Simulation") -> None:
+        self.simulation = simulation
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> str:  # pylint: disable=unused-argument
+        poll_interval = self.simulation.scenario.poll_interval
+        self.simulation.clock.advance(min(timeout or poll_interval, poll_interval))
+        # the monitor runs in its own thread, its work is not part of the evaluation that waits for it
+        start_cpu = time.process_time()
+        self.simulation.monitoring_round()
+        self.simulation.nested_round_cpu += time.process_time() - start_cpu
+        return "Completed requested monitoring loop"
+
+    def put(self, item: object, block: bool = True, timeout: Optional[float] = None) -> None:
+        pass
+
+    def empty(self) -> bool:
+        return True
+
+
+class Simulation:
+    def __init__(self, scenario: Scenario) -> None:
+        self.scenario = scenario
+        self.clock = VirtualClock()
+        self.cluster = SimulatedCluster.create(
+            self.clock,
+            node_count=scenario.node_count,
+            observer_count=scenario.observer_count,
+            replay_delays=scenario.replay_delays,
+        )
+        self.events = sorted(scenario.events, key=lambda event: event.at)
+        self.report = SimulationReport(
+            scenario=scenario.name,
+            node_count=scenario.node_count,
+            observer_count=scenario.observer_count,
+            virtual_duration=scenario.duration,
+            expect_promotion=scenario.expect_promotion,
+        )
+        self.pgl: Optional[pglookout_module.PgLookout] = None
+        self.nested_round_cpu = 0.0
+        self._decision_cpu: List[float] = []
+
+    def create_config(self, work_dir: str) -> Dict[str, Any]:
+        config = {
+            "remote_conns": {name: f"host={name}" for name in self.cluster.nodes},
+            "observers": {name: f"http://{name}" for name in self.cluster.observers},
+            "own_db": self.scenario.own_db,
+            "db_poll_interval": self.scenario.poll_interval,
+            "replication_state_check_interval": self.scenario.poll_interval,
+            "failover_command": "simulated_failover",
+            "alert_file_dir": work_dir,
+            "maintenance_mode_file": os.path.join(work_dir, "maintenance_mode_file"),
+            "json_state_file_path": os.path.join(work_dir, "state.json"),
+            "log_level": "CRITICAL",
+        }
+        config.update(self.scenario.config)
+        return config
+
+    def monitoring_round(self) -> None:
+        while self.events and self.events[0].at <= self.clock.monotonic():
+            self.cluster.apply(self.events.pop(0))
+        assert self.pgl is not None
+        self.cluster.monitoring_round(self.pgl.cluster_state, self.pgl.observer_state)
+
+    def execute_external_command(self, command: Command, kind: str = "external") -> int:  # pylint: disable=unused-argument
+        if kind == FAILOVER:
+            self.cluster.promote(self.scenario.own_db)
+            self.report.promotions.append({"at": self.clock.monotonic(), "node": self.scenario.own_db})
+        return 0
+
+    def do_failover_decision(self, standby_nodes: Dict[str, NodeState]) -> None:
+        assert self.pgl is not None
+        start_cpu = time.process_time()
+        try:
+            pglookout_module.PgLookout.do_failover_decision(self.pgl, standby_nodes)
+        finally:
+            self._decision_cpu.append(time.process_time() - start_cpu)
+
+    def run(self) -> SimulationReport:
+        """Run the scenario to the end and return a SimulationReport"""
+        start_time = time.monotonic()
+        # PgLookout installs its own handlers, don't leave them behind
+        previous_handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGHUP, signal.SIGINT, signal.SIGTERM)}
+        try:
+            with tempfile.TemporaryDirectory() as work_dir, self.clock.patch(pglookout_module, common, recorder):
+                config_path = os.path.join(work_dir, "pglookout.json")
+                with open(config_path, "w") as fp:
+                    json.dump(self.create_config(work_dir), fp)
+                self.pgl = pgl = pglookout_module.PgLookout(config_path)
+                pgl.failover_decision_queue = _MonitoringRoundQueue(self)  # type: ignore[assignment]
+                pgl.execute_external_command = self.execute_external_command  # type: ignore[method-assign]
+                pgl.do_failover_decision = self.do_failover_decision  # type: ignore[method-assign]
+                try:
+                    self._run_rounds(pgl)
+                finally:
+                    pgl.quit()
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+        self.report.wall_time = time.monotonic() - start_time
+        return self.report
+
+    def _run_rounds(self, pgl: pglookout_module.PgLookout) -> None:
+        evaluation_cpu: List[float] = []
+        while self.clock.monotonic() < self.scenario.duration:
+            self.monitoring_round()
+            self.nested_round_cpu = 0.0
+            start_cpu = time.process_time()
+            pgl.check_cluster_state()
+            evaluation_cpu.append(time.process_time() - start_cpu - self.nested_round_cpu)
+            # nothing serves the state check requests made by the decision engine
+            while not pgl.cluster_monitor_check_queue.empty():
+                pgl.cluster_monitor_check_queue.get_nowait()
+            self.clock.advance(self.scenario.poll_interval)
+
+        self.report.evaluations = len(evaluation_cpu)
+        self.report.failover_decisions = len(self._decision_cpu)
+        if evaluation_cpu:
+            self.report.cpu_per_evaluation_ms = statistics.mean(evaluation_cpu) * 1000.0
+            self.report.max_cpu_per_evaluation_ms = max(evaluation_cpu) * 1000.0
+        if self._decision_cpu:
+            self.report.cpu_per_decision_ms = statistics.mean(self._decision_cpu) * 1000.0
+        if self.report.promotions and self.scenario.events:
+            first_event = min(event.at for event in self.scenario.events)
+            self.report.decision_latency = self.report.promotions[0]["at"] - first_event
@@ -0,0 +1,121 @@
+"""
+pglookout - simulation scenarios
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from .cluster import ScriptedEvent
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+DEFAULT_POLL_INTERVAL = 5.0
+
+
+@dataclass
+class Scenario:
+    """A cluster, the pglookout node being simulated and a script of what happens to the cluster.
+
+    The simulated pglookout runs on `own_db`, node1 by default, which replays WAL without delay so it
+    is the node that should be promoted when the master node0 is lost."""
+
+    name: str
+    node_count: int
+    observer_count: int
+    duration: float
+    events: List[ScriptedEvent] = field(default_factory=list)
+    own_db: str = "node1"
+    poll_interval: float = DEFAULT_POLL_INTERVAL
+    replay_delays: List[float] = field(default_factory=list)
+    config: Dict[str, Any] = field(default_factory=dict)
+    expect_promotion: bool = False
+
+    def __post_init__(self) -> None:
+        if not self.replay_delays:
+            # the master and our own node are in sync, other standbys trail behind
+            self.replay_delays = [0.0, 0.0] + [0.5 + 0.1 * index for index in range(self.node_count - 2)]
+
+
+def master_failure(node_count: int = 3, observer_count: int = 1, name: str = "master_failure") -> Scenario:
+    return Scenario(
+        name=name,
+        node_count=node_count,
+        observer_count=observer_count,
+        duration=300.0,
+        events=[ScriptedEvent(at=60.0, action="kill", nodes=("node0",))],
+        expect_promotion=True,
+    )
+
+
+def partition_from_master() -> Scenario:
+    """We lose our connection to the master, but the observers can still reach it"""
+    return Scenario(
+        name="partition_from_master",
+        node_count=3,
+        observer_count=2,
+        duration=300.0,
+        events=[ScriptedEvent(at=60.0, action="partition", nodes=("node0",))],
+    )
+
+
+def full_partition() -> Scenario:
+    """Neither we nor the observers can reach the master, which is still running"""
+    return Scenario(
+        name="full_partition",
+        node_count=3,
+        observer_count=2,
+        duration=300.0,
+        events=[ScriptedEvent(at=60.0, action="partition", nodes=("node0",), viewers=(None, "observer0", "observer1"))],
+        expect_promotion=True,
+    )
+
+
+def minority_partition() -> Scenario:
+    """We're cut off from the master and from the other nodes and observers, we must not promote ourselves"""
+    return Scenario(
+        name="minority_partition",
+        node_count=3,
+        observer_count=2,
+        duration=300.0,
+        events=[
+            ScriptedEvent(at=60.0, action="partition", nodes=("node0", "node2", "observer0", "observer1")),
+        ],
+    )
+
+
+def lag_spike() -> Scenario:
+    """Our own replication falls far behind while the master is up"""
+    return Scenario(
+        name="lag_spike",
+        node_count=3,
+        observer_count=1,
+        duration=400.0,
+        events=[
+            ScriptedEvent(at=60.0, action="replay_delay", nodes=("node1",), value=200.0),
+            ScriptedEvent(at=300.0, action="replay_delay", nodes=("node1",), value=0.0),
+        ],
+    )
+
+
+def flapping_master(period: float = 30.0) -> Scenario:
+    """The master keeps going away and coming back before the failover timeout passes"""
+    events = []
+    for index in range(8):
+        at = 60.0 + index * 2 * period
+        events.append(ScriptedEvent(at=at, action="kill", nodes=("node0",)))
+        events.append(ScriptedEvent(at=at + period, action="revive", nodes=("node0",)))
+    return Scenario(name="flapping_master", node_count=3, observer_count=1, duration=600.0, events=events)
+
+
+SCENARIOS: Dict[str, Callable[[], Scenario]] = {
+    "master_failure": master_failure,
+    "partition_from_master": partition_from_master,
+    "full_partition": full_partition,
+    "minority_partition": minority_partition,
+    "lag_spike": lag_spike,
+    "flapping_master": flapping_master,
+    "scale_10x10": lambda: master_failure(10, 10, name="scale_10x10"),
+    "scale_50x50": lambda: master_failure(50, 50, name="scale_50x50"),
+    "scale_100x100": lambda: master_failure(100, 100, name="scale_100x100"),
+    "scale_200x200": lambda: master_failure(200, 200, name="scale_200x200"),
+    "scale_300x300": lambda: master_failure(300, 300, name="scale_300x300"),
+}
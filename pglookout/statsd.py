@@ -8,29 +8,72 @@ See LICENSE for details
 Supports telegraf's statsd protocol extension for 'key=value' tags:
 
     https://github.com/influxdata/telegraf/tree/master/plugins/inputs/statsd
+
+In buffered mode metrics are packed into newline separated datagrams of at most
+`max_packet_size` bytes which are sent when full or every `flush_interval`
+seconds from a background thread.
 """
+from typing import Any, List, Mapping, Optional, Tuple, Union
 
 import logging
 import socket
+import threading
+
+# Fits in a single IPv4 UDP packet on a standard 1500 byte MTU link
+DEFAULT_MAX_PACKET_SIZE = 1432
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+def _encode_tags(tags: Mapping[str, Any]) -> bytes:
+    return b"".join(f",{tag}={tag_value}".encode("utf-8") for tag, tag_value in tags.items())
 
 
 class StatsClient:
-    def __init__(self, host="127.0.0.1", port=8125, tags=None):
+    def __init__(
+        self,
+        host: Optional[str] = "127.0.0.1",
+        port: Optional[int] = 8125,
+        tags: Optional[Mapping[str, Any]] = None,
+        *,
+        buffered: bool = False,
+        max_packet_size: int = DEFAULT_MAX_PACKET_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        socket_path: Optional[str] = None,
+    ) -> None:
         self.log = logging.getLogger("StatsClient")
-        self._dest_addr = (host, port)
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self._tags = tags or {}
+        self._dest_addr: Union[str, Tuple[Optional[str], Optional[int]]]
+        if socket_path:
+            self._dest_addr = socket_path
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._enabled = True
+        else:
+            self._dest_addr = (host, port)
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._enabled = None not in self._dest_addr
+        self._tags = dict(tags or {})
+        # the global tags never change so they're encoded only once
+        self._tags_suffix = _encode_tags(self._tags)
+        self._max_packet_size = max_packet_size
+        self._flush_interval = flush_interval
+        self._buffer: List[bytes] = []
+        self._buffer_size = 0
+        self._buffer_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        if buffered and self._enabled:
+            self._flush_thread = threading.Thread(target=self._flush_loop, name="StatsClientFlush", daemon=True)
+            self._flush_thread.start()
 
-    def gauge(self, metric, value, tags=None):
+    def gauge(self, metric: str, value: Any, tags: Optional[Mapping[str, Any]] = None) -> None:
         self._send(metric, b"g", value, tags)
 
-    def increase(self, metric, inc_value=1, tags=None):
+    def increase(self, metric: str, inc_value: int = 1, tags: Optional[Mapping[str, Any]] = None) -> None:
         self._send(metric, b"c", inc_value, tags)
 
-    def timing(self, metric, value, tags=None):
+    def timing(self, metric: str, value: Any, tags: Optional[Mapping[str, Any]] = None) -> None:
         self._send(metric, b"ms", value, tags)
 
-    def unexpected_exception(self, ex, where, tags=None):
+    def unexpected_exception(self, ex: BaseException, where: str, tags: Optional[Mapping[str, Any]] = None) -> None:
         all_tags = {
             "exception": ex.__class__.__name__,
             "where": where,
@@ -38,25 +81,67 @@ class StatsClient:
         all_tags.update(tags or {})
         self.increase("exception", tags=all_tags)
 
-    def _send(self, metric, metric_type, value, tags):
-        if None in self._dest_addr:
+    def flush(self) -> None:
+        with self._buffer_lock:
+            packet = b"\n".join(self._buffer)
+            self._buffer = []
+            self._buffer_size = 0
+        if packet:
+            self._send_packet(packet)
+
+    def close(self) -> None:
+        """Stop the background flusher, send out anything still buffered and close the socket"""
+        self._closed.set()
+        self._enabled = False
+        if self._flush_thread:
+            self._flush_thread.join()
+            self._flush_thread = None
+        self.flush()
+        self._socket.close()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self._flush_interval):
+            self.flush()
+
+    def _send_packet(self, packet: bytes) -> None:
+        try:
+            self._socket.sendto(packet, self._dest_addr)
+        except Exception as ex:  # pylint: disable=broad-except
+            self.log.error("Unexpected exception in statsd send: %s: %s", ex.__class__.__name__, ex)
+
+    def _encode(self, metric: str, metric_type: bytes, value: Any, tags: Optional[Mapping[str, Any]]) -> bytes:
+        # format: "user.logins,service=payroll,region=us-west:1|c"
+        if not tags:
+            tags_suffix = self._tags_suffix
+        elif self._tags.keys() & tags.keys():
+            # per-metric tags override global ones with the same name
+            tags_suffix = _encode_tags({**self._tags, **tags})
+        else:
+            tags_suffix = self._tags_suffix + _encode_tags(tags)
+        return b"".join((metric.encode("utf-8"), tags_suffix, b":", str(value).encode("utf-8"), b"|", metric_type))
+
+    def _send(self, metric: str, metric_type: bytes, value: Any, tags: Optional[Mapping[str, Any]]) -> None:
+        if not self._enabled:
             # stats sending is disabled
             return
 
         try:
-            # format: "user.logins,service=payroll,region=us-west:1|c"
-            parts = [
-                metric.encode("utf-8"),
-                b":",
-                str(value).encode("utf-8"),
-                b"|",
-                metric_type,
-            ]
-            send_tags = self._tags.copy()
-            send_tags.update(tags or {})
-            for tag, tag_value in send_tags.items():
-                parts.insert(1, f",{tag}={tag_value}".encode("utf-8"))
-
-            self._socket.sendto(b"".join(parts), self._dest_addr)
+            line = self._encode(metric, metric_type, value, tags)
         except Exception as ex:  # pylint: disable=broad-except
             self.log.error("Unexpected exception in statsd send: %s: %s", ex.__class__.__name__, ex)
+            return
+
+        if self._flush_thread is None:
+            self._send_packet(line)
+            return
+
+        with self._buffer_lock:
+            full_packet = None
+            if self._buffer and self._buffer_size + 1 + len(line) > self._max_packet_size:
+                full_packet = b"\n".join(self._buffer)
+                self._buffer = []
+                self._buffer_size = 0
+            self._buffer.append(line)
+            self._buffer_size += len(line) + (1 if len(self._buffer) > 1 else 0)
+        if full_packet:
+            self._send_packet(full_packet)
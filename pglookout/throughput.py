@@ -0,0 +1,183 @@
+"""
+pglookout - WAL throughput estimation
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+Derives WAL generation, receive and replay rates from successive LSN samples
+and uses them to estimate how far behind each standby is and how long it will
+take for it to catch up with the primary.  The primary's WAL position is also
+remembered along with its clock, which bounds the time lag of a standby by the
+time the primary was at the position the standby has replayed.
+"""
+from .common import convert_xlog_location_to_offset, parse_iso_datetime
+from collections import deque
+from typing import Any, Deque, Dict, MutableMapping, Optional, Set, Tuple
+
+import datetime
+import math
+
+DEFAULT_WAL_RATE_WINDOW = 60.0
+
+THROUGHPUT_FIELDS = (
+    "wal_generation_rate",
+    "wal_receive_rate",
+    "wal_replay_rate",
+    "replication_byte_lag",
+    "estimated_catchup_seconds",
+    "replication_position_lag",
+)
+
+
+def _time(value: Optional[str]) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    try:
+        return parse_iso_datetime(value)
+    except ValueError:
+        return None
+
+
+def _offset(lsn: Optional[str]) -> Optional[int]:
+    if not lsn:
+        return None
+    try:
+        return convert_xlog_location_to_offset(lsn)
+    except ValueError:
+        return None
+
+
+class RateEstimator:
+    """Rolling rate of change of a monotonically increasing counter over a time window"""
+
+    def __init__(self, window: float = DEFAULT_WAL_RATE_WINDOW) -> None:
+        self.window = window
+        self._samples: Deque[Tuple[float, int]] = deque()
+
+    def add(self, timestamp: float, value: int) -> None:
+        if self._samples and (value < self._samples[-1][1] or timestamp <= self._samples[-1][0]):
+            if value < self._samples[-1][1]:
+                # position went backwards, e.g. we're now looking at a different timeline
+                self._samples.clear()
+            else:
+                return
+        self._samples.append((timestamp, value))
+        # always keep at least two samples so a rate can be computed with long poll intervals
+        while len(self._samples) > 2 and timestamp - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+    def rate(self) -> Optional[float]:
+        """Bytes per second over the window, None until there are two samples"""
+        if len(self._samples) < 2:
+            return None
+        (first_time, first_value), (last_time, last_value) = self._samples[0], self._samples[-1]
+        return (last_value - first_value) / (last_time - first_time)
+
+
+class ReplicationThroughput:
+    """Tracks WAL rates for all cluster members and annotates their cluster_state entries"""
+
+    def __init__(self, window: float = DEFAULT_WAL_RATE_WINDOW) -> None:
+        self.window = window
+        self._estimators: Dict[Tuple[str, str], RateEstimator] = {}
+        # WAL positions of the primary over the window along with its clock at the time
+        self._master: Optional[str] = None
+        self._master_positions: Deque[Tuple[int, datetime.datetime]] = deque()
+
+    def _add_master_position(self, master: str, offset: Optional[int], db_time: Optional[datetime.datetime]) -> None:
+        if master != self._master or (
+            self._master_positions and offset is not None and offset < self._master_positions[-1][0]
+        ):
+            self._master_positions.clear()
+            self._master = master
+        if offset is None or db_time is None:
+            return
+        self._master_positions.append((offset, db_time))
+        while db_time - self._master_positions[0][1] > datetime.timedelta(seconds=self.window):
+            self._master_positions.popleft()
+
+    def _position_lag(self, replay_offset: Optional[int], db_time: Optional[datetime.datetime]) -> Optional[float]:
+        """Seconds since the primary was at the position a standby has replayed, None if not known"""
+        if replay_offset is None or db_time is None:
+            return None
+        replayed_at = None
+        for offset, master_time in self._master_positions:
+            if offset > replay_offset:
+                break
+            replayed_at = master_time
+        if replayed_at is None:
+            return None
+        return max((db_time - replayed_at).total_seconds(), 0.0)
+
+    def _add(self, instance: str, kind: str, timestamp: float, lsn: Optional[str]) -> Optional[float]:
+        key = (instance, kind)
+        estimator = self._estimators.get(key)
+        if estimator is None:
+            estimator = self._estimators[key] = RateEstimator(self.window)
+        offset = _offset(lsn)
+        if offset is not None:
+            estimator.add(timestamp, offset)
+        return estimator.rate()
+
+    def update(self, cluster_state: MutableMapping[str, Dict[str, Any]], now: float) -> None:
+        """Add the latest positions from `cluster_state` and store the derived values back into it"""
+        # nodes we don't get a position from this round, or which changed role, must not keep reporting the
+        # values derived from an earlier round
+        for state in cluster_state.values():
+            for field in THROUGHPUT_FIELDS:
+                state.pop(field, None)
+
+        masters = [
+            instance
+            for instance, state in cluster_state.items()
+            if state.get("connection") and state.get("pg_is_in_recovery") is False
+        ]
+        sampled: Set[Tuple[str, str]] = set()
+        master_rate, master_offset = None, None
+        if len(masters) == 1:
+            master_state = cluster_state[masters[0]]
+            # on the primary pg_last_xlog_replay_location holds the current WAL insert position
+            master_rate = self._add(masters[0], "generation", now, master_state.get("pg_last_xlog_replay_location"))
+            master_offset = _offset(master_state.get("pg_last_xlog_replay_location"))
+            master_state["wal_generation_rate"] = master_rate
+            sampled.add((masters[0], "generation"))
+            self._add_master_position(masters[0], master_offset, _time(master_state.get("db_time")))
+
+        for instance, state in cluster_state.items():
+            if not state.get("connection") or not state.get("pg_is_in_recovery"):
+                continue
+            receive_rate = self._add(instance, "receive", now, state.get("pg_last_xlog_receive_location"))
+            replay_rate = self._add(instance, "replay", now, state.get("pg_last_xlog_replay_location"))
+            sampled.update({(instance, "receive"), (instance, "replay")})
+            replay_offset = _offset(state.get("pg_last_xlog_replay_location"))
+            byte_lag = None
+            if master_offset is not None and replay_offset is not None:
+                byte_lag = max(master_offset - replay_offset, 0)
+            state.update(
+                {
+                    "wal_receive_rate": receive_rate,
+                    "wal_replay_rate": replay_rate,
+                    "replication_byte_lag": byte_lag,
+                    "estimated_catchup_seconds": estimate_catchup_seconds(byte_lag, replay_rate, master_rate),
+                    "replication_position_lag": self._position_lag(replay_offset, _time(state.get("db_time"))),
+                }
+            )
+
+        # samples from before a gap would average the rate over the time the node was unreachable or in another role
+        for key in set(self._estimators) - sampled:
+            del self._estimators[key]
+
+
+def estimate_catchup_seconds(
+    byte_lag: Optional[int], replay_rate: Optional[float], generation_rate: Optional[float]
+) -> Optional[float]:
+    """Time for a standby to close `byte_lag`, None if unknown and infinite if it's not gaining on the primary"""
+    if byte_lag is None:
+        return None
+    if byte_lag == 0:
+        return 0.0
+    if replay_rate is None or generation_rate is None:
+        return None
+    if replay_rate <= generation_rate:
+        return math.inf
+    return byte_lag / (replay_rate - generation_rate)
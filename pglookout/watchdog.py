@@ -0,0 +1,151 @@
+"""
+pglookout - loop lag watchdog
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+
+The main loop, the cluster monitor and the web server report how long their
+iterations take, how long they were blocked waiting for work and how much
+later than requested they woke up.  The values are kept in fixed bucket
+histograms and sent to statsd as timings tagged with the loop.  The watchdog
+thread measures its own wake up lag, which grows with GIL contention, and
+warns about loops that haven't reported for longer than expected, so a
+blocked thread is noticed before it delays a failover.
+"""
+from .statsd import StatsClient
+from threading import Event, Lock, Thread
+from typing import Any, Dict, Optional, Sequence, Set
+
+import bisect
+import logging
+import time
+
+DEFAULT_WATCHDOG_INTERVAL = 1.0
+DEFAULT_LOOP_STALL_SECONDS = 10.0
+# upper bounds of the histogram buckets in milliseconds, larger values are counted in an overflow bucket
+HISTOGRAM_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Distribution of millisecond values in fixed buckets, memory use doesn't grow with the number of values"""
+
+    def __init__(self, buckets: Sequence[float] = HISTOGRAM_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Upper bound of the bucket holding the value at `fraction` of the distribution, None without values"""
+        if not self.count:
+            return None
+        remaining = fraction * self.count
+        for bound, count in zip(self.buckets, self.counts):
+            remaining -= count
+            if remaining <= 0:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> Dict[str, Any]:
+        buckets = {str(bound): count for bound, count in zip(self.buckets, self.counts)}
+        buckets["+Inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "max": round(self.max, 3),
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "buckets": buckets,
+        }
+
+
+class LoopWatchdog(Thread):
+    def __init__(
+        self,
+        stats: StatsClient,
+        interval: float = DEFAULT_WATCHDOG_INTERVAL,
+        stall_seconds: float = DEFAULT_LOOP_STALL_SECONDS,
+    ) -> None:
+        Thread.__init__(self, name="Watchdog", daemon=True)
+        self.log = logging.getLogger("LoopWatchdog")
+        self.stats = stats
+        self.interval = interval
+        self.stall_seconds = stall_seconds
+        self.running = True
+        self._wakeup = Event()
+        self._lock = Lock()
+        self._histograms: Dict[str, Dict[str, Histogram]] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._expected_intervals: Dict[str, float] = {}
+        self._stalled: Set[str] = set()
+
+    def record(self, loop: str, measurement: str, seconds: float) -> None:
+        """Add a `measurement` ("lag", "duration" or "blocked") of `loop`"""
+        value = round(seconds * 1000.0, 3)
+        with self._lock:
+            self._histograms.setdefault(loop, {}).setdefault(measurement, Histogram()).add(value)
+        self.stats.timing(f"loop_{measurement}", value, tags={"loop": loop})
+
+    def heartbeat(self, loop: str, expected_interval: Optional[float] = None) -> None:
+        """Note that `loop` is making progress and will next report within `expected_interval` seconds"""
+        with self._lock:
+            self._last_seen[loop] = time.monotonic()
+            if expected_interval is not None:
+                self._expected_intervals[loop] = expected_interval
+
+    def iteration(self, loop: str, seconds: float) -> None:
+        """`loop` did `seconds` worth of work"""
+        self.record(loop, "duration", seconds)
+        self.heartbeat(loop)
+
+    def waited(self, loop: str, seconds: float, timeout: float) -> None:
+        """`loop` was blocked for `seconds` waiting for work for at most `timeout` seconds"""
+        self.record(loop, "blocked", seconds)
+        self.record(loop, "lag", max(seconds - timeout, 0.0))
+        self.heartbeat(loop, expected_interval=timeout)
+
+    def check_stalls(self, now: float) -> Set[str]:
+        """Warn about the loops that haven't reported in time, returns their names"""
+        with self._lock:
+            ages = {loop: now - last_seen for loop, last_seen in self._last_seen.items()}
+            limits = {loop: self._expected_intervals.get(loop, 0.0) + self.stall_seconds for loop in ages}
+        stalled = {loop for loop, age in ages.items() if age > limits[loop]}
+        for loop in stalled - self._stalled:
+            self.log.warning("Loop %r has not made progress for %.1f seconds", loop, ages[loop])
+            self.stats.increase("loop_stall", tags={"loop": loop})
+        for loop in self._stalled - stalled:
+            self.log.info("Loop %r is making progress again", loop)
+        self._stalled = stalled
+        return stalled
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            result: Dict[str, Dict[str, Any]] = {
+                loop: {measurement: histogram.as_dict() for measurement, histogram in histograms.items()}
+                for loop, histograms in self._histograms.items()
+            }
+            for loop, last_seen in self._last_seen.items():
+                result.setdefault(loop, {})["seconds_since_progress"] = round(now - last_seen, 3)
+                result[loop]["stalled"] = loop in self._stalled
+        return result
+
+    def run(self) -> None:
+        while self.running:
+            start_time = time.monotonic()
+            if self._wakeup.wait(self.interval):
+                break
+            now = time.monotonic()
+            self.record("watchdog", "lag", max(now - start_time - self.interval, 0.0))
+            self.check_stalls(now)
+
+    def stop(self) -> None:
+        self.running = False
+        self._wakeup.set()
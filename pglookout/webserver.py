@@ -7,28 +7,92 @@ Copyright (c) 2014 F-Secure
 This file is under the Apache License, Version 2.0.
 See the file `LICENSE` for details.
 """
+from .history import DEFAULT_HISTORY_MAX_POINTS
+from .memory import DEFAULT_TOP_ALLOCATIONS
+from .profiler import DEFAULT_SAMPLE_INTERVAL, dump_stacks, MAX_PROFILE_SECONDS, sample_stacks
+from .schedule import round_schedule_headers
 from http.server import HTTPServer, SimpleHTTPRequestHandler
 from logging import getLogger
 from socketserver import ThreadingMixIn
 from threading import Thread
+from urllib.parse import parse_qs, unquote, urlsplit
 
 import json
 import threading
+import time
+
+# seconds serve_forever() waits for a request before calling service_actions()
+POLL_INTERVAL = 0.5
+
+
+def project_state(state, instances=None, fields=None):
+    """The entries of `instances` in `state` with only `fields` in them, None for all of them"""
+    if instances is not None:
+        state = {instance: state[instance] for instance in instances if instance in state}
+    if fields is not None:
+        state = {instance: {field: entry[field] for field in fields if field in entry} for instance, entry in state.items()}
+    return state
 
 
 class ThreadedWebServer(ThreadingMixIn, HTTPServer):
     cluster_state = None
     log = None
     cluster_monitor_check_queue = None
+    history = None
+    get_failover_plan = None
+    failover_tracer = None
+    cluster_states = None
+    observer_state = None
+    get_memory_usage = None
+    watchdog = None
+    get_round_schedule = None
     allow_reuse_address = True
+    _last_poll_time = None
+
+    def service_actions(self):
+        super().service_actions()
+        now = time.monotonic()
+        if self.watchdog is not None and self._last_poll_time is not None:
+            self.watchdog.record("webserver", "lag", max(now - self._last_poll_time - POLL_INTERVAL, 0.0))
+            self.watchdog.heartbeat("webserver", expected_interval=POLL_INTERVAL)
+        self._last_poll_time = now
+
+    def finish_request(self, request, client_address):
+        start_time = time.monotonic()
+        try:
+            super().finish_request(request, client_address)
+        finally:
+            if self.watchdog is not None:
+                self.watchdog.record("webserver", "duration", time.monotonic() - start_time)
 
 
 class WebServer(Thread):
-    def __init__(self, config, cluster_state, cluster_monitor_check_queue):
+    def __init__(
+        self,
+        config,
+        cluster_state,
+        cluster_monitor_check_queue,
+        history=None,
+        get_failover_plan=None,
+        failover_tracer=None,
+        cluster_states=None,
+        observer_state=None,
+        get_memory_usage=None,
+        watchdog=None,
+        get_round_schedule=None,
+    ):
         Thread.__init__(self)
         self.config = config
         self.cluster_state = cluster_state
         self.cluster_monitor_check_queue = cluster_monitor_check_queue
+        self.history = history
+        self.get_failover_plan = get_failover_plan
+        self.failover_tracer = failover_tracer
+        self.cluster_states = cluster_states
+        self.observer_state = observer_state
+        self.get_memory_usage = get_memory_usage
+        self.watchdog = watchdog
+        self.get_round_schedule = get_round_schedule
         self.log = getLogger("WebServer")
         self.address = self.config.get("http_address", "")
         self.port = self.config.get("http_port", 15000)
@@ -42,8 +106,16 @@ class WebServer(Thread):
         self.server.cluster_state = self.cluster_state
         self.server.log = self.log
         self.server.cluster_monitor_check_queue = self.cluster_monitor_check_queue
+        self.server.history = self.history
+        self.server.get_failover_plan = self.get_failover_plan
+        self.server.failover_tracer = self.failover_tracer
+        self.server.cluster_states = self.cluster_states
+        self.server.observer_state = self.observer_state
+        self.server.get_memory_usage = self.get_memory_usage
+        self.server.watchdog = self.watchdog
+        self.server.get_round_schedule = self.get_round_schedule
         self.is_initialized.set()
-        self.server.serve_forever()
+        self.server.serve_forever(poll_interval=POLL_INTERVAL)
 
     def close(self):
         if self.server:
@@ -53,16 +125,156 @@ class WebServer(Thread):
 
 
 class RequestHandler(SimpleHTTPRequestHandler):
+    def _send_json(self, data, status=200, indent=None, headers=None):
+        self.send_response(status)
+        self.send_header("Content-type", "application/json")
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        response = json.dumps(data, indent=indent).encode("utf8")
+        self.send_header("Content-length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def _send_text(self, text, status=200):
+        self.send_response(status)
+        self.send_header("Content-type", "text/plain; charset=utf-8")
+        response = text.encode("utf8")
+        self.send_header("Content-length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def _get_profile(self, query):
+        try:
+            seconds = float(query.get("seconds", [1.0])[-1])
+            interval = float(query.get("interval", [DEFAULT_SAMPLE_INTERVAL])[-1])
+        except ValueError as ex:
+            self._send_json({"error": str(ex)}, status=400)
+            return
+        if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0 < interval <= seconds:
+            self._send_json(
+                {"error": f"seconds must be within (0, {MAX_PROFILE_SECONDS}] and interval within it"}, status=400
+            )
+            return
+        self._send_text(sample_stacks(seconds, interval))
+
+    def _get_history(self, query):
+        if self.server.history is None:
+            self.send_response(404)
+            return
+        try:
+            since = float(query["since"][-1]) if "since" in query else None
+            max_points = int(query.get("max_points", [DEFAULT_HISTORY_MAX_POINTS])[-1])
+        except ValueError as ex:
+            self._send_json({"error": str(ex)}, status=400)
+            return
+        history = self.server.history.query(
+            instance=query.get("instance", [None])[-1],
+            observer=query.get("observer", [None])[-1],
+            since=since,
+            max_points=max_points,
+        )
+        self._send_json(history)
+
+    def _get_failover_plan(self):
+        if self.server.get_failover_plan is None:
+            self.send_response(404)
+            return
+        plan = self.server.get_failover_plan()
+        if plan is None:
+            self._send_json({"error": "failover plan has not been computed yet"}, status=503)
+            return
+        self._send_json(plan, indent=4)
+
+    @staticmethod
+    def _get_projection(query):
+        """The comma separated `instances` and `fields` of the query, None for the ones not given"""
+        instances = query["instances"][-1].split(",") if "instances" in query else None
+        fields = query["fields"][-1].split(",") if "fields" in query else None
+        return instances, fields
+
+    def _round_schedule_headers(self):
+        """Headers advertising when our next monitoring round starts, for pglookouts coordinating their polls with ours"""
+        if self.server.get_round_schedule is None:
+            return {}
+        return round_schedule_headers(self.server.get_round_schedule())
+
+    def _get_state(self, state, query, headers=None):
+        instances, fields = self._get_projection(query)
+        if instances is None and fields is None:
+            self._send_json(state, indent=4, headers=headers)
+        else:
+            self._send_json(project_state(state, instances, fields), headers=headers)
+
+    def _get_memory_usage(self, query):
+        if self.server.get_memory_usage is None:
+            self._send_json({"error": "memory usage is not available"}, status=404)
+            return
+        try:
+            limit = int(query.get("limit", [DEFAULT_TOP_ALLOCATIONS])[-1])
+        except ValueError as ex:
+            self._send_json({"error": str(ex)}, status=400)
+            return
+        self._send_json(self.server.get_memory_usage(limit=limit), indent=4)
+
+    def _get_observers(self, query):
+        """Send our own view of the cluster along with the views of the observers we poll"""
+        if self.server.observer_state is None:
+            self._send_json({"error": "observer state is not available"}, status=404)
+            return
+        instances, fields = self._get_projection(query)
+        observers = {}
+        for observer, state in list(self.server.observer_state.items()):
+            nodes = {key: value for key, value in state.items() if isinstance(value, dict)}
+            observers[observer] = {key: value for key, value in state.items() if key not in nodes}
+            observers[observer].update(project_state(nodes, instances, fields))
+        self._send_json(
+            {"state": project_state(self.server.cluster_state, instances, fields), "observers": observers},
+            headers=self._round_schedule_headers(),
+        )
+
+    def _get_cluster_state(self, path, query):
+        name, _, resource = path.partition("/")
+        cluster_states = self.server.cluster_states or {}
+        name = unquote(name)
+        if resource != "state.json" or name not in cluster_states:
+            self._send_json({"error": f"unknown cluster: {name!r}"}, status=404)
+            return
+        self._get_state(cluster_states[name], query)
+
     def do_GET(self):
         assert isinstance(self.server, ThreadedWebServer), f"server: {self.server!r}"
         self.server.log.debug("Got request: %r", self.path)
+        url = urlsplit(self.path)
         if self.path.startswith("/state.json"):
-            self.send_response(200)
-            self.send_header("Content-type", "application/json")
-            response = json.dumps(self.server.cluster_state, indent=4).encode("utf8")
-            self.send_header("Content-length", str(len(response)))
-            self.end_headers()
-            self.wfile.write(response)
+            self._get_state(
+                self.server.cluster_state,
+                parse_qs(url.query, keep_blank_values=True),
+                headers=self._round_schedule_headers(),
+            )
+        elif url.path == "/observers.json":
+            self._get_observers(parse_qs(url.query, keep_blank_values=True))
+        elif url.path == "/history":
+            self._get_history(parse_qs(url.query))
+        elif url.path == "/debug/loops":
+            if self.server.watchdog is None:
+                self._send_json({"error": "not available"}, status=404)
+            else:
+                self._send_json(self.server.watchdog.snapshot(), indent=4)
+        elif url.path == "/debug/stacks":
+            self._send_text(dump_stacks())
+        elif url.path == "/debug/profile":
+            self._get_profile(parse_qs(url.query))
+        elif url.path == "/debug/memory":
+            self._get_memory_usage(parse_qs(url.query))
+        elif url.path == "/failover_plan":
+            self._get_failover_plan()
+        elif url.path.startswith("/clusters/"):
+            self._get_cluster_state(url.path[len("/clusters/") :], parse_qs(url.query, keep_blank_values=True))
+        elif url.path == "/failover_traces":
+            if self.server.failover_tracer is None:
+                self.send_response(404)
+            else:
+                self._send_json({"traces": self.server.failover_tracer.traces()}, indent=4)
         else:
             self.send_response(404)
 
@@ -5,6 +5,7 @@ Copyright (c) 2016 Ohmu Ltd
 See LICENSE for details
 """
 from pglookout import logutil, pgutil
+from pglookout.common import get_iso_timestamp
 from pglookout.pglookout import PgLookout
 from py import path as py_path  # pylint: disable=no-name-in-module
 from unittest.mock import Mock
@@ -148,3 +149,78 @@ def db():
             tmpdir_obj.remove(rec=1)
         except:  # pylint: disable=bare-except
             pass
+
+
+def create_db_node_state(
+    pg_last_xlog_receive_location=None,
+    pg_is_in_recovery=True,
+    connection=True,
+    replication_time_lag=None,
+    fetch_time=None,
+    db_time=None,
+):
+    return {
+        "connection": connection,
+        "db_time": get_iso_timestamp(db_time),
+        "fetch_time": get_iso_timestamp(fetch_time),
+        "pg_is_in_recovery": pg_is_in_recovery,
+        "pg_last_xact_replay_timestamp": None,
+        "pg_last_xlog_receive_location": pg_last_xlog_receive_location,
+        "pg_last_xlog_replay_location": None,
+        "replication_time_lag": replication_time_lag,
+        "min_replication_time_lag": 0,  # simulate that we've been in sync once
+    }
+
+
+def add_to_observer_state(
+    lookout,
+    observer_name,
+    db_name,
+    pg_last_xlog_receive_location=None,
+    pg_is_in_recovery=True,
+    connection=True,
+    replication_time_lag=None,
+    fetch_time=None,
+    db_time=None,
+):
+    db_node_state = create_db_node_state(
+        pg_last_xlog_receive_location,
+        pg_is_in_recovery,
+        connection,
+        replication_time_lag,
+        fetch_time=fetch_time,
+        db_time=db_time,
+    )
+    update_dict = {
+        "fetch_time": get_iso_timestamp(),
+        "connection": True,
+        db_name: db_node_state,
+    }
+    if observer_name in lookout.observer_state:
+        lookout.observer_state[observer_name].update(update_dict)
+    else:
+        lookout.observer_state[observer_name] = update_dict
+
+
+def set_instance_cluster_state(
+    lookout,
+    *,
+    instance,
+    pg_last_xlog_receive_location=None,
+    pg_is_in_recovery=True,
+    connection=True,
+    replication_time_lag=None,
+    fetch_time=None,
+    db_time=None,
+    conn_info=None,
+):
+    db_node_state = create_db_node_state(
+        pg_last_xlog_receive_location,
+        pg_is_in_recovery,
+        connection,
+        replication_time_lag,
+        fetch_time=fetch_time,
+        db_time=db_time,
+    )
+    lookout.cluster_state[instance] = db_node_state
+    lookout.config["remote_conns"][instance] = conn_info or {"host": instance}
@@ -5,18 +5,24 @@ Copyright (c) 2015 Ohmu Ltd
 See LICENSE for details
 """
 from .conftest import TestPG
+from concurrent.futures import Future
 from contextlib import closing
 from datetime import datetime, timedelta
-from mock import patch
+from email.utils import formatdate
+from mock import Mock, patch
 from packaging import version
 from pglookout import statsd
-from pglookout.cluster_monitor import ClusterMonitor
+from pglookout.cluster_monitor import ClusterMonitor, MasterLossCheck, OBSERVED_FIELDS, ProbeTimer, REPLICATION_VIEW_FIELDS
+from pglookout.simulation.fakepg import FakeCluster, FakePostgresServer
+from pglookout.simulation.monitor_bench import run_monitor_bench
 from psycopg2.extras import RealDictCursor
 from queue import Queue
 
 import base64
 import psycopg2
 import pytest
+import requests
+import threading
 import time
 
 
@@ -146,3 +152,510 @@ def test_fetch_replication_slot_info(db: TestPG) -> None:
             assert b"\0" in base64.b64decode(slot.state_data)
 
             cursor.execute("SELECT pg_drop_replication_slot('testslot1')")
+
+
+def _create_cluster_monitor(config, stats=None):
+    return ClusterMonitor(
+        config=config,
+        cluster_state={},
+        observer_state={},
+        create_alert_file=Mock(),
+        cluster_monitor_check_queue=Queue(),
+        failover_decision_queue=Queue(),
+        stats=stats or statsd.StatsClient(host=None),
+        is_replication_lag_over_warning_limit=lambda: False,
+    )
+
+
+def test_probe_timer():
+    timer = ProbeTimer()
+    timer.stop()
+    assert not timer.timings
+    timer.start("connect")
+    timer.start("status_query")
+    timer.stop()
+    timer.stop()
+    assert list(timer.timings) == ["connect", "status_query"]
+    assert all(duration >= 0.0 for duration in timer.timings.values())
+
+
+def test_update_cluster_member_state_probe_timings():
+    stats = Mock()
+    cm = _create_cluster_monitor({"remote_conns": {"db1": "host=db1"}}, stats=stats)
+    cm.connect_durations["db1"] = 0.5
+    result = {"connection": False, "fetch_time": "2026-01-01T00:00:00Z", "probe_timings": {"status_query": 0.25}}
+    with patch.object(cm, "_query_cluster_member_state", return_value=result):
+        cm.update_cluster_member_state("db1", None)
+    assert cm.cluster_state["db1"]["probe_timings"] == {"status_query": 0.25, "connect": 0.5}
+    assert "db1" not in cm.connect_durations
+    stats.timing.assert_any_call("probe_phase", 250.0, tags={"instance": "db1", "phase": "status_query"})
+    stats.timing.assert_any_call("probe_phase", 500.0, tags={"instance": "db1", "phase": "connect"})
+
+
+def test_fetch_observer_state_probe_timings():
+    stats = Mock()
+    cm = _create_cluster_monitor(
+        {"observers": {"observer1": "http://observer1"}, "remote_conns": {"db1": "host=db1", "db2": "host=db2"}}, stats=stats
+    )
+    response = Mock(headers={"date": formatdate(time.time() + 86400, usegmt=True)})
+    response.json.return_value = {"db1": {"connection": True}}
+    cm.session = Mock()
+    cm.session.get.return_value = response
+    cm.fetch_observer_state("observer1", "http://observer1")
+    assert cm.observer_state["observer1"]["db1"] == {"connection": True}
+    assert cm.observer_state["observer1"]["connection"] is True
+    phases = [call.kwargs["tags"]["phase"] for call in stats.timing.call_args_list]
+    assert phases == ["http_fetch", "json_decode"]
+    params = cm.session.get.call_args.kwargs["params"]
+    assert params["instances"] == "db1,db2"
+    assert params["fields"].split(",") == list(OBSERVED_FIELDS)
+
+
+def test_fetch_aggregated_observer_state():
+    observers = {"aggregator": "http://aggregator", "o1": "http://o1", "o2": "http://o2", "o3": "http://o3"}
+    cm = _create_cluster_monitor(
+        {"observers": observers, "observer_aggregator": "aggregator", "remote_conns": {"master": "host=master"}}
+    )
+    now = datetime.utcnow()
+    fresh, stale = (f"{fetch_time.isoformat()}Z" for fetch_time in (now, now - timedelta(seconds=60)))
+    response = Mock(headers={"date": formatdate(time.time(), usegmt=True)})
+    response.json.return_value = {
+        "state": {"master": {"connection": True}},
+        "observers": {
+            "o1": {"connection": True, "fetch_time": fresh, "master": {"connection": False}},
+            "o2": {"connection": True, "fetch_time": stale, "master": {"connection": True}},
+            "o3": {"connection": True, "fetch_time": fresh, "via": "other"},
+            "unknown": {"connection": True, "fetch_time": fresh},
+        },
+    }
+    cm.session = Mock()
+    cm.session.get.return_value = response
+
+    submitted = [call.args[0] for call in _submit_probes(cm)]
+    assert submitted.count(cm.fetch_observer_state) == 3
+    assert submitted.count(cm.fetch_aggregated_observer_state) == 1
+    cm.fetch_aggregated_observer_state("aggregator", "http://aggregator")
+    assert cm.session.get.call_args.args[0] == "http://aggregator/observers.json"
+    assert cm.observer_state["aggregator"]["master"] == {"connection": True}
+    assert "via" not in cm.observer_state["aggregator"]
+    assert cm.observer_state["o1"]["via"] == "aggregator"
+    assert cm.observer_state["o1"]["master"] == {"connection": False}
+    assert set(cm.observer_state) == {"aggregator", "o1"}
+    assert cm.aggregated_observers == {"o1"}
+    # o2 and o3 are still polled directly
+    submitted = [call.args[1] for call in _submit_probes(cm)]
+    assert sorted(submitted) == ["aggregator", "o2", "o3"]
+
+    # each observer in the aggregated state counts in a master loss check
+    check = MasterLossCheck(master="master", observers=observers)
+    cm._add_master_loss_report(check, "aggregator", True)  # pylint: disable=protected-access
+    assert check.reported_gone == {"o1"}
+    assert check.reported_connected == {"aggregator"}
+
+    # o1 isn't counted as connected anymore if the aggregator loses it, it's polled directly instead
+    del response.json.return_value["observers"]["o1"]
+    cm.fetch_aggregated_observer_state("aggregator", "http://aggregator")
+    assert cm.observer_state["o1"]["connection"] is False
+    assert cm.aggregated_observers == set()
+
+    # a direct poll replaces the state from the aggregator
+    cm.observer_state["o1"]["via"] = "aggregator"
+    response.json.return_value = {"master": {"connection": True}}
+    cm.fetch_observer_state("o1", "http://o1")
+    assert cm.observer_state["o1"]["connection"] is True
+    assert "via" not in cm.observer_state["o1"]
+
+
+def test_retained_observer_state():
+    # pylint: disable=protected-access
+    cm = _create_cluster_monitor({"observers": {"o1": "http://o1", "o2": "http://o2"}, "remote_conns": {"a": "", "b": ""}})
+    now = datetime.utcnow()
+    fresh, old = (f"{fetch_time.isoformat()}Z" for fetch_time in (now, now - timedelta(seconds=600)))
+    cm._store_observer_state(
+        "o1",
+        {
+            "fetch_time": fresh,
+            "connection": True,
+            "a": {"fetch_time": fresh, "connection": True, "replication_slots": ["large"]},
+            "b": {"fetch_time": old, "connection": True},
+            "other": {"fetch_time": fresh, "connection": True},
+        },
+        0.1,
+    )
+    # only our own nodes and the fields we use are kept
+    assert cm.observer_state["o1"]["a"] == {"fetch_time": fresh, "connection": True}
+    assert set(cm.observer_state["o1"]) == {"fetch_time", "connection", "a", "b"}
+    # nodes the observer no longer reports are dropped
+    cm._store_observer_state("o1", {"fetch_time": fresh, "connection": True, "a": {"connection": True}}, 0.1)
+    assert set(cm.observer_state["o1"]) == {"fetch_time", "connection", "a"}
+    # what an unreachable observer reported is kept until it's too old
+    cm.observer_state["o1"]["b"] = {"fetch_time": old, "connection": True}
+    cm.observer_state["o1"]["a"]["fetch_time"] = fresh
+    cm._store_observer_state("o1", {"fetch_time": fresh, "connection": False}, 0.1)
+    assert cm.observer_state["o1"] == {
+        "fetch_time": fresh,
+        "connection": False,
+        "a": {"fetch_time": fresh, "connection": True},
+    }
+
+    cm.observer_state["o2"] = {"connection": True}
+    cm.observer_state["removed"] = {"connection": True}
+    cm.cleanup_old_nodes()
+    assert set(cm.observer_state) == {"o1", "o2"}
+
+
+def _submit_probes(cm):
+    executor = Mock()
+    cm.submit_probes(executor)
+    return executor.submit.call_args_list
+
+
+def test_master_loss_check():
+    check = MasterLossCheck(master="master", observers={"o1": "URL", "o2": "URL"})
+    assert check.quorum == 2
+    check.add_report("o1", {"connection": False})
+    check.add_report("unknown", {"connection": False})
+    check.add_report("o2", None)
+    assert check.result() is None
+    check.add_report(None, {"connection": False})
+    assert check.result() == "master_gone"
+    check.add_report("o2", {"connection": True})
+    assert check.result() == "master_connected"
+
+
+def test_master_loss_check_completes_early():
+    stats = Mock()
+    observers = {"fast1": "http://fast1", "fast2": "http://fast2", "slow": "http://slow"}
+    cm = _create_cluster_monitor({"remote_conns": {"master": "host=master"}, "observers": observers}, stats=stats)
+    cm.db_conns["master"] = None
+    released = threading.Event()
+
+    def update_cluster_member_state(instance, _db_conn):
+        cm.cluster_state[instance] = {"connection": False}
+
+    def fetch_observer_state(instance, _uri):
+        if instance == "slow":
+            # the check must complete before the laggards do
+            assert released.wait(timeout=10.0)
+        cm.observer_state[instance] = {"connection": True, "master": {"connection": False}}
+
+    def release_laggards(_message):
+        released.set()
+
+    cm.failover_decision_queue.put = Mock(side_effect=release_laggards)
+    with patch.object(cm, "connect_to_cluster_nodes_and_cleanup_old_nodes"), patch.object(
+        cm, "update_cluster_member_state", side_effect=update_cluster_member_state
+    ), patch.object(cm, "fetch_observer_state", side_effect=fetch_observer_state):
+        cm.main_monitoring_loop(requested_check=MasterLossCheck(master="master", observers=observers))
+    cm.failover_decision_queue.put.assert_called_once_with("Completed master loss check: master_gone")
+    assert stats.timing.call_args[1]["tags"] == {"result": "master_gone"}
+
+
+class _QueuedFuture(Future):
+    def cancel(self):
+        # a worker picking up a cancelled job is what wakes up as_completed(), do the same here
+        cancelled = super().cancel()
+        if cancelled:
+            self.set_running_or_notify_cancel()
+        return cancelled
+
+
+class _QueueingExecutor:
+    """Runs the first ``started`` submissions right away and keeps the rest queued until shutdown"""
+
+    started = 2
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.queued = []
+
+    def submit(self, fn, *args):
+        future = _QueuedFuture()
+        if self.started:
+            self.started -= 1
+            future.set_running_or_notify_cancel()
+            future.set_result(fn(*args))
+        else:
+            self.queued.append((future, fn, args))
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        for future, fn, args in self.queued:
+            if not future.cancelled() and future.set_running_or_notify_cancel():
+                future.set_result(fn(*args))
+
+
+def test_master_loss_check_cancels_queued_probes():
+    observers = {"o1": "http://o1", "o2": "http://o2"}
+    cm = _create_cluster_monitor({"remote_conns": {"master": "host=master"}, "observers": observers})
+    cm.db_conns["master"] = None
+    fetched = []
+
+    def update_cluster_member_state(instance, _db_conn):
+        cm.cluster_state[instance] = {"connection": False}
+
+    def fetch_observer_state(instance, _uri):
+        fetched.append(instance)
+        cm.observer_state[instance] = {"connection": True, "master": {"connection": False}}
+
+    # our own probe and o1 agree that the master is gone while the probe of o2 is still queued
+    with patch("pglookout.cluster_monitor.ThreadPoolExecutor", _QueueingExecutor), patch.object(
+        cm, "connect_to_cluster_nodes_and_cleanup_old_nodes"
+    ), patch.object(cm, "update_cluster_member_state", side_effect=update_cluster_member_state), patch.object(
+        cm, "fetch_observer_state", side_effect=fetch_observer_state
+    ):
+        cm.main_monitoring_loop(requested_check=MasterLossCheck(master="master", observers=observers))
+    assert fetched == ["o1"]
+    assert cm.failover_decision_queue.get_nowait() == "Completed master loss check: master_gone"
+    assert cm.failover_decision_queue.empty()
+
+
+def test_trace_member_state():
+    cm = _create_cluster_monitor({"remote_conns": {"master": "host=master", "standby": "host=standby"}})
+    cm.cluster_state["master"] = {"connection": True, "pg_is_in_recovery": False}
+    cm.trace_member_state("standby", {"connection": False})
+    assert cm.failover_tracer.incident_master is None
+    cm.trace_member_state("master", {"connection": False, "fetch_time": "2026-01-01T00:00:00Z"})
+    assert cm.failover_tracer.incident_master == "master"
+    cm.trace_member_state("standby", {"connection": True, "pg_is_in_recovery": True})
+    assert cm.failover_tracer.incident_master == "master"
+    cm.trace_member_state("standby", {"connection": True, "pg_is_in_recovery": False})
+    [trace] = cm.failover_tracer.traces()
+    assert trace["outcome"] == "promoted"
+    assert trace["new_master"] == "standby"
+
+
+def test_main_loop_against_fake_server():
+    cluster = FakeCluster.create(3)
+    # WAL has been written for a minute, the standbys are as far behind as they can be
+    cluster.start_time -= 60.0
+    with FakePostgresServer(cluster) as server:
+        cm = _create_cluster_monitor({"remote_conns": {name: server.dsn(name) for name in server.cluster.nodes}})
+        cm.main_monitoring_loop()
+        assert cm.cluster_state["node0"]["pg_is_in_recovery"] is False
+        assert cm.cluster_state["node0"]["pg_last_xlog_replay_location"]
+        assert cm.cluster_state["node2"]["pg_is_in_recovery"] is True
+        assert cm.cluster_state["node2"]["replication_time_lag"] == pytest.approx(0.2, abs=0.1)
+        assert cm.cluster_state["node0"]["replication_slots"] == []
+
+        server.cluster.nodes["node0"].down = True
+        cm.main_monitoring_loop()
+        assert cm.cluster_state["node0"]["connection"] is False
+        assert cm.cluster_state["node1"]["connection"] is True
+        for conn in cm.db_conns.values():
+            if conn:
+                conn.close()
+
+
+@pytest.mark.parametrize(
+    "strategy,txids,messages",
+    [("txid", 2, 0), ("message", 0, 2), ("table", 1, 0), ("none", 0, 0)],
+)
+def test_heartbeat_strategies(strategy, txids, messages):
+    cluster = FakeCluster.create(2)
+    cluster.heartbeat_time = 0.0
+    stats = Mock()
+    with FakePostgresServer(cluster) as server:
+        config = {"remote_conns": {name: server.dsn(name) for name in cluster.nodes}, "heartbeat_strategy": strategy}
+        cm = _create_cluster_monitor(config, stats=stats)
+        for _ in range(2):
+            cm.main_monitoring_loop()
+        assert cm.cluster_state["node0"]["connection"] is True
+        assert cm.cluster_state["node0"]["pg_last_xlog_replay_location"]
+        assert cm.cluster_state["node1"]["replication_time_lag"] == pytest.approx(0.1, abs=0.1)
+        assert cluster.txid - 1000 == txids
+        assert cluster.logical_messages == messages
+
+        # a missing heartbeat table doesn't make the master look unreachable
+        cluster.heartbeat_time = None
+        cm.main_monitoring_loop()
+        assert cm.cluster_state["node0"]["connection"] is True
+        cm.close_connections()
+    heartbeat_failures = [c for c in stats.increase.call_args_list if c.args == ("heartbeat_failed",)]
+    assert len(heartbeat_failures) == (1 if strategy == "table" else 0)
+
+
+def test_replication_view():
+    with FakePostgresServer(FakeCluster.create(3)) as server:
+        stats = Mock()
+        config = {"remote_conns": {name: server.dsn(name) for name in server.cluster.nodes}, "db_timeout_max": 0.5}
+        cm = _create_cluster_monitor(config, stats=stats)
+        cm.main_monitoring_loop()
+        assert [row["application_name"] for row in cm.cluster_state["node0"]["replication"]] == ["node1", "node2"]
+        assert "master_view" not in cm.cluster_state["node0"]
+        view = cm.cluster_state["node1"]["master_view"]
+        assert view["state"] == "streaming"
+        assert view["replay_lag"] == pytest.approx(0.1)
+        assert cm.cluster_state["node1"]["positions_from"] is None
+        stats.gauge.assert_any_call("pg.replicating_from_master", 1, tags={"instance": "node1"})
+        stats.gauge.assert_any_call("pg.replay_lag", pytest.approx(0.2), tags={"instance": "node2"})
+
+        # a standby we can't reach still streaming from the master has its positions from the master's view
+        server.cluster.nodes["node2"].hanging = True
+        cm.main_monitoring_loop()
+        node2 = cm.cluster_state["node2"]
+        assert node2["connection"] is False
+        assert node2["positions_from"] == "node0"
+        assert node2["pg_last_xlog_replay_location"] == node2["master_view"]["replay_lsn"]
+
+        # a standby that stopped replicating from the master has no view
+        server.cluster.nodes["node2"].hanging = False
+        server.cluster.stop_replication("node1")
+        cm.main_monitoring_loop()
+        assert cm.cluster_state["node1"]["master_view"] is None
+        stats.gauge.assert_any_call("pg.replicating_from_master", 0, tags={"instance": "node1"})
+        cm.close_connections()
+
+
+def test_map_replication_view():
+    config = {
+        "remote_conns": {
+            "a": "host=10.0.0.1 dbname=postgres",
+            "b": "postgres://user@10.0.0.2/postgres",
+            "c": "host=10.0.0.3",
+            "d": "host=10.0.0.3 port=5433",
+        }
+    }
+    cm = _create_cluster_monitor(config)
+    rows = [
+        {"application_name": "b", "client_addr": "10.0.0.1", "state": "streaming", "replay_lsn": "0/1"},
+        {"application_name": "walreceiver", "client_addr": "10.0.0.1", "state": "streaming", "replay_lsn": "0/2"},
+        {"application_name": "walreceiver", "client_addr": "10.0.0.3", "state": "streaming", "replay_lsn": "0/3"},
+        {"application_name": "walreceiver", "client_addr": "10.0.0.9", "state": "catchup", "replay_lsn": "0/4"},
+    ]
+    views = cm._map_replication_view(rows)  # pylint: disable=protected-access
+    # rows are matched by application_name first and by client address only if it's unambiguous
+    assert {instance: view["replay_lsn"] for instance, view in views.items()} == {"a": "0/2", "b": "0/1"}
+    assert set(views["a"]) == set(REPLICATION_VIEW_FIELDS)
+
+
+def test_replication_lag_bounded_by_master_position():
+    cm = _create_cluster_monitor({})
+    cm.cluster_state.update(
+        {
+            "master": {
+                "connection": True,
+                "pg_is_in_recovery": False,
+                "db_time": "2026-01-01T00:00:00Z",
+                "pg_last_xlog_replay_location": "0/1000",
+            },
+            "standby": {
+                "connection": True,
+                "pg_is_in_recovery": True,
+                "db_time": "2026-01-01T00:00:02Z",
+                "pg_last_xlog_receive_location": "0/1000",
+                "pg_last_xlog_replay_location": "0/1000",
+                # the last transaction was replayed long ago, the primary has been idle since
+                "replication_time_lag": 600.0,
+                "min_replication_time_lag": 300.0,
+            },
+        }
+    )
+    cm.update_replication_throughput()
+    assert cm.cluster_state["standby"]["replication_position_lag"] == 2.0
+    assert cm.cluster_state["standby"]["replication_time_lag"] == 2.0
+    assert cm.cluster_state["standby"]["min_replication_time_lag"] == 2.0
+
+
+def test_adaptive_probe_timeouts():
+    with FakePostgresServer(FakeCluster.create(2)) as server:
+        config = {"remote_conns": {name: server.dsn(name) for name in server.cluster.nodes}, "db_timeout_min": 0.05}
+        cm = _create_cluster_monitor(config)
+        for _ in range(3):
+            cm.main_monitoring_loop()
+        assert cm.cluster_state["node0"]["connection"] is True
+        assert cm.latencies["node0", "query"].timeout(0.0, 5.0) < 0.05
+        assert ("node0", "connect") in cm.latencies
+
+        # a node that normally answers right away is declared unreachable long before the maximum timeout
+        server.cluster.nodes["node0"].latency = 2.0
+        start_time = time.monotonic()
+        cm.main_monitoring_loop()
+        assert time.monotonic() - start_time < 1.0
+        assert cm.cluster_state["node0"]["connection"] is False
+        assert cm.cluster_state["node1"]["connection"] is True
+        assert cm.latencies["node0", "query"].backoff == 2
+
+        del config["remote_conns"]["node0"]
+        cm.cleanup_old_nodes()
+        assert {instance for instance, _ in cm.latencies} == {"node1"}
+        cm.close_connections()
+
+
+def test_adaptive_observer_timeouts():
+    stats = Mock()
+    cm = _create_cluster_monitor({"observers": {"observer1": "http://observer1"}}, stats=stats)
+    response = Mock(headers={"date": formatdate(time.time(), usegmt=True)})
+    response.json.return_value = {}
+    cm.session = Mock()
+    cm.session.get.return_value = response
+    cm.fetch_observer_state("observer1", "http://observer1")
+    assert cm.session.get.call_args.kwargs["timeout"] == 5.0
+    cm.fetch_observer_state("observer1", "http://observer1")
+    assert cm.session.get.call_args.kwargs["timeout"] == 1.0
+
+    # a timed out fetch marks the observer disconnected and doubles its next timeout
+    cm.config["observer_timeout_min"] = 0.01
+    cm.session.get.side_effect = requests.ReadTimeout("timed out")
+    cm.fetch_observer_state("observer1", "http://observer1")
+    assert cm.observer_state["observer1"]["connection"] is False
+    assert cm.latencies["observer1", "observer"].backoff == 2
+    stats.unexpected_exception.assert_not_called()
+
+
+def test_coordinated_observer_polls():
+    observers = {"o1": "http://o1", "o2": "http://o2"}
+    cm = _create_cluster_monitor({"observers": observers, "coordinate_observer_polls": True, "db_poll_interval": 1.0})
+    next_round = time.time() + 0.1
+    response = Mock(
+        headers={
+            "date": formatdate(time.time(), usegmt=True),
+            "X-Pglookout-Next-Round": f"{next_round:.3f}",
+            "X-Pglookout-Round-Duration": "0.050",
+        }
+    )
+    response.json.return_value = {}
+    cm.session = Mock()
+    cm.session.get.return_value = response
+    cm.fetch_observer_state("o1", "http://o1")
+    assert cm.get_round_schedule() is None
+    fetch_time = cm.scheduled_observer_fetches()["o1"]
+    assert fetch_time == pytest.approx(next_round + 0.1, abs=0.001)
+    # o1 is fetched after its own rounds instead of in ours
+    executor = Mock()
+    cm.submit_probes(executor, skip_observers=cm.scheduled_observer_fetches())
+    assert [call.args[1] for call in executor.submit.call_args_list] == ["o2"]
+
+    # fetched right after its round while waiting for ours, its next round isn't advertised anymore
+    response.headers = {"date": formatdate(time.time(), usegmt=True)}
+    cm.config["poll_phase"] = (time.time() + 0.5) % 1.0
+    assert cm.wait_for_round() is False
+    assert cm.session.get.call_count == 2
+    assert time.time() >= fetch_time
+    assert not cm.scheduled_observer_fetches()
+
+
+def test_delay_requested_check():
+    cm = _create_cluster_monitor({"check_jitter": 0.2, "poll_phase": 0.5})
+    start_time = time.monotonic()
+    assert cm.delay_requested_check("config reloaded") == "config reloaded"
+    assert time.monotonic() - start_time >= 0.1
+
+    # a master loss check isn't delayed and supersedes a delayed check
+    check = MasterLossCheck(master="master", observers={})
+    assert cm.delay_requested_check(check) is check
+    cm.cluster_monitor_check_queue.put(check)
+    cm.config["check_jitter"] = 60.0
+    assert cm.delay_requested_check("config reloaded") is check
+
+
+def test_monitor_bench():
+    report = run_monitor_bench(5, rounds=2, down_nodes=1)
+    assert report.connect_round_time > 0.0
+    assert len(report.round_times) == 2
+    assert report.failed_probes == 2
+    assert report.probes_per_second > 0.0
+    assert report.to_dict()["median_round_time"] is not None
@@ -0,0 +1,82 @@
+"""
+pglookout - external command runner tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pglookout.command_runner import CommandResult, ExternalCommandRunner, FAILOVER
+from pglookout.statsd import StatsClient
+from queue import Queue
+from typing import Tuple
+
+import sys
+import time
+
+PYTHON = sys.executable
+
+
+def _create_runner() -> Tuple[ExternalCommandRunner, "Queue[CommandResult]"]:
+    completion_queue: "Queue[CommandResult]" = Queue()
+    return ExternalCommandRunner(completion_queue=completion_queue, stats=StatsClient(host=None)), completion_queue
+
+
+def test_run() -> None:
+    runner, _ = _create_runner()
+    result = runner.run("test", [PYTHON, "-c", "print('hello')"])
+    assert result.return_code == 0
+    assert result.output == "hello\n"
+    assert not result.timed_out
+
+    result = runner.run("test", [PYTHON, "-c", "import sys; sys.exit(3)"])
+    assert result.return_code == 3
+
+    result = runner.run("test", [PYTHON, "-c", "import time; time.sleep(10)"], timeout=0.1)
+    assert result.return_code is None
+    assert result.timed_out
+    assert result.duration < 5.0
+
+    assert runner.run("test", []).return_code is None
+    assert runner.run("test", ["/nonexistent/command"]).return_code is None
+
+
+def _is_running(pid: int) -> bool:
+    # the killed grandchild is reparented to init and may linger as a zombie until reaped
+    try:
+        with open(f"/proc/{pid}/stat", "r") as fp:
+            return fp.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_run_timeout_kills_process_group() -> None:
+    runner, _ = _create_runner()
+    spawn_and_wait = (
+        "import subprocess, sys, time; "
+        "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); "
+        "print(child.pid, flush=True); time.sleep(30)"
+    )
+    result = runner.run("test", [PYTHON, "-c", spawn_and_wait], timeout=1.0)
+    assert result.timed_out
+    # the grandchild held on to the output pipe, so we'd have waited for it if it had not been killed as well
+    assert result.duration < 10.0
+    grandchild_pid = int(result.output)
+    deadline = time.monotonic() + 5.0
+    while _is_running(grandchild_pid) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not _is_running(grandchild_pid)
+
+
+def test_submit_failover_is_not_overlapped() -> None:
+    runner, completion_queue = _create_runner()
+    slow_command = [PYTHON, "-c", "import time; time.sleep(0.2)"]
+    assert runner.submit("over_warning_limit", [("over_warning_limit", slow_command, None)])
+    assert not runner.submit("over_warning_limit", [("over_warning_limit", slow_command, None)])
+    assert runner.submit(FAILOVER, [(FAILOVER, [PYTHON, "-c", "pass"], None)], post_delay=0.1)
+    assert runner.is_busy(FAILOVER)
+    # pg_stop and pg_start are only started once the failover has completed
+    assert runner.submit(
+        "autofollow",
+        [("pg_stop", [PYTHON, "-c", "pass"], None), ("pg_start", [PYTHON, "-c", "pass"], 5.0)],
+    )
+    kinds = [completion_queue.get(timeout=10.0).kind for _ in range(4)]
+    assert kinds == ["over_warning_limit", FAILOVER, "pg_stop", "pg_start"]
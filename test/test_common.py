@@ -11,7 +11,7 @@ from pytest import raises
 import datetime
 
 
-def test_convert_xlog_location_to_offset():
+def test_convert_xlog_location_to_offset() -> None:
     assert convert_xlog_location_to_offset("1/00000000") == 1 << 32
     assert convert_xlog_location_to_offset("F/AAAAAAAA") == (0xF << 32) | 0xAAAAAAAA
     with raises(ValueError):
@@ -20,7 +20,7 @@ def test_convert_xlog_location_to_offset():
         convert_xlog_location_to_offset("x/y")
 
 
-def test_parse_iso_datetime():
+def test_parse_iso_datetime() -> None:
     date = datetime.datetime.utcnow()
     date.replace(microsecond=0)
     assert date == parse_iso_datetime(date.isoformat() + "Z")
@@ -28,7 +28,7 @@ def test_parse_iso_datetime():
         parse_iso_datetime("foobar")
 
 
-def test_get_iso_timestamp():
+def test_get_iso_timestamp() -> None:
     v = get_iso_timestamp()
     assert ISO_EXT_RE.match(v)
     ts = datetime.datetime.now()
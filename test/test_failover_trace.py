@@ -0,0 +1,78 @@
+"""
+pglookout - failover trace tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pathlib import Path
+from pglookout import failover_trace
+from pglookout.failover_trace import FailoverTracer
+from pglookout.statsd import StatsClient
+from unittest.mock import Mock
+
+import json
+
+
+def test_failover_trace() -> None:
+    stats = Mock()
+    tracer = FailoverTracer(stats=stats)
+    tracer.record("cluster_state_check")
+    tracer.master_seen("db1")
+    assert tracer.incident_master is None
+    assert not tracer.traces()
+
+    tracer.start("db1", fetch_time="2026-01-01T00:00:00Z")
+    tracer.start("db2")
+    assert tracer.incident_master == "db1"
+    tracer.record_once("observer_confirmation", observer="o1")
+    tracer.record_once("observer_confirmation", observer="o1")
+    tracer.record_once("observer_confirmation", observer="o2")
+    tracer.record("decision", action="promote")
+    [ongoing] = tracer.traces()
+    assert ongoing["outcome"] is None
+    tracer.master_seen("db2")
+
+    [trace] = tracer.traces()
+    assert trace["master"] == "db1"
+    assert trace["outcome"] == "promoted"
+    assert trace["new_master"] == "db2"
+    assert [event["event"] for event in trace["events"]] == [
+        "master_probe_failed",
+        "observer_confirmation",
+        "observer_confirmation",
+        "decision",
+        "promoted",
+    ]
+    assert trace["events"][0]["fetch_time"] == "2026-01-01T00:00:00Z"
+    offsets = [event["offset"] for event in trace["events"]]
+    assert offsets == sorted(offsets)
+    assert trace["duration"] == offsets[-1]
+    segments = [call[1]["tags"]["segment"] for call in stats.timing.call_args_list if call[0][0] == "failover_trace"]
+    assert segments == [event["event"] for event in trace["events"]]
+    stats.timing.assert_called_with(
+        "failover_trace_total", round(trace["duration"] * 1000.0, 3), tags={"outcome": "promoted"}
+    )
+
+    tracer.start("db2")
+    tracer.master_seen("db2")
+    assert tracer.traces()[-1]["outcome"] == "master_recovered"
+
+
+def test_failover_trace_is_bounded(tmp_path: Path) -> None:
+    path = str(tmp_path / "failover_traces.jsonl")
+    tracer = FailoverTracer(stats=StatsClient(host=None), path=path, max_entries=2)
+    for master in ["db1", "db2", "db3"]:
+        tracer.start(master)
+        for _ in range(failover_trace.MAX_TRACE_EVENTS + 5):
+            tracer.record("cluster_state_check")
+        tracer.master_seen("db4")
+    with open(path) as fp:
+        saved = [json.loads(line) for line in fp]
+    assert [trace["master"] for trace in saved] == ["db2", "db3"]
+    assert len(saved[-1]["events"]) == failover_trace.MAX_TRACE_EVENTS
+    # the event resolving the incident was dropped too, but its outcome is still recorded
+    assert saved[-1]["dropped_events"] == 7
+    assert saved[-1]["outcome"] == "promoted"
+
+    reloaded = FailoverTracer(stats=StatsClient(host=None), path=path, max_entries=2)
+    assert reloaded.traces() == saved
@@ -0,0 +1,103 @@
+"""
+pglookout - fake PostgreSQL server tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from contextlib import closing
+from pglookout.simulation.cluster import format_lsn
+from pglookout.simulation.fakepg import FakeCluster, FakePostgresServer
+from psycopg2.extras import RealDictCursor
+from typing import Any, Iterator, Optional
+
+import psycopg2
+import pytest
+
+STATUS_QUERY = (
+    "SELECT now() AS db_time, pg_is_in_recovery(), pg_last_xact_replay_timestamp(), "
+    "pg_last_wal_receive_lsn() AS pg_last_xlog_receive_location, pg_last_wal_replay_lsn() AS pg_last_xlog_replay_location"
+)
+
+
+def _error_code(cursor: Any, query: str) -> Optional[str]:
+    try:
+        cursor.execute(query)
+    except psycopg2.DatabaseError as ex:
+        return ex.pgcode
+    return None
+
+
+@pytest.fixture(name="server")
+def fixture_server() -> Iterator[FakePostgresServer]:
+    with FakePostgresServer(FakeCluster.create(3)) as server:
+        yield server
+
+
+def test_fake_cluster_lsn_progression() -> None:
+    cluster = FakeCluster.create(3, wal_rate=1000.0)
+    master, standby, lagging = cluster.nodes.values()
+    start = cluster.start_time
+    assert cluster.lsn(master, start + 10.0) == format_lsn(10000)
+    assert cluster.lsn(standby, start + 10.0) == format_lsn(9900)
+    assert cluster.lsn(lagging, start + 0.1) == format_lsn(0)
+    cluster.stop_replication("node1")
+    assert cluster.replay_time(standby, start + 3600.0) < start + 10.0
+    cluster.promote("node1")
+    assert cluster.lsn(standby, start + 20.0) == format_lsn(20000)
+
+
+def test_fake_server_queries(server: FakePostgresServer) -> None:
+    with closing(psycopg2.connect(server.dsn("node0"))) as conn:
+        conn.autocommit = True
+        assert conn.server_version == 150000
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("SET synchronous_commit = off")
+            cursor.execute(STATUS_QUERY)
+            status = cursor.fetchone()
+            assert status is not None
+            assert status["pg_is_in_recovery"] is False
+            assert status["pg_last_xact_replay_timestamp"] is None
+            assert status["db_time"].tzinfo is not None
+            cursor.execute("SELECT txid_current(), pg_current_wal_lsn() AS pg_last_xlog_replay_location")
+            master = cursor.fetchone()
+            assert master is not None
+            assert master["txid_current"] > 1000
+            assert "/" in master["pg_last_xlog_replay_location"]
+
+    with closing(psycopg2.connect(server.dsn("node2"))) as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(STATUS_QUERY)
+            status = cursor.fetchone()
+            assert status is not None
+            assert status["pg_is_in_recovery"] is True
+            assert status["pg_last_xact_replay_timestamp"] <= status["db_time"]
+            assert _error_code(cursor, "SELECT txid_current()") == "25006"
+            conn.rollback()
+            cursor.execute("SELECT pg_catalog.pg_promote(wait => true, wait_seconds => %s) AS promoted", (60,))
+            assert cursor.fetchall() == [{"promoted": True}]
+            cursor.execute("ALTER SYSTEM SET primary_conninfo = %s", ("host='db1' port=5432",))
+            cursor.execute("SELECT pg_catalog.current_setting('primary_conninfo') AS primary_conninfo")
+            assert cursor.fetchall() == [{"primary_conninfo": "host='db1' port=5432"}]
+            conn.commit()
+    assert server.cluster.nodes["node2"].is_master
+
+    with pytest.raises(psycopg2.OperationalError, match="does not exist"):
+        psycopg2.connect(server.dsn("node3"))
+
+
+def test_fake_server_failures(server: FakePostgresServer) -> None:
+    node = server.cluster.nodes["node1"]
+    with closing(psycopg2.connect(server.dsn("node1"))) as conn:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            assert _error_code(cursor, "VACUUM") == "0A000"
+            node.error_rate = 1.0
+            assert _error_code(cursor, STATUS_QUERY) == "XX000"
+            node.error_rate = 0.0
+            cursor.execute(STATUS_QUERY)
+            node.down = True
+            with pytest.raises(psycopg2.OperationalError):
+                cursor.execute(STATUS_QUERY)
+    with pytest.raises(psycopg2.OperationalError, match="shutting down"):
+        psycopg2.connect(server.dsn("node1"))
+    assert node.queries == 3
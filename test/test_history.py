@@ -0,0 +1,70 @@
+"""
+pglookout - history buffer tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pglookout.history import ClusterHistory, downsample, HistoryBuffer
+from pytest import raises
+
+import math
+
+
+def test_history_buffer_wraps_around() -> None:
+    buffer = HistoryBuffer(capacity=3)
+    nbytes = buffer.nbytes
+    for i in range(5):
+        buffer.append(timestamp=float(i), replay_lsn=i, replication_time_lag=i * 0.5, connection=True)
+    assert len(buffer) == 3
+    assert buffer.nbytes == nbytes
+    samples = buffer.samples()
+    assert [sample["timestamp"] for sample in samples] == [2.0, 3.0, 4.0]
+    assert [sample["replay_lsn"] for sample in samples] == [2, 3, 4]
+    assert [sample["timestamp"] for sample in buffer.samples(since=3.0)] == [4.0]
+    assert math.isnan(samples[0]["probe_latency"])
+
+    with raises(ValueError):
+        HistoryBuffer(capacity=0)
+
+
+def test_downsample() -> None:
+    buffer = HistoryBuffer(capacity=10)
+    for i in range(10):
+        buffer.append(timestamp=float(i), replication_time_lag=float(i % 3), probe_latency=0.1, connection=i != 4)
+    samples = downsample(buffer.samples(), max_points=5)
+    assert len(samples) == 5
+    assert [sample["timestamp"] for sample in samples] == [1.0, 3.0, 5.0, 7.0, 9.0]
+    assert [sample["replication_time_lag"] for sample in samples] == [1.0, 2.0, 2.0, 1.0, 2.0]
+    assert [sample["connection"] for sample in samples] == [1, 1, 0, 1, 1]
+    assert downsample(samples, max_points=10) == samples
+
+
+def test_cluster_history_query_and_prune() -> None:
+    history = ClusterHistory(capacity=4)
+    state = {
+        "connection": True,
+        "pg_last_xlog_receive_location": "1/0",
+        "pg_last_xlog_replay_location": None,
+        "replication_time_lag": None,
+    }
+    history.record_node("node1", state, timestamp=10.0, probe_latency=0.002)
+    history.record_node("node2", {"connection": False}, timestamp=10.0, probe_latency=5.0)
+    history.record_observer("observer1", {"connection": True}, timestamp=11.0, probe_latency=0.01)
+
+    result = history.query(instance="node1")
+    assert list(result["nodes"]) == ["node1"]
+    assert result["observers"] == {}
+    node1 = result["nodes"]["node1"]
+    assert node1["receive_lsn"] == [1 << 32]
+    assert node1["replay_lsn"] == [None]
+    assert node1["replication_time_lag"] == [None]
+    assert node1["probe_latency"] == [0.002]
+    assert node1["connection"] == [True]
+
+    assert set(history.query()["nodes"]) == {"node1", "node2"}
+    assert history.query(since=10.0)["nodes"]["node1"]["timestamp"] == []
+    assert history.query(observer="observer1")["observers"]["observer1"]["timestamp"] == [11.0]
+
+    history.prune(nodes=["node1"], observers=[])
+    assert set(history.nodes) == {"node1"}
+    assert not history.observers
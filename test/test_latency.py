@@ -0,0 +1,38 @@
+"""
+pglookout - adaptive probe timeout tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pglookout.latency import LatencyEstimator
+
+import pytest
+
+
+def test_latency_estimator() -> None:
+    estimator = LatencyEstimator()
+    assert estimator.timeout(0.1, 5.0) == 5.0
+    estimator.add(0.002)
+    # the first sample counts with a deviation of half of it
+    assert estimator.timeout(0.001, 5.0) == pytest.approx(0.006)
+    assert estimator.timeout(0.1, 5.0) == 0.1
+    for _ in range(100):
+        estimator.add(0.002)
+    assert estimator.timeout(0.001, 5.0) == pytest.approx(0.002, rel=0.01)
+
+    # an occasional slow probe widens the timeout
+    estimator.add(0.1)
+    assert estimator.timeout(0.001, 5.0) == pytest.approx(0.0143 + 4 * 0.0245, rel=0.01)
+
+
+def test_latency_estimator_backoff() -> None:
+    estimator = LatencyEstimator()
+    estimator.add(0.2)
+    assert estimator.timeout(0.1, 5.0) == pytest.approx(0.6)
+    estimator.timed_out()
+    assert estimator.timeout(0.1, 5.0) == pytest.approx(1.2)
+    for _ in range(10):
+        estimator.timed_out()
+    assert estimator.timeout(0.1, 5.0) == 5.0
+    estimator.add(0.2)
+    assert estimator.timeout(0.1, 5.0) == pytest.approx(0.5)
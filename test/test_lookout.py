@@ -7,17 +7,23 @@ Copyright (c) 2014 F-Secure
 This file is under the Apache License, Version 2.0.
 See the file `LICENSE` for details.
 """
+from .conftest import add_to_observer_state, set_instance_cluster_state
 from pathlib import Path
 from pglookout.common import get_iso_timestamp
+from pglookout.local_db import LocalDatabase
 from pglookout.pglookout import PgLookout
 from pglookout.pgutil import get_connection_info, get_connection_info_from_config_line
 from typing import Optional, Union
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import datetime
 import json
+import math
 import os
+import psycopg2
 import pytest
+import signal
+import sys
 import time
 
 
@@ -42,89 +48,36 @@ def test_state_file_write(pgl, tmpdir):
     assert isinstance(state, dict)
 
 
+def test_warm_start(pgl, tmpdir):
+    pgl.config.update(json_state_file_path=tmpdir.join("state_file").strpath, remote_conns={"a": "", "b": "", "old": ""})
+    old = get_iso_timestamp(datetime.datetime.utcnow() - datetime.timedelta(seconds=120))
+    pgl.cluster_state.update(a={"fetch_time": get_iso_timestamp(), "replication_start_time": time.monotonic() - 100})
+    pgl.cluster_state.update(old={"fetch_time": old}, removed={"fetch_time": get_iso_timestamp()})
+    pgl.write_cluster_state_to_json_file()
+    pgl.cluster_state.clear()
+    pgl.restore_persisted_state()
+    assert set(pgl.cluster_state) == {"a"} and pgl.cluster_state["a"]["restored_age"] < 1.0
+    assert pgl.cluster_state["a"]["replication_start_time"] == pytest.approx(time.monotonic() - 100, abs=1.0)
+    # nothing is decided and systemd isn't notified before the restored state has been refreshed
+    pgl.cluster_state.update(b={"fetch_time": get_iso_timestamp()}, old={"fetch_time": get_iso_timestamp()})
+    with patch("pglookout.logutil.notify_systemd") as notify_systemd:
+        pgl.check_cluster_state()
+        pgl.notify_ready()
+        notify_systemd.assert_not_called()
+        pgl.cluster_monitor.last_monitoring_success_time = time.monotonic()
+        pgl.notify_ready()
+        notify_systemd.assert_called_once_with("READY=1")
+    assert pgl.failover_plan is None
+
+
 def test_load_config(pgl):
     pgl.own_db = "old_value"
     pgl.load_config()
     assert pgl.own_db == "1.2.3.4"
 
 
-def _create_db_node_state(
-    pg_last_xlog_receive_location=None,
-    pg_is_in_recovery=True,
-    connection=True,
-    replication_time_lag=None,
-    fetch_time=None,
-    db_time=None,
-):
-    return {
-        "connection": connection,
-        "db_time": get_iso_timestamp(db_time),
-        "fetch_time": get_iso_timestamp(fetch_time),
-        "pg_is_in_recovery": pg_is_in_recovery,
-        "pg_last_xact_replay_timestamp": None,
-        "pg_last_xlog_receive_location": pg_last_xlog_receive_location,
-        "pg_last_xlog_replay_location": None,
-        "replication_time_lag": replication_time_lag,
-        "min_replication_time_lag": 0,  # simulate that we've been in sync once
-    }
-
-
-def _add_to_observer_state(
-    pgl,
-    observer_name,
-    db_name,
-    pg_last_xlog_receive_location=None,
-    pg_is_in_recovery=True,
-    connection=True,
-    replication_time_lag=None,
-    fetch_time=None,
-    db_time=None,
-):
-    db_node_state = _create_db_node_state(
-        pg_last_xlog_receive_location,
-        pg_is_in_recovery,
-        connection,
-        replication_time_lag,
-        fetch_time=fetch_time,
-        db_time=db_time,
-    )
-    update_dict = {
-        "fetch_time": get_iso_timestamp(),
-        "connection": True,
-        db_name: db_node_state,
-    }
-    if observer_name in pgl.observer_state:
-        pgl.observer_state[observer_name].update(update_dict)
-    else:
-        pgl.observer_state[observer_name] = update_dict
-
-
-def _set_instance_cluster_state(
-    pgl,
-    *,
-    instance,
-    pg_last_xlog_receive_location=None,
-    pg_is_in_recovery=True,
-    connection=True,
-    replication_time_lag=None,
-    fetch_time=None,
-    db_time=None,
-    conn_info=None,
-):
-    db_node_state = _create_db_node_state(
-        pg_last_xlog_receive_location,
-        pg_is_in_recovery,
-        connection,
-        replication_time_lag,
-        fetch_time=fetch_time,
-        db_time=db_time,
-    )
-    pgl.cluster_state[instance] = db_node_state
-    pgl.config["remote_conns"][instance] = conn_info or {"host": instance}
-
-
 def test_check_cluster_state_warning(pgl):
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="kuu",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -133,7 +86,7 @@ def test_check_cluster_state_warning(pgl):
         replication_time_lag=40.0,
     )
 
-    _set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=True)
+    set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=True)
     pgl.current_master = "old_master"
     pgl.own_db = "kuu"
     pgl.over_warning_limit_command = "fake_command"
@@ -149,7 +102,7 @@ def test_check_cluster_state_warning(pgl):
     assert pgl.create_alert_file.call_count == 1
 
     # and then the replication catches up
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="kuu",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -163,7 +116,7 @@ def test_check_cluster_state_warning(pgl):
 
 
 def test_check_cluster_do_failover_one_standby(pgl):
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="old_master",
         pg_is_in_recovery=False,
@@ -171,7 +124,7 @@ def test_check_cluster_do_failover_one_standby(pgl):
         db_time=datetime.datetime(year=2014, month=1, day=1),
     )
 
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="own_db",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -192,7 +145,7 @@ def test_check_cluster_do_failover_one_standby(pgl):
 
 
 def test_check_cluster_master_gone_one_standby_one_observer(pgl):
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="old_master",
         pg_is_in_recovery=False,
@@ -200,7 +153,7 @@ def test_check_cluster_master_gone_one_standby_one_observer(pgl):
         db_time=datetime.datetime(year=2014, month=1, day=1),
     )
 
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="own_db",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -209,7 +162,7 @@ def test_check_cluster_master_gone_one_standby_one_observer(pgl):
         replication_time_lag=0.0,
     )
     pgl.own_db = "own_db"
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "old_master",
@@ -217,7 +170,7 @@ def test_check_cluster_master_gone_one_standby_one_observer(pgl):
         connection=False,
         db_time=datetime.datetime(year=2014, month=1, day=1),
     )
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "own_db",
@@ -251,7 +204,7 @@ def test_check_cluster_master_gone_one_standby_one_observer(pgl):
 
 
 def test_check_cluster_do_failover_one_standby_one_observer(pgl):
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="old_master",
         pg_is_in_recovery=False,
@@ -259,7 +212,7 @@ def test_check_cluster_do_failover_one_standby_one_observer(pgl):
         db_time=datetime.datetime(year=2014, month=1, day=1),
     )
 
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="own_db",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -268,7 +221,7 @@ def test_check_cluster_do_failover_one_standby_one_observer(pgl):
         replication_time_lag=130.0,
     )
     pgl.own_db = "own_db"
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "old_master",
@@ -276,7 +229,7 @@ def test_check_cluster_do_failover_one_standby_one_observer(pgl):
         connection=False,
         db_time=datetime.datetime(year=2014, month=1, day=1),
     )
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "own_db",
@@ -297,7 +250,7 @@ def test_check_cluster_do_failover_one_standby_one_observer(pgl):
 
 
 def test_check_cluster_do_failover_with_a_node_which_is_is_maintenance(pgl):
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="old_master",
         pg_is_in_recovery=False,
@@ -305,7 +258,7 @@ def test_check_cluster_do_failover_with_a_node_which_is_is_maintenance(pgl):
         db_time=datetime.datetime(year=2014, month=1, day=1),
     )
 
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="kuu",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -322,13 +275,14 @@ def test_check_cluster_do_failover_with_a_node_which_is_is_maintenance(pgl):
     pgl.check_cluster_state()
     assert pgl.execute_external_command.call_count == 0
     assert pgl.replication_lag_over_warning_limit is True
-    assert pgl.check_for_maintenance_mode_file.call_count == 1
+    # read at the start of the round and again after waiting for the master loss check
+    assert pgl.check_for_maintenance_mode_file.call_count == 2
 
 
 def test_check_cluster_do_failover_with_a_node_which_should_never_be_promoted(pgl):
-    _set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=False)
+    set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=False)
 
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="kuu",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -346,9 +300,9 @@ def test_check_cluster_do_failover_with_a_node_which_should_never_be_promoted(pg
 
 
 def test_check_cluster_do_failover_two_standbys(pgl):
-    _set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=False)
+    set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=False)
 
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="kuu",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -358,7 +312,7 @@ def test_check_cluster_do_failover_two_standbys(pgl):
     )
     pgl.own_db = "kuu"
     # we put the second standby _WELL_ ahead
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="puu",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -377,7 +331,7 @@ def test_check_cluster_do_failover_two_standbys(pgl):
 def test_check_cluster_do_failover_two_standbys_when_the_one_ahead_can_never_be_promoted(
     pgl,
 ):
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="old_master",
         pg_is_in_recovery=False,
@@ -385,7 +339,7 @@ def test_check_cluster_do_failover_two_standbys_when_the_one_ahead_can_never_be_
         db_time=datetime.datetime(year=2014, month=1, day=1),
     )
 
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="kuu",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -395,7 +349,7 @@ def test_check_cluster_do_failover_two_standbys_when_the_one_ahead_can_never_be_
     )
     pgl.own_db = "kuu"
     # we put the second standby _WELL_ ahead
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="puu",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -415,7 +369,7 @@ def test_failover_with_no_master_anymore(pgl):
     # this should trigger an immediate failover as we have two
     # standbys online but we've never seen a master
     pgl.own_db = "kuu"
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="kuu",
         pg_last_xlog_receive_location="F/aaaaaaaa",
@@ -423,7 +377,7 @@ def test_failover_with_no_master_anymore(pgl):
         connection=True,
         replication_time_lag=0,
     )
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="puu",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -438,10 +392,10 @@ def test_failover_with_no_master_anymore(pgl):
 
 
 def test_failover_over_replication_lag_when_still_connected_to_master(pgl):
-    _set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=False)
+    set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=False)
 
     # We will make our own node to be the furthest along so we get considered for promotion
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="kuu",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -459,10 +413,10 @@ def test_failover_over_replication_lag_when_still_connected_to_master(pgl):
 def test_failover_over_replication_lag_with_one_observer_one_standby_no_connections(
     pgl,
 ):
-    _set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=False)
+    set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=False)
 
     # We will make our own node to be the furthest along so we get considered for promotion
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="own_db",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -472,7 +426,7 @@ def test_failover_over_replication_lag_with_one_observer_one_standby_no_connecti
     )
     pgl.own_db = "own_db"
 
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "old_master",
@@ -480,7 +434,7 @@ def test_failover_over_replication_lag_with_one_observer_one_standby_no_connecti
         connection=False,
         db_time=datetime.datetime(year=2014, month=1, day=1),
     )
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "own_db",
@@ -496,10 +450,10 @@ def test_failover_over_replication_lag_with_one_observer_one_standby_no_connecti
 
 
 def test_cluster_state_when_observer_has_also_non_members_of_our_current_cluster(pgl):
-    _set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=True)
+    set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=True)
 
     # We will make our own node to be the furthest along so we get considered for promotion
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="own_db",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -509,7 +463,7 @@ def test_cluster_state_when_observer_has_also_non_members_of_our_current_cluster
     )
     pgl.own_db = "own_db"
 
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "old_master",
@@ -517,7 +471,7 @@ def test_cluster_state_when_observer_has_also_non_members_of_our_current_cluster
         connection=False,
         db_time=datetime.datetime(year=2014, month=1, day=1),
     )
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "own_db",
@@ -526,7 +480,7 @@ def test_cluster_state_when_observer_has_also_non_members_of_our_current_cluster
         connection=False,
         replication_time_lag=130.0,
     )
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "some_other_cluster",
@@ -541,10 +495,10 @@ def test_cluster_state_when_observer_has_also_non_members_of_our_current_cluster
 
 
 def test_failover_no_connections(pgl):
-    _set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=False)
+    set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=False)
 
     # We will make our own node to be the furthest along so we get considered for promotion
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="kuu",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -555,7 +509,7 @@ def test_failover_no_connections(pgl):
     pgl.own_db = "kuu"
 
     # we put the second standby _WELL_ ahead
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="puu",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -569,7 +523,7 @@ def test_failover_no_connections(pgl):
 
 
 def test_failover_master_two_standbys_one_observer_no_connection_between_standbys(pgl):
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="old_master",
         pg_is_in_recovery=False,
@@ -577,7 +531,7 @@ def test_failover_master_two_standbys_one_observer_no_connection_between_standby
         db_time=datetime.datetime(year=2014, month=1, day=1),
     )
     # We will make our own node to be the furthest along so we get considered for promotion
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="own",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -587,7 +541,7 @@ def test_failover_master_two_standbys_one_observer_no_connection_between_standby
     )
     pgl.own_db = "own"
 
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="other",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -597,7 +551,7 @@ def test_failover_master_two_standbys_one_observer_no_connection_between_standby
     )
 
     # Add observer state
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "old_master",
@@ -605,7 +559,7 @@ def test_failover_master_two_standbys_one_observer_no_connection_between_standby
         connection=False,
         db_time=datetime.datetime(year=2014, month=1, day=1),
     )
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "other",
@@ -614,7 +568,7 @@ def test_failover_master_two_standbys_one_observer_no_connection_between_standby
         connection=True,
         replication_time_lag=130.0,
     )
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "own",
@@ -637,11 +591,11 @@ def test_failover_master_one_standby_one_observer_no_connections(pgl):
     pgl.own_db = "own"
 
     # Add observer state
-    _add_to_observer_state(pgl, "observer", "old_master", pg_is_in_recovery=False, connection=True)
+    add_to_observer_state(pgl, "observer", "old_master", pg_is_in_recovery=False, connection=True)
 
     # add db state
-    _set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=True)
-    _set_instance_cluster_state(
+    set_instance_cluster_state(pgl, instance="old_master", pg_is_in_recovery=False, connection=True)
+    set_instance_cluster_state(
         pgl,
         instance="own",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -655,8 +609,8 @@ def test_failover_master_one_standby_one_observer_no_connections(pgl):
     assert pgl.execute_external_command.call_count == 0
 
     # Add observer state
-    _add_to_observer_state(pgl, "observer", "old_master", pg_is_in_recovery=False, connection=True)
-    _add_to_observer_state(
+    add_to_observer_state(pgl, "observer", "old_master", pg_is_in_recovery=False, connection=True)
+    add_to_observer_state(
         pgl,
         "observer",
         "own",
@@ -666,7 +620,7 @@ def test_failover_master_one_standby_one_observer_no_connections(pgl):
         replication_time_lag=9.0,
     )
 
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="own",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -682,7 +636,7 @@ def test_failover_master_one_standby_one_observer_no_connections(pgl):
     assert pgl.replication_lag_over_warning_limit is True  # we keep the warning on
 
     # observer state
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "old_master",
@@ -690,7 +644,7 @@ def test_failover_master_one_standby_one_observer_no_connections(pgl):
         connection=False,
         db_time=datetime.datetime(year=2014, month=1, day=1),
     )
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "own",
@@ -700,7 +654,7 @@ def test_failover_master_one_standby_one_observer_no_connections(pgl):
         replication_time_lag=140.0,
     )
     # lose own connection to master
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="old_master",
         pg_is_in_recovery=False,
@@ -719,8 +673,8 @@ def test_failover_master_one_standby_no_observer_no_connections(pgl, failover_on
     pgl._failover_on_disconnect = failover_on_disconnect  # pylint: disable=protected-access
 
     # add db state
-    _set_instance_cluster_state(pgl, instance="primary", pg_is_in_recovery=False, connection=False)
-    _set_instance_cluster_state(
+    set_instance_cluster_state(pgl, instance="primary", pg_is_in_recovery=False, connection=False)
+    set_instance_cluster_state(
         pgl,
         instance="this_host",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -735,7 +689,7 @@ def test_failover_master_one_standby_no_observer_no_connections(pgl, failover_on
 
     # age the configuration, we should still be fine as we've seen the primary at `utcnow`
     pgl.cluster_nodes_change_time = time.monotonic() - pgl.missing_master_from_config_timeout - 1
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="primary",
         pg_is_in_recovery=False,
@@ -746,7 +700,7 @@ def test_failover_master_one_standby_no_observer_no_connections(pgl, failover_on
     assert pgl.execute_external_command.call_count == 0
 
     # now set the db_time to be bigger than the failover-timeout
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="primary",
         pg_is_in_recovery=False,
@@ -761,9 +715,9 @@ def test_failover_master_one_standby_no_observer_no_connections(pgl, failover_on
 
 
 def test_find_current_master(pgl):
-    _set_instance_cluster_state(pgl, instance="master", pg_is_in_recovery=False, connection=True)
+    set_instance_cluster_state(pgl, instance="master", pg_is_in_recovery=False, connection=True)
     # We will make our own node to be the furthest along so we get considered for promotion
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="own",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -777,7 +731,7 @@ def test_find_current_master(pgl):
 
 
 def test_two_standby_failover_and_autofollow(pgl, tmpdir):
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="old_master",
         pg_is_in_recovery=False,
@@ -785,7 +739,7 @@ def test_two_standby_failover_and_autofollow(pgl, tmpdir):
         fetch_time=datetime.datetime(year=2014, month=1, day=1),
     )
     # We will make our own node to be the furthest from master so we don't get considered for promotion
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="own",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -794,7 +748,7 @@ def test_two_standby_failover_and_autofollow(pgl, tmpdir):
         replication_time_lag=130.0,
     )
     pgl.own_db = "own"
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="other",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -808,7 +762,7 @@ def test_two_standby_failover_and_autofollow(pgl, tmpdir):
     assert pgl.execute_external_command.call_count == 0
     assert pgl.current_master == "old_master"
 
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="other",
         pg_last_xlog_receive_location="2/aaaaaaaa",
@@ -959,7 +913,7 @@ def test_node_map_disconnected_current_master(pgl):
 
 def test_standbys_failover_equal_replication_positions(pgl):
     now = datetime.datetime.utcnow()
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="192.168.54.183",
         pg_last_xlog_receive_location="0/70004D8",
@@ -970,7 +924,7 @@ def test_standbys_failover_equal_replication_positions(pgl):
         db_time=now,
         conn_info="foobar",
     )
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="192.168.57.180",
         pg_last_xlog_receive_location=None,
@@ -981,7 +935,7 @@ def test_standbys_failover_equal_replication_positions(pgl):
         db_time=now - datetime.timedelta(seconds=3600),
         conn_info="foobar",
     )
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="192.168.63.4",
         pg_last_xlog_receive_location="0/70004D8",
@@ -1044,14 +998,14 @@ def test_poll_observers_on_warning_only(pgl):
     pgl.config["poll_observers_on_warning_only"] = True
     pgl.config["observers"] = {"local": "URL"}
     pgl.own_db = "kuu"
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="master",
         pg_is_in_recovery=False,
         connection=True,
         db_time=datetime.datetime.min,
     )
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="kuu",
         pg_last_xlog_receive_location="1/aaaaaaaa",
@@ -1065,21 +1019,21 @@ def test_poll_observers_on_warning_only(pgl):
     assert pgl.replication_lag_over_warning_limit
     assert pgl.observer_state_newer_than is not None
 
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="master",
         pg_is_in_recovery=False,
         connection=False,
         db_time=datetime.datetime.min,
     )
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="kuu",
         pg_last_xlog_receive_location="1/aaaaaaaa",
         pg_is_in_recovery=True,
         replication_time_lag=140.0,
     )
-    _add_to_observer_state(
+    add_to_observer_state(
         pgl,
         "observer",
         "master",
@@ -1174,14 +1128,14 @@ def test_apply_stale_config_restarts(
     pgl.current_master = "primary"
     pgl.own_db = "secondary"
     pgl.primary_conninfo_template = "user=replicator password=fake_pass sslmode=require"
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="primary",
         pg_is_in_recovery=False,
         connection=True,
         db_time=datetime.datetime.utcnow(),
     )
-    _set_instance_cluster_state(
+    set_instance_cluster_state(
         pgl,
         instance="secondary",
         pg_is_in_recovery=True,
@@ -1216,3 +1170,327 @@ def test_apply_stale_config_restarts(
     # check that the recovery file contains the new password
     with open(recovery_file_path, "r") as fp:
         assert "primary_conninfo = 'user=replication password=foo sslmode=require" in fp.read()
+
+
+@pytest.mark.parametrize("server_version, fails", [(150000, False), (120000, False), (150000, True)])
+def test_autofollow_with_reload(pgl, tmpdir, server_version, fails):
+    pg_data_dir = tmpdir / "test_pgdata"
+    os.makedirs(str(pg_data_dir))
+    with open(os.path.join(pg_data_dir, "PG_VERSION"), "w") as fp:
+        fp.write(f"{server_version // 10000}\n")
+    with open(pg_data_dir / "postgresql.auto.conf", "w") as fp:
+        fp.write("primary_conninfo = 'user=replicator host=old_primary'\n")
+    pgl.config["pg_data_directory"] = str(pg_data_dir)
+    pgl.config["autofollow_mode"] = "reload"
+    pgl.config["remote_conns"]["new_primary"] = "host=new_primary port=5433"
+    pgl.primary_conninfo_template = "user=replicator"
+    current_conninfo = "user=replicator host=old_primary"
+
+    def execute(query, args=None):
+        nonlocal current_conninfo
+        if fails:
+            raise psycopg2.OperationalError("connection lost")
+        if "current_setting" in query:
+            return [{"primary_conninfo": current_conninfo}]
+        if query.startswith("ALTER SYSTEM"):
+            current_conninfo = args[0]
+        return []
+
+    pgl.local_db = Mock(server_version=server_version)
+    pgl.local_db.execute.side_effect = execute
+    pgl.start_following_new_master("new_primary")
+    if server_version < 130000 or fails:
+        # fell back to rewriting the configuration file and restarting
+        assert pgl.execute_external_command.call_count == 2
+        with open(pg_data_dir / "postgresql.auto.conf", "r") as fp:
+            assert "host=new_primary" in fp.read()
+        return
+
+    assert pgl.execute_external_command.call_count == 0
+    assert get_connection_info(current_conninfo) == {"user": "replicator", "host": "new_primary", "port": "5433"}
+    pgl.local_db.execute.assert_called_with("SELECT pg_catalog.pg_reload_conf()")
+    # already following the new primary, nothing is changed
+    pgl.local_db.execute.reset_mock()
+    pgl.start_following_new_master("new_primary")
+    assert pgl.local_db.execute.call_count == 1
+    assert pgl.execute_external_command.call_count == 0
+
+
+def test_catching_up_normally_uses_estimated_catchup_time(pgl):
+    pgl.replication_catchup_timeout = 300.0
+    state = {
+        "pg_last_xlog_receive_location": "1/aaaaaaaa",
+        "min_replication_time_lag": 100.0,
+        "replication_start_time": time.monotonic() - 100.0,
+    }
+    assert pgl.is_restoring_or_catching_up_normally(state)
+    state["estimated_catchup_seconds"] = 60.0
+    assert pgl.is_restoring_or_catching_up_normally(state)
+    state["estimated_catchup_seconds"] = 600.0
+    assert not pgl.is_restoring_or_catching_up_normally(state)
+    # a standby that replays slower than the master generates WAL is never going to catch up
+    state["estimated_catchup_seconds"] = math.inf
+    assert not pgl.is_restoring_or_catching_up_normally(state)
+    # once the node has caught up the estimate no longer matters
+    state["min_replication_time_lag"] = 0.0
+    state["estimated_catchup_seconds"] = 0.0
+    assert not pgl.is_restoring_or_catching_up_normally(state)
+
+
+def test_failover_command_in_background(pgl):
+    set_instance_cluster_state(
+        pgl,
+        instance="old_master",
+        pg_is_in_recovery=False,
+        connection=False,
+        db_time=datetime.datetime(year=2014, month=1, day=1),
+    )
+    set_instance_cluster_state(
+        pgl,
+        instance="own_db",
+        pg_last_xlog_receive_location="1/aaaaaaaa",
+        pg_is_in_recovery=True,
+        connection=True,
+        replication_time_lag=130.0,
+    )
+    pgl.own_db = "own_db"
+    pgl.config["external_command_mode"] = "background"
+    pgl.failover_command = [sys.executable, "-c", "import time; time.sleep(0.2)"]
+    pgl.replication_lag_over_warning_limit = True
+    pgl.check_cluster_state()
+    assert pgl.command_runner.is_busy("failover")
+    pgl.create_alert_file.assert_called_with("failover_has_happened")
+    # a failover that is still running is not started again
+    pgl.check_cluster_state()
+    assert pgl.create_alert_file.call_count == 1
+    result = pgl.command_completion_queue.get(timeout=10.0)
+    assert result.kind == "failover"
+    assert result.return_code == 0
+    pgl.command_completion_queue.put(result)
+    pgl.handle_external_command_results()
+    assert pgl.replication_lag_over_warning_limit is False
+    assert pgl.execute_external_command.call_count == 0
+
+
+def _set_up_failover_to_own_db(pgl):
+    set_instance_cluster_state(
+        pgl,
+        instance="old_master",
+        pg_is_in_recovery=False,
+        connection=False,
+        db_time=datetime.datetime(year=2014, month=1, day=1),
+    )
+    set_instance_cluster_state(
+        pgl,
+        instance="own_db",
+        pg_last_xlog_receive_location="1/aaaaaaaa",
+        pg_is_in_recovery=True,
+        connection=True,
+        replication_time_lag=130.0,
+    )
+    pgl.own_db = "own_db"
+    pgl.config["promotion_mode"] = "pg_promote"
+    pgl.config["promotion_poll_interval"] = 0.0
+    pgl.replication_lag_over_warning_limit = True
+    pgl.local_db = Mock()
+
+
+def test_promotion_with_pg_promote(pgl):
+    _set_up_failover_to_own_db(pgl)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    promoted_state = {
+        "db_time": now,
+        "pg_is_in_recovery": False,
+        "pg_last_xact_replay_timestamp": now,
+        "pg_last_xlog_receive_location": None,
+        "pg_last_xlog_replay_location": "1/aaaaaaab",
+    }
+    pgl.local_db.server_version = 150000
+    # promotion is still finishing on the first poll
+    pgl.local_db.execute.side_effect = [[{"promoted": True}], [], [promoted_state]]
+    pgl.check_cluster_state()
+
+    assert pgl.execute_external_command.call_count == 0
+    assert pgl.local_db.execute.call_count == 3
+    assert "pg_promote(wait => true" in pgl.local_db.execute.call_args_list[0][0][0]
+    pgl.create_alert_file.assert_called_with("failover_has_happened")
+    assert pgl.replication_lag_over_warning_limit is False
+    own_state = pgl.cluster_state["own_db"]
+    assert own_state["pg_is_in_recovery"] is False
+    assert own_state["replication_time_lag"] is None
+    assert own_state["pg_last_xlog_replay_location"] == "1/aaaaaaab"
+
+
+@pytest.mark.parametrize(
+    "server_version, side_effect",
+    [
+        (110000, None),
+        (150000, psycopg2.OperationalError("server closed the connection unexpectedly")),
+        (150000, [[{"promoted": False}], [], []]),
+    ],
+)
+def test_promotion_with_pg_promote_falls_back_to_command(pgl, server_version, side_effect):
+    _set_up_failover_to_own_db(pgl)
+    pgl.config["promotion_wait_seconds"] = 0
+    pgl.local_db.server_version = server_version
+    pgl.local_db.execute.side_effect = side_effect
+    pgl.execute_external_command.return_value = 0
+    pgl.check_cluster_state()
+
+    assert pgl.execute_external_command.call_count == 1
+    assert pgl.cluster_state["own_db"]["pg_is_in_recovery"] is True
+    pgl.create_alert_file.assert_called_with("failover_has_happened")
+
+
+def test_promotion_with_pg_promote_waits_for_running_commands(pgl):
+    _set_up_failover_to_own_db(pgl)
+    # e.g. autofollow restarting PostgreSQL in the background
+    with patch.object(pgl.command_runner, "is_busy", side_effect=lambda kind=None: kind is None):
+        pgl.check_cluster_state()
+    assert pgl.local_db.execute.call_count == 0
+    assert pgl.execute_external_command.call_count == 0
+    assert pgl.cluster_state["own_db"]["pg_is_in_recovery"] is True
+
+
+def test_check_local_db(pgl):
+    pgl.local_db = LocalDatabase(reconnect_interval=30.0)
+    pgl.local_db.set_dsn("host=own_db")
+    pgl.config["promotion_mode"] = "pg_promote"
+    with patch.object(pgl.local_db, "execute", side_effect=psycopg2.OperationalError("connection refused")) as execute:
+        assert pgl.local_db.check(now=100.0) is False
+        # the next connection attempt is only made once reconnect_interval has passed
+        assert pgl.local_db.check(now=110.0) is False
+        assert execute.call_count == 1
+        execute.side_effect = None
+        assert pgl.local_db.check(now=130.0) is True
+        assert execute.call_count == 2
+        pgl.check_local_db()
+        assert execute.call_count == 3
+        pgl.config["promotion_mode"] = "command"
+        pgl.check_local_db()
+        assert execute.call_count == 3
+
+
+def test_promotion_is_traced(pgl):
+    _set_up_failover_to_own_db(pgl)
+    pgl.config["promotion_mode"] = "command"
+    pgl.execute_external_command.return_value = 0
+    pgl.failover_tracer.start("old_master")
+    pgl.check_cluster_state()
+    [trace] = pgl.failover_tracer.traces()
+    assert trace["outcome"] is None
+    events = [event["event"] for event in trace["events"]]
+    assert events == ["master_probe_failed", "cluster_state_check", "decision", "command_start", "command_end"]
+    assert trace["events"][2]["action"] == "promote"
+    assert trace["events"][4]["return_code"] == 0
+
+
+def test_failover_plan_is_kept_up_to_date(pgl):
+    set_instance_cluster_state(pgl, instance="master", pg_is_in_recovery=False, connection=True)
+    set_instance_cluster_state(pgl, instance="own", pg_last_xlog_receive_location="1/aaaaaaaa")
+    set_instance_cluster_state(pgl, instance="other", pg_last_xlog_receive_location="1/aaaaaaab")
+    set_instance_cluster_state(pgl, instance="tied", pg_last_xlog_receive_location="1/aaaaaaaa")
+    set_instance_cluster_state(pgl, instance="never", pg_last_xlog_receive_location="2/aaaaaaaa")
+    set_instance_cluster_state(pgl, instance="gone", connection=False)
+    add_to_observer_state(pgl, "observer", "own")
+    pgl.own_db = "own"
+    pgl.never_promote_these_nodes = ["never"]
+    pgl.check_cluster_state()
+
+    plan = pgl.get_failover_plan()
+    assert plan["master"] == "master"
+    assert [candidate["instance"] for candidate in plan["candidates"]] == ["other", "tied", "own"]
+    assert plan["promotion_candidate"] == "other"
+    assert plan["excluded"] == {"never": "never_promote", "gone": "disconnected"}
+    # 5 standbys + master - 1 never promoted + 1 observer
+    assert plan["total_nodes"] == 6
+    assert plan["needed_majority"] == 3.0
+    assert plan["known_state_size"] == 4
+    assert plan["has_majority"] is True
+    assert plan["maintenance_mode"] is False
+    assert plan["observer_sources"] == {"observer": None}
+
+    pgl.cluster_state["other"]["connection"] = False
+    pgl.check_for_maintenance_mode_file.return_value = True
+    pgl.observer_state["observer"]["via"] = "aggregator"
+    pgl.check_cluster_state()
+    plan = pgl.get_failover_plan()
+    assert plan["promotion_candidate"] == "tied"
+    assert plan["excluded"]["other"] == "disconnected"
+    assert plan["maintenance_mode"] is True
+    assert plan["observer_sources"] == {"observer": "aggregator"}
+
+    structures = pgl.get_memory_usage()["structures"]
+    assert structures["cluster_state"]["entries"] == 6
+    assert structures["observer_state"]["entries"] == 1
+
+
+def test_dump_debug_info(pgl, tmp_path):
+    assert signal.getsignal(signal.SIGUSR1) == pgl.dump_debug_info
+    pgl.config.update({"debug_dump_dir": str(tmp_path), "debug_profile_seconds": 0.05})
+    pgl.dump_debug_info()
+    pgl.profiler_thread.join()
+    assert "Thread 'MainThread'" in next(tmp_path.glob("pglookout_stacks_*.txt")).read_text()
+    assert "MainThread;" in next(tmp_path.glob("pglookout_profile_*.txt")).read_text()
+
+
+def test_failover_decision_uses_failover_plan(pgl):
+    set_instance_cluster_state(
+        pgl,
+        instance="old_master",
+        pg_is_in_recovery=False,
+        connection=False,
+        db_time=datetime.datetime(year=2014, month=1, day=1),
+    )
+    set_instance_cluster_state(
+        pgl,
+        instance="own_db",
+        pg_last_xlog_receive_location="1/aaaaaaaa",
+        replication_time_lag=130.0,
+    )
+    set_instance_cluster_state(pgl, instance="stale", fetch_time=datetime.datetime(year=2014, month=1, day=1))
+    pgl.own_db = "own_db"
+    pgl.execute_external_command.return_value = 0
+    pgl.check_cluster_state()
+
+    plan = pgl.get_failover_plan()
+    assert plan["promotion_candidate"] == "own_db"
+    assert plan["excluded"] == {"stale": "stale_state"}
+    assert not plan["has_majority"]
+    assert pgl.execute_external_command.call_count == 0
+
+    add_to_observer_state(pgl, "observer", "own_db")
+    pgl.check_cluster_state()
+    assert pgl.get_failover_plan()["has_majority"] is True
+    assert pgl.execute_external_command.call_count == 1
+
+
+def test_maintenance_mode_is_rechecked_after_master_loss_check(pgl):
+    set_instance_cluster_state(
+        pgl,
+        instance="old_master",
+        pg_is_in_recovery=False,
+        connection=False,
+        db_time=datetime.datetime(year=2014, month=1, day=1),
+    )
+    set_instance_cluster_state(pgl, instance="own_db", pg_last_xlog_receive_location="1/aaaaaaaa")
+    add_to_observer_state(pgl, "observer", "own_db")
+    pgl.own_db = "own_db"
+    pgl.current_master = "old_master"
+    pgl.known_gone_nodes = ["old_master"]
+    pgl.execute_external_command.return_value = 0
+
+    def create_maintenance_mode_file(timeout):  # pylint: disable=unused-argument
+        pgl.check_for_maintenance_mode_file.return_value = True
+
+    # the file is created while we wait for the master loss check to complete
+    pgl.failover_decision_queue.get.side_effect = create_maintenance_mode_file
+    pgl.check_cluster_state()
+    assert pgl.failover_decision_queue.get.call_count == 1
+    assert pgl.get_failover_plan()["maintenance_mode"] is True
+    assert pgl.execute_external_command.call_count == 0
+
+    pgl.failover_decision_queue.get.side_effect = None
+    pgl.check_for_maintenance_mode_file.return_value = False
+    pgl.check_cluster_state()
+    assert pgl.execute_external_command.call_count == 1
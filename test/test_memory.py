@@ -0,0 +1,37 @@
+"""
+pglookout - memory usage reporting tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pglookout.memory import state_size, top_allocations, update_tracing
+
+import tracemalloc
+
+
+def test_state_size() -> None:
+    assert state_size({}) == {"entries": 0, "json_bytes": 2}
+    assert state_size({"a": {"connection": True}}) == {"entries": 1, "json_bytes": len('{"a": {"connection": true}}')}
+
+
+def test_top_allocations() -> None:
+    assert not tracemalloc.is_tracing()
+    update_tracing(None)
+    assert top_allocations() is None
+    try:
+        update_tracing(5)
+        assert tracemalloc.get_traceback_limit() == 5
+        allocated = [bytearray(1000) for _ in range(100)]
+        usage = top_allocations(limit=3)
+        assert usage is not None
+        assert 1 <= len(usage["top"]) <= 3
+        assert usage["traced_bytes"] >= 100 * 1000
+        assert any(entry["file"] == __file__ for entry in usage["top"])
+        del allocated
+        update_tracing(1)
+        assert tracemalloc.get_traceback_limit() == 1
+        update_tracing(None)
+        assert tracemalloc.is_tracing()
+    finally:
+        update_tracing(0)
+    assert not tracemalloc.is_tracing()
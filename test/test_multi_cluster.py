@@ -0,0 +1,119 @@
+"""
+pglookout - multi-cluster monitoring tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pathlib import Path
+from pglookout import statsd
+from pglookout.multi_cluster import cluster_config, MultiClusterMonitor
+from pglookout.pglookout import PgLookout
+from pglookout.simulation.fakepg import FakeCluster, FakePostgresServer
+from queue import Queue
+from typing import Any, Dict, Iterator
+from unittest.mock import Mock
+
+import json
+import pytest
+
+
+def test_cluster_config() -> None:
+    config = {
+        "db_poll_interval": 2.0,
+        "observers": {"other": "http://other"},
+        "remote_conns": {"ignored": "host=ignored"},
+        "clusters": {
+            "a": {"remote_conns": {"a1": "host=a1"}},
+            "b": {"remote_conns": {"b1": "host=b1"}, "observers": {"b-obs": "http://b-obs"}, "db_poll_interval": 1.0},
+        },
+    }
+    assert cluster_config(config, "a") == {"db_poll_interval": 2.0, "remote_conns": {"a1": "host=a1"}}
+    assert cluster_config(config, "b") == {
+        "db_poll_interval": 1.0,
+        "observers": {"b-obs": "http://b-obs"},
+        "remote_conns": {"b1": "host=b1"},
+    }
+
+
+@pytest.fixture(name="servers")
+def fixture_servers() -> Iterator[Dict[str, FakePostgresServer]]:
+    servers = {name: FakePostgresServer(FakeCluster.create(3)).start() for name in ["a", "b"]}
+    try:
+        yield servers
+    finally:
+        for server in servers.values():
+            server.stop()
+
+
+def _create_multi_cluster_monitor(config: Dict[str, Any]) -> MultiClusterMonitor:
+    return MultiClusterMonitor(
+        config=config,
+        cluster_states={},
+        create_alert_file=Mock(),
+        cluster_monitor_check_queue=Queue(),
+        failover_decision_queue=Queue(),
+        stats=statsd.StatsClient(host=None),
+    )
+
+
+def test_multi_cluster_monitor(servers: Dict[str, FakePostgresServer]) -> None:
+    config: Dict[str, Any] = {
+        "clusters": {
+            name: {"remote_conns": {node: server.dsn(node) for node in server.cluster.nodes}}
+            for name, server in servers.items()
+        },
+        "probe_workers": 2,
+    }
+    mcm = _create_multi_cluster_monitor(config)
+    try:
+        mcm.main_monitoring_loop(requested_check=True)
+        assert mcm.failover_decision_queue.get(timeout=5) == "Completed requested monitoring loop"
+        assert set(mcm.cluster_states) == {"a", "b"}
+        for name in ["a", "b"]:
+            assert mcm.monitors[name].session is mcm.session
+            assert mcm.cluster_states[name]["node0"]["pg_is_in_recovery"] is False
+            assert mcm.cluster_states[name]["node1"]["pg_is_in_recovery"] is True
+            assert mcm.monitors[name].last_monitoring_success_time == mcm.last_monitoring_success_time
+
+        servers["b"].cluster.nodes["node0"].down = True
+        mcm.main_monitoring_loop()
+        assert mcm.cluster_states["a"]["node0"]["connection"] is True
+        assert mcm.cluster_states["b"]["node0"]["connection"] is False
+
+        # the state of removed clusters is dropped, the probe pool is resized on config changes
+        del config["clusters"]["b"]
+        config["probe_workers"] = 4
+        mcm.main_monitoring_loop()
+        assert set(mcm.cluster_states) == {"a"}
+        assert set(mcm.monitors) == {"a"}
+        assert mcm.probe_workers == 4
+    finally:
+        for monitor in mcm.monitors.values():
+            monitor.close_connections()
+        mcm.executor.shutdown()
+
+
+def test_pglookout_with_multiple_clusters(tmp_path: Path) -> None:
+    config_path = tmp_path / "pglookout.json"
+    config = {
+        "clusters": {"a": {"remote_conns": {"a1": "host=a1"}}},
+        "json_state_file_path": str(tmp_path / "state.json"),
+        "own_db": "a1",
+    }
+    config_path.write_text(json.dumps(config))
+    pgl = PgLookout(str(config_path))
+    try:
+        assert isinstance(pgl.cluster_monitor, MultiClusterMonitor)
+        assert pgl.own_db is None
+        assert pgl.webserver.cluster_states is pgl.cluster_states
+        pgl.cluster_states["a"] = {"a1": {"connection": True}}
+        pgl.check_cluster_state()
+        assert pgl.current_master is None
+        pgl.write_cluster_state_to_json_file()
+        state = json.loads((tmp_path / "state.json").read_text())
+        assert state["clusters"] == {"a": {"a1": {"connection": True}}}
+        structures = pgl.get_memory_usage()["structures"]
+        assert structures["cluster_states"]["entries"] == 1
+        assert "history" not in structures
+    finally:
+        pgl.quit()
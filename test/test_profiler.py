@@ -0,0 +1,61 @@
+"""
+pglookout - stack dump and profiler tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pathlib import Path
+from pglookout.profiler import dump_stacks, sample_stacks, write_debug_dump
+from threading import Event, Thread
+
+import os
+
+
+def _wait_for_stop(stop: Event) -> None:
+    stop.wait()
+
+
+def _busy_loop(stop: Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_dump_stacks() -> None:
+    stop = Event()
+    thread = Thread(target=_wait_for_stop, args=(stop,), name="Waiter")
+    thread.start()
+    try:
+        stacks = dump_stacks()
+    finally:
+        stop.set()
+        thread.join()
+    assert f"Thread 'Waiter' ({thread.ident}), most recent call last:" in stacks
+    assert "in _wait_for_stop" in stacks
+    assert "in test_dump_stacks" in stacks
+
+
+def test_sample_stacks() -> None:
+    stop = Event()
+    thread = Thread(target=_busy_loop, args=(stop,), name="Busy")
+    thread.start()
+    try:
+        profile = sample_stacks(0.1, interval=0.005)
+    finally:
+        stop.set()
+        thread.join()
+    counts = {}
+    for line in profile.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        counts[stack] = int(count)
+        assert "sample_stacks" not in stack
+    busy = [stack for stack in counts if stack.startswith("Busy;") and f"_busy_loop ({__file__})" in stack]
+    assert busy
+    assert sum(counts[stack] for stack in busy) > 1
+
+
+def test_write_debug_dump(tmp_path: Path) -> None:
+    path = write_debug_dump(str(tmp_path), "stacks", "hello")
+    assert os.path.dirname(path) == str(tmp_path)
+    assert os.path.basename(path).startswith("pglookout_stacks_")
+    assert path.endswith(f"_{os.getpid()}.txt")
+    assert Path(path).read_text() == "hello"
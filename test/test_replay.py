@@ -0,0 +1,77 @@
+"""
+pglookout - replay tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pathlib import Path
+from pglookout.recorder import read_recording
+from pglookout.simulation.replay import main, Replay
+from pglookout.simulation.runner import Simulation
+from pglookout.simulation.scenarios import master_failure
+
+import json
+import pytest
+import subprocess
+import sys
+
+
+@pytest.fixture(name="recording")
+def fixture_recording(tmp_path: Path) -> str:
+    path = str(tmp_path / "recording.jsonl")
+    scenario = master_failure()
+    scenario.config["recording_file"] = path
+    report = Simulation(scenario).run()
+    assert report.promotions
+    return path
+
+
+def test_replay_matches_recording(recording: str) -> None:
+    records = list(read_recording(recording))
+    actions = [record["action"] for record in records if record["type"] == "decision"]
+    assert "promote" in actions
+
+    report = Replay(recording).run()
+    assert report.ok
+    assert report.sessions == 1
+    assert report.evaluations == sum(1 for record in records if record["type"] == "state" and not record.get("refresh"))
+    assert report.recorded_decisions == report.replayed_decisions == len(actions)
+    assert report.virtual_duration > 200.0
+
+
+def test_replay_reports_divergence(recording: str, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    report = Replay(recording, config_overrides={"never_promote_these_nodes": ["node1"]}).run()
+    assert not report.ok
+    [divergence] = [item for item in report.divergences if any(d["action"] == "promote" for d in item["recorded"])]
+    # node2 is the next best candidate, so we leave the promotion to its pglookout
+    assert divergence["replayed"][0]["action"] == "other_node_furthest_along"
+
+    config_path = tmp_path / "override.json"
+    config_path.write_text(json.dumps({"never_promote_these_nodes": ["node1"]}))
+    assert main([recording, str(config_path)]) == 1
+    assert "divergences" in capsys.readouterr().out
+    assert main([recording]) == 0
+
+
+def test_replay_of_restarted_and_truncated_recording(recording: str, tmp_path: Path) -> None:
+    path = tmp_path / "truncated.jsonl"
+    with open(recording) as fp:
+        lines = fp.readlines()
+    cut = [index for index, line in enumerate(lines) if '"type":"state"' in line][10]
+    # a second run of pglookout appended to the file, which was cut short mid-write
+    path.write_text("".join(lines + lines[:cut]) + lines[cut][:10])
+    report = Replay(str(path)).run()
+    assert report.sessions == 2
+    assert report.ok
+
+
+def test_replay_command(recording: str) -> None:
+    process = subprocess.run(
+        [sys.executable, "-m", "pglookout.simulation.replay", recording],
+        check=False,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        timeout=120,
+    )
+    assert process.returncode == 0, process.stdout
+    assert b"0 divergences" in process.stdout
@@ -0,0 +1,47 @@
+"""
+pglookout - poll scheduling tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pglookout.schedule import next_phase_time, parse_round_schedule, phase_fraction, poll_phase, round_schedule_headers
+
+import pytest
+
+
+def test_phase_fraction() -> None:
+    phases = [phase_fraction(f"node{i}") for i in range(100)]
+    assert phase_fraction("node0") == phases[0]
+    assert all(0.0 <= phase < 1.0 for phase in phases)
+    # spread over the interval rather than bunched together
+    assert len({int(phase * 10) for phase in phases}) == 10
+
+
+def test_poll_phase() -> None:
+    assert poll_phase({"poll_phase": 0.25, "own_db": "node0"}) == 0.25
+    assert poll_phase({"poll_phase": 1.5}) == 0.5
+    assert poll_phase({"own_db": "node0"}) == phase_fraction("node0")
+    assert 0.0 <= poll_phase({}) < 1.0
+
+
+@pytest.mark.parametrize(
+    "now,expected",
+    [
+        (100.0, 101.0),
+        (100.5, 101.0),
+        (101.0, 106.0),
+        (101.5, 106.0),
+        (104.9, 106.0),
+    ],
+)
+def test_next_phase_time(now: float, expected: float) -> None:
+    assert next_phase_time(now, 5.0, 0.2) == pytest.approx(expected)
+
+
+def test_round_schedule_headers() -> None:
+    assert not round_schedule_headers(None)
+    headers = round_schedule_headers({"next_round": 1234.56789, "duration": 0.1})
+    assert headers == {"X-Pglookout-Next-Round": "1234.568", "X-Pglookout-Round-Duration": "0.100"}
+    assert parse_round_schedule(headers) == {"next_round": 1234.568, "duration": 0.1}
+    assert parse_round_schedule({}) is None
+    assert parse_round_schedule({"X-Pglookout-Next-Round": "soon", "X-Pglookout-Round-Duration": "1"}) is None
@@ -0,0 +1,81 @@
+"""
+pglookout - simulation tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pglookout import common
+from pglookout.simulation.__main__ import main
+from pglookout.simulation.clock import VirtualClock
+from pglookout.simulation.cluster import ScriptedEvent, SimulatedCluster
+from pglookout.simulation.runner import Simulation
+from pglookout.simulation.scenarios import master_failure, SCENARIOS
+
+import datetime
+import json
+import pytest
+import signal
+import time
+
+
+def test_virtual_clock():
+    clock = VirtualClock()
+    with clock.patch(common):
+        assert common.get_iso_timestamp() == "2026-01-01T00:00:00Z"
+        clock.advance(90.5)
+        assert common.get_iso_timestamp() == "2026-01-01T00:01:30.500000Z"
+        assert isinstance(common.datetime.datetime.utcnow(), datetime.datetime)
+    assert common.datetime is datetime
+    assert clock.monotonic() == 90.5
+    clock.sleep(-1.0)
+    assert clock.time() == datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc).timestamp() + 90.5
+    assert time.monotonic() != clock.monotonic()
+
+
+def test_simulated_cluster():
+    clock = VirtualClock()
+    cluster = SimulatedCluster.create(clock, node_count=3, observer_count=1, replay_delays=[0.0, 0.0, 2.0])
+    cluster_state, observer_state = {}, {}
+    clock.advance(10.0)
+    cluster.monitoring_round(cluster_state, observer_state)
+    assert cluster_state["node0"]["pg_is_in_recovery"] is False
+    assert cluster_state["node1"]["replication_time_lag"] == 0.0
+    assert cluster_state["node2"]["replication_time_lag"] == 2.0
+    assert observer_state["observer0"]["node2"] == cluster_state["node2"]
+
+    cluster.apply(ScriptedEvent(at=10.0, action="kill", nodes=("node0",)))
+    cluster.apply(ScriptedEvent(at=10.0, action="partition", nodes=("observer0",)))
+    clock.advance(5.0)
+    cluster.monitoring_round(cluster_state, observer_state)
+    # a lost node keeps its last known state apart from the connection, like with the cluster monitor
+    assert cluster_state["node0"]["connection"] is False
+    assert cluster_state["node0"]["pg_is_in_recovery"] is False
+    assert cluster_state["node1"]["replication_time_lag"] == 5.0
+    assert observer_state["observer0"]["connection"] is False
+
+    with pytest.raises(ValueError):
+        cluster.apply(ScriptedEvent(at=10.0, action="explode", nodes=("node1",)))
+
+
+@pytest.mark.parametrize("name", ["master_failure", "partition_from_master", "minority_partition", "lag_spike"])
+def test_scenarios(name):
+    handlers = signal.getsignal(signal.SIGTERM)
+    report = Simulation(SCENARIOS[name]()).run()
+    assert report.ok
+    assert report.evaluations > 0
+    assert signal.getsignal(signal.SIGTERM) is handlers
+
+
+def test_simulation_is_deterministic():
+    reports = [Simulation(master_failure(node_count=5, observer_count=3)).run() for _ in range(2)]
+    assert reports[0].promotions == reports[1].promotions == [{"at": 175.0, "node": "node1"}]
+    assert reports[0].decision_latency == 115.0
+    assert reports[0].failover_decisions == reports[1].failover_decisions
+
+
+def test_simulation_main(capsys):
+    assert main(["--json", "flapping_master"]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report["scenario"] == "flapping_master"
+    assert report["ok"] is True
+    assert report["promotions"] == []
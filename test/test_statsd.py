@@ -0,0 +1,87 @@
+"""
+pglookout - StatsD client tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pglookout.statsd import StatsClient
+from typing import Iterator
+
+import os
+import pytest
+import socket
+import tempfile
+
+
+@pytest.fixture(name="udp_socket")
+def fixture_udp_socket() -> Iterator[socket.socket]:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(5.0)
+    try:
+        yield sock
+    finally:
+        sock.close()
+
+
+def test_unbuffered_send(udp_socket: socket.socket) -> None:
+    port = udp_socket.getsockname()[1]
+    stats = StatsClient(host="127.0.0.1", port=port, tags={"site": "test"})
+    try:
+        stats.gauge("pg.replication_lag", 1.5)
+        assert udp_socket.recv(4096) == b"pg.replication_lag,site=test:1.5|g"
+        stats.increase("exception", tags={"where": "here"})
+        assert udp_socket.recv(4096) == b"exception,site=test,where=here:1|c"
+        # metric specific tags override global ones
+        stats.timing("probe", 12, tags={"site": "other"})
+        assert udp_socket.recv(4096) == b"probe,site=other:12|ms"
+    finally:
+        stats.close()
+
+
+def test_buffered_send(udp_socket: socket.socket) -> None:
+    port = udp_socket.getsockname()[1]
+    stats = StatsClient(host="127.0.0.1", port=port, buffered=True, max_packet_size=60, flush_interval=3600.0)
+    try:
+        stats.increase("metric_a")
+        stats.increase("metric_b")
+        stats.increase("metric_c")
+        stats.increase("metric_d")
+        # the packet size limit forces a flush once the fifth metric no longer fits
+        stats.increase("metric_e")
+        assert udp_socket.recv(4096) == b"metric_a:1|c\nmetric_b:1|c\nmetric_c:1|c\nmetric_d:1|c"
+        stats.flush()
+        assert udp_socket.recv(4096) == b"metric_e:1|c"
+        stats.gauge("metric_f", 2)
+    finally:
+        stats.close()
+    # closing flushes pending metrics
+    assert udp_socket.recv(4096) == b"metric_f:2|g"
+
+
+def test_buffered_send_interval(udp_socket: socket.socket) -> None:
+    port = udp_socket.getsockname()[1]
+    stats = StatsClient(host="127.0.0.1", port=port, buffered=True, flush_interval=0.01)
+    try:
+        stats.increase("metric_a")
+        assert udp_socket.recv(4096) == b"metric_a:1|c"
+    finally:
+        stats.close()
+
+
+def test_unix_socket_send() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = os.path.join(tmpdir, "statsd.sock")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.bind(socket_path)
+            sock.settimeout(5.0)
+            stats = StatsClient(socket_path=socket_path, buffered=True, flush_interval=3600.0)
+            stats.increase("metric_a")
+            stats.close()
+            assert sock.recv(4096) == b"metric_a:1|c"
+
+
+def test_disabled() -> None:
+    stats = StatsClient(host=None)
+    stats.increase("metric_a")
+    stats.close()
@@ -0,0 +1,130 @@
+"""
+pglookout - WAL throughput estimation tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pglookout.throughput import estimate_catchup_seconds, RateEstimator, ReplicationThroughput, THROUGHPUT_FIELDS
+from typing import Any, Dict
+
+import math
+
+
+def test_rate_estimator() -> None:
+    estimator = RateEstimator(window=10.0)
+    assert estimator.rate() is None
+    estimator.add(0.0, 0)
+    assert estimator.rate() is None
+    estimator.add(1.0, 100)
+    assert estimator.rate() == 100.0
+    # samples at the same time are ignored
+    estimator.add(1.0, 500)
+    assert estimator.rate() == 100.0
+    for i in range(2, 20):
+        estimator.add(float(i), i * 100)
+    for i in range(20, 30):
+        estimator.add(float(i), 1900 + (i - 19) * 200)
+    # only the samples within the window are used
+    assert estimator.rate() == 200.0
+    # going backwards resets the estimator
+    estimator.add(31.0, 0)
+    assert estimator.rate() is None
+
+
+def test_estimate_catchup_seconds() -> None:
+    assert estimate_catchup_seconds(None, 10.0, 5.0) is None
+    assert estimate_catchup_seconds(0, None, None) == 0.0
+    assert estimate_catchup_seconds(100, 15.0, 5.0) == 10.0
+    assert estimate_catchup_seconds(100, 5.0, 5.0) == math.inf
+    assert estimate_catchup_seconds(100, 4.0, 5.0) == math.inf
+    assert estimate_catchup_seconds(100, None, 5.0) is None
+
+
+def test_replication_throughput_update() -> None:
+    throughput = ReplicationThroughput(window=60.0)
+    cluster_state: Dict[str, Dict[str, Any]] = {
+        "master": {
+            "connection": True,
+            "pg_is_in_recovery": False,
+            "pg_last_xlog_replay_location": "0/1000",
+        },
+        "standby": {
+            "connection": True,
+            "pg_is_in_recovery": True,
+            "pg_last_xlog_receive_location": "0/800",
+            "pg_last_xlog_replay_location": "0/400",
+        },
+    }
+    throughput.update(cluster_state, now=100.0)
+    assert cluster_state["master"]["wal_generation_rate"] is None
+    assert cluster_state["standby"]["replication_byte_lag"] == 0xC00
+    assert cluster_state["standby"]["estimated_catchup_seconds"] is None
+
+    cluster_state["master"]["pg_last_xlog_replay_location"] = "0/2000"
+    cluster_state["standby"]["pg_last_xlog_receive_location"] = "0/1C00"
+    cluster_state["standby"]["pg_last_xlog_replay_location"] = "0/1800"
+    throughput.update(cluster_state, now=101.0)
+    assert cluster_state["master"]["wal_generation_rate"] == 0x1000
+    assert cluster_state["standby"]["wal_receive_rate"] == 0x1400
+    assert cluster_state["standby"]["wal_replay_rate"] == 0x1400
+    assert cluster_state["standby"]["replication_byte_lag"] == 0x800
+    assert cluster_state["standby"]["estimated_catchup_seconds"] == 0x800 / 0x400
+
+    del cluster_state["standby"]
+    throughput.update(cluster_state, now=102.0)
+    assert not [key for key in throughput._estimators if key[0] == "standby"]  # pylint: disable=protected-access
+
+
+def test_replication_throughput_clears_skipped_nodes() -> None:
+    throughput = ReplicationThroughput(window=60.0)
+    cluster_state: Dict[str, Dict[str, Any]] = {
+        "master": {"connection": True, "pg_is_in_recovery": False, "pg_last_xlog_replay_location": "0/1000"},
+        "standby": {
+            "connection": True,
+            "pg_is_in_recovery": True,
+            "pg_last_xlog_receive_location": "0/1000",
+            "pg_last_xlog_replay_location": "0/800",
+        },
+    }
+    throughput.update(cluster_state, now=100.0)
+    cluster_state["master"]["pg_last_xlog_replay_location"] = "0/2000"
+    cluster_state["standby"]["pg_last_xlog_replay_location"] = "0/1000"
+    throughput.update(cluster_state, now=101.0)
+    assert cluster_state["standby"]["wal_replay_rate"] == 0x800
+    assert cluster_state["standby"]["estimated_catchup_seconds"] == math.inf
+
+    # a node we couldn't reach keeps its last positions but no longer reports rates or estimates for them
+    cluster_state["standby"]["connection"] = False
+    throughput.update(cluster_state, now=102.0)
+    assert not [field for field in THROUGHPUT_FIELDS if field in cluster_state["standby"]]
+    assert ("standby", "replay") not in throughput._estimators  # pylint: disable=protected-access
+
+    # the old master was promoted elsewhere and is now a standby, it has no generation rate anymore
+    cluster_state["master"]["pg_is_in_recovery"] = True
+    throughput.update(cluster_state, now=103.0)
+    assert "wal_generation_rate" not in cluster_state["master"]
+    assert cluster_state["master"]["wal_replay_rate"] is None
+
+
+def test_replication_position_lag() -> None:
+    throughput = ReplicationThroughput(window=60.0)
+    master: Dict[str, Any] = {"connection": True, "pg_is_in_recovery": False}
+    standby: Dict[str, Any] = {"connection": True, "pg_is_in_recovery": True, "pg_last_xlog_receive_location": "0/1000"}
+    cluster_state: Dict[str, Dict[str, Any]] = {"master": master, "standby": standby}
+    for second, lsn in [(0, "0/1000"), (5, "0/2000"), (10, "0/3000")]:
+        master.update({"db_time": f"2026-01-01T00:00:{second:02d}Z", "pg_last_xlog_replay_location": lsn})
+        standby.update({"db_time": f"2026-01-01T00:00:{second:02d}Z", "pg_last_xlog_replay_location": "0/2800"})
+        throughput.update(cluster_state, now=100.0 + second)
+    # the standby has replayed what the primary had written 5 seconds earlier but not what it wrote since
+    assert standby["replication_position_lag"] == 5.0
+
+    # a standby behind everything the primary was seen at has no bound
+    standby["pg_last_xlog_replay_location"] = "0/800"
+    throughput.update(cluster_state, now=111.0)
+    assert standby["replication_position_lag"] is None
+
+    # positions of a previous primary don't apply
+    cluster_state["new master"] = cluster_state.pop("master")
+    standby["pg_last_xlog_replay_location"] = "0/2800"
+    throughput.update(cluster_state, now=112.0)
+    assert standby["replication_position_lag"] is None
@@ -0,0 +1,81 @@
+"""
+pglookout - loop lag watchdog tests
+
+Copyright (c) 2026 Aiven Ltd
+See LICENSE for details
+"""
+from pglookout.watchdog import Histogram, LoopWatchdog
+from unittest.mock import call, Mock, patch
+
+import time
+
+
+def test_histogram() -> None:
+    histogram = Histogram(buckets=(1, 10, 100))
+    assert histogram.percentile(0.5) is None
+    for value in [0.5, 1.0, 5.0, 7.0, 50.0, 500.0]:
+        histogram.add(value)
+    assert histogram.counts == [2, 2, 1, 1]
+    assert histogram.percentile(0.5) == 10
+    assert histogram.percentile(0.8) == 100
+    assert histogram.percentile(0.99) == 500.0
+    assert histogram.as_dict() == {
+        "count": 6,
+        "sum": 563.5,
+        "max": 500.0,
+        "p50": 10,
+        "p99": 500.0,
+        "buckets": {"1": 2, "10": 2, "100": 1, "+Inf": 1},
+    }
+
+
+def test_loop_watchdog_measurements() -> None:
+    stats = Mock()
+    watchdog = LoopWatchdog(stats=stats)
+    watchdog.iteration("main", 0.25)
+    watchdog.waited("main", 5.5, timeout=5.0)
+    watchdog.waited("main", 1.0, timeout=5.0)
+    assert stats.timing.call_args_list == [
+        call("loop_duration", 250.0, tags={"loop": "main"}),
+        call("loop_blocked", 5500.0, tags={"loop": "main"}),
+        call("loop_lag", 500.0, tags={"loop": "main"}),
+        call("loop_blocked", 1000.0, tags={"loop": "main"}),
+        call("loop_lag", 0.0, tags={"loop": "main"}),
+    ]
+    snapshot = watchdog.snapshot()["main"]
+    assert snapshot["duration"]["count"] == 1
+    assert snapshot["blocked"]["count"] == 2
+    assert snapshot["lag"]["max"] == 500.0
+    assert snapshot["stalled"] is False
+    assert 0 <= snapshot["seconds_since_progress"] < 1
+
+
+def test_loop_watchdog_stalls() -> None:
+    stats = Mock()
+    watchdog = LoopWatchdog(stats=stats, stall_seconds=10.0)
+    now = time.monotonic()
+    watchdog.waited("main", 0.1, timeout=5.0)
+    watchdog.iteration("cluster_monitor", 0.1)
+    assert not watchdog.check_stalls(now + 9.0)
+    assert watchdog.check_stalls(now + 12.0) == {"cluster_monitor"}
+    assert watchdog.check_stalls(now + 16.0) == {"cluster_monitor", "main"}
+    assert watchdog.snapshot()["main"]["stalled"] is True
+    # every stall is counted once
+    assert stats.increase.call_args_list == [
+        call("loop_stall", tags={"loop": "cluster_monitor"}),
+        call("loop_stall", tags={"loop": "main"}),
+    ]
+    watchdog.iteration("main", 0.1)
+    assert watchdog.check_stalls(time.monotonic()) == set()
+
+
+def test_loop_watchdog_thread() -> None:
+    watchdog = LoopWatchdog(stats=Mock(), interval=0.01)
+    with patch.object(watchdog, "check_stalls") as check_stalls:
+        watchdog.start()
+        time.sleep(0.1)
+        watchdog.stop()
+        watchdog.join(timeout=1.0)
+    assert not watchdog.is_alive()
+    assert check_stalls.call_count > 1
+    assert watchdog.snapshot()["watchdog"]["lag"]["count"] == check_stalls.call_count
@@ -6,8 +6,12 @@ Copyright (c) 2016 Ohmu Ltd
 This file is under the Apache License, Version 2.0.
 See the file `LICENSE` for details.
 """
+from pglookout.failover_trace import FailoverTracer
+from pglookout.history import ClusterHistory
+from pglookout.watchdog import LoopWatchdog
 from pglookout.webserver import WebServer
 from queue import Queue
+from unittest.mock import Mock
 
 import random
 import requests
@@ -19,19 +23,95 @@ def test_webserver():
     }
     cluster_state = {
         "hello": 123,
+        "db1": {"connection": True, "replication_slots": ["large"]},
+        "db2": {"connection": False},
     }
     http_port = config["http_port"]
     base_url = f"http://127.0.0.1:{http_port}"
     cluster_monitor_check_queue = Queue()
+    failover_plan = {}
+    failover_tracer = FailoverTracer(stats=Mock())
+    failover_tracer.start("hello")
+    history = ClusterHistory(capacity=10)
+    history.record_node("hello", {"connection": True, "replication_time_lag": 1.5}, timestamp=100.0, probe_latency=0.1)
 
-    web = WebServer(config=config, cluster_state=cluster_state, cluster_monitor_check_queue=cluster_monitor_check_queue)
+    web = WebServer(
+        config=config,
+        cluster_state=cluster_state,
+        cluster_monitor_check_queue=cluster_monitor_check_queue,
+        history=history,
+        get_failover_plan=lambda: failover_plan.get("plan"),
+        failover_tracer=failover_tracer,
+        cluster_states={"other cluster": {"other": {"connection": True}}},
+        observer_state={
+            "observer": {"connection": True, "fetch_time": "2026-01-01T00:00:00Z", "db1": {"connection": False}}
+        },
+        get_memory_usage=lambda limit: {"limit": limit},
+        watchdog=LoopWatchdog(stats=Mock()),
+        get_round_schedule=lambda: {"next_round": 1000.0, "duration": 0.25},
+    )
     try:
         web.start()
         # wait for the thread to have started, else we're blocking forever as web.close can't shutdown the thread
         web.is_initialized.wait(timeout=30.0)
 
-        result = requests.get(f"{base_url}/state.json", timeout=5).json()
-        assert result == cluster_state
+        result = requests.get(f"{base_url}/state.json", timeout=5)
+        assert result.json() == cluster_state
+        assert result.headers["X-Pglookout-Next-Round"] == "1000.000"
+        assert result.headers["X-Pglookout-Round-Duration"] == "0.250"
+
+        result = requests.get(f"{base_url}/state.json?instances=db1,db3&fields=connection,fetch_time", timeout=5).json()
+        assert result == {"db1": {"connection": True}}
+        result = requests.get(f"{base_url}/state.json?instances=db2,db1", timeout=5).json()
+        assert result == {"db1": cluster_state["db1"], "db2": cluster_state["db2"]}
+
+        result = requests.get(f"{base_url}/observers.json?instances=db1&fields=connection", timeout=5)
+        assert result.headers["X-Pglookout-Next-Round"] == "1000.000"
+        assert result.json() == {
+            "state": {"db1": {"connection": True}},
+            "observers": {
+                "observer": {"connection": True, "fetch_time": "2026-01-01T00:00:00Z", "db1": {"connection": False}}
+            },
+        }
+
+        result = requests.get(f"{base_url}/clusters/other%20cluster/state.json", timeout=5)
+        assert result.json() == {"other": {"connection": True}}
+        assert "X-Pglookout-Next-Round" not in result.headers
+        result = requests.get(f"{base_url}/clusters/other%20cluster/state.json?instances=", timeout=5).json()
+        assert result == {}
+        result = requests.get(f"{base_url}/clusters/missing/state.json", timeout=5)
+        assert result.status_code == 404
+
+        result = requests.get(f"{base_url}/history?instance=hello&since=50", timeout=5).json()
+        assert result["nodes"]["hello"]["replication_time_lag"] == [1.5]
+        result = requests.get(f"{base_url}/history?since=100", timeout=5).json()
+        assert result["nodes"]["hello"]["timestamp"] == []
+        result = requests.get(f"{base_url}/history?since=foo", timeout=5)
+        assert result.status_code == 400
+
+        assert requests.get(f"{base_url}/debug/memory", timeout=5).json() == {"limit": 20}
+        assert requests.get(f"{base_url}/debug/memory?limit=5", timeout=5).json() == {"limit": 5}
+        assert requests.get(f"{base_url}/debug/memory?limit=x", timeout=5).status_code == 400
+
+        result = requests.get(f"{base_url}/debug/stacks", timeout=5)
+        assert result.headers["Content-type"].startswith("text/plain")
+        assert "Thread 'MainThread'" in result.text
+        result = requests.get(f"{base_url}/debug/profile?seconds=0.05&interval=0.01", timeout=5)
+        assert "MainThread;" in result.text
+        assert requests.get(f"{base_url}/debug/profile?seconds=600", timeout=5).status_code == 400
+        assert requests.get(f"{base_url}/debug/profile?interval=x", timeout=5).status_code == 400
+
+        result = requests.get(f"{base_url}/debug/loops", timeout=5).json()
+        assert result["webserver"]["duration"]["count"] > 1
+
+        result = requests.get(f"{base_url}/failover_plan", timeout=5)
+        assert result.status_code == 503
+        failover_plan["plan"] = {"promotion_candidate": "hello"}
+        result = requests.get(f"{base_url}/failover_plan", timeout=5).json()
+        assert result == {"promotion_candidate": "hello"}
+
+        result = requests.get(f"{base_url}/failover_traces", timeout=5).json()
+        assert [trace["master"] for trace in result["traces"]] == ["hello"]
 
         result = requests.post(f"{base_url}/check", timeout=5)
         assert result.status_code == 204